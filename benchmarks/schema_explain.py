@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Schema Index Benchmark
+
+Build a SQLite DB at the initial schema revision (0001) and at head, load the same entities, features and paths, then show the EXPLAIN QUERY PLAN and timing of the hot queries in get_entity, get_entity_path and list_entities, plus feature lookups by value.
+
+Usage: schema_explain.py [ENTITY_COUNT]
+"""
+import hashlib, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mgi.database import create_engine
+from mgi.utils import upgrade_db
+
+def value_hash(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+def path_value(i, j):
+    return f"/storage1/fs1/project/Active/samples/cohort_{i % 50}/SAMPLE_{i:07d}/analysis/SAMPLE_{i:07d}.{j}.bam"
+
+QUERIES = {
+    "get_entity": {
+        "0001": ("SELECT id FROM entity WHERE name = ? AND kind = ?", lambda i: (f"SAMPLE_{i:07d}", "sample")),
+        "0002": ("SELECT id FROM entity WHERE name = ? AND kind = ?", lambda i: (f"SAMPLE_{i:07d}", "sample")),
+    },
+    "get_entity_path": {
+        "0001": ("SELECT id FROM entity_path WHERE entity_id = ? AND value = ?", lambda i: (i + 1, path_value(i, 0))),
+        "0002": ("SELECT id FROM entity_path WHERE value_hash = ? AND entity_id = ?", lambda i: (value_hash(path_value(i, 0)), i + 1)),
+    },
+    "list_entities sets": {
+        "0001": ("SELECT eset.name FROM eset, eset_entity WHERE eset_entity.entity_id = ? AND eset.id = eset_entity.eset_id", lambda i: (i + 1,)),
+        "0002": ("SELECT eset.name FROM eset, eset_entity WHERE eset_entity.entity_id = ? AND eset.id = eset_entity.eset_id", lambda i: (i + 1,)),
+    },
+    "entity paths": {
+        "0001": ("SELECT id, value FROM entity_path WHERE entity_id = ?", lambda i: (i + 1,)),
+        "0002": ("SELECT id, value FROM entity_path WHERE entity_id = ?", lambda i: (i + 1,)),
+    },
+    "feature by value": {
+        "0001": ('SELECT entity_id FROM entity_feature WHERE "group" = ? AND name = ? AND value = ?', lambda i: ("qc", "coverage", f"{i % 1000}X")),
+        "0002": ('SELECT entity_id FROM entity_feature WHERE "group" = ? AND name = ? AND value = ?', lambda i: ("qc", "coverage", f"{i % 1000}X")),
+    },
+}
+
+def load(engine, revision, count):
+    with engine.begin() as con:
+        con.exec_driver_sql("INSERT INTO eset (id, name, kind) VALUES (1, 'cohort', 'data group')")
+        con.exec_driver_sql("INSERT INTO entity (id, name, kind) VALUES (?, ?, 'sample')", [(i + 1, f"SAMPLE_{i:07d}") for i in range(count)])
+        con.exec_driver_sql("INSERT INTO eset_entity (eset_id, entity_id) VALUES (1, ?)", [(i + 1,) for i in range(0, count, 2)])
+        con.exec_driver_sql('INSERT INTO entity_feature (entity_id, "group", name, value) VALUES (?, ?, ?, ?)',
+                [(i + 1, "qc", name, f"{i % 1000}X") for i in range(count) for name in ("coverage", "contamination", "qc_pass")])
+    paths = [(i + 1, path_value(i, j)) for i in range(count) for j in range(5)]
+    start = time.time()
+    with engine.begin() as con:
+        if revision == "0001":
+            con.exec_driver_sql("INSERT INTO entity_path (entity_id, value, kind) VALUES (?, ?, 'bam')", paths)
+        else:
+            con.exec_driver_sql("INSERT INTO entity_path (entity_id, value, value_hash, kind) VALUES (?, ?, ?, 'bam')", [(e, v, value_hash(v)) for e, v in paths])
+    return len(paths), time.time() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    temp_d = tempfile.TemporaryDirectory()
+    for revision in ("0001", "0002"):
+        url = "sqlite:///" + os.path.join(temp_d.name, f"{revision}.db")
+        upgrade_db(url, revision)
+        engine = create_engine(url)
+        path_count, load_time = load(engine, revision, count)
+        print(f"== Revision {revision}: loaded {path_count} paths in {load_time:.2f}s")
+        with engine.connect() as con:
+            for name, by_revision in QUERIES.items():
+                sql, params = by_revision[revision]
+                plan = [r[-1] for r in con.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params(0))]
+                start = time.time()
+                for i in range(0, count, max(1, count // 2000)):
+                    con.exec_driver_sql(sql, params(i)).fetchall()
+                print(f"{name:<20} {(time.time() - start) * 1000:8.1f}ms  {' | '.join(plan)}")
+        engine.dispose()
+    temp_d.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+SQLite Profile Benchmark
+
+Compare stock SQLite settings with the profile of mgi.database.create_engine, in its default WAL mode and its rollback journal (DELETE) network filesystem opt out, on:
+
+writers: WRITERS processes each running `cw wf status --update` UPDATES times, like LSF jobs updating workflows at once. Each update is a new engine and connection, as with separate CLI runs. The Cromwell server is replaced by a stub giving a status, so only the DB is timed.
+bulk:    PATH_COUNT entity_path rows inserted in 100 commits, like a large paths update.
+
+Usage: sqlite_profile.py [WRITERS] [UPDATES] [PATH_COUNT]
+"""
+import hashlib, multiprocessing, os, sys, tempfile, time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ["stock", "wal", "delete"]
+
+def set_mode(mode):
+    if mode == "delete":
+        os.environ["SQLITE_JOURNAL_MODE"] = "DELETE"
+    else:
+        os.environ.pop("SQLITE_JOURNAL_MODE", None)
+
+def pragmas_for_mode(mode):
+    from mgi.database import SQLITE_PRAGMAS
+    return None if mode == "stock" else SQLITE_PRAGMAS
+
+def create_cw_db(uri, mode, workflow_count):
+    from cw import db, Pipeline, Workflow
+    from mgi.database import create_engine
+    engine = create_engine(uri, sqlite_pragmas=pragmas_for_mode(mode))
+    db.metadata.create_all(engine)
+    with engine.begin() as con:
+        con.execute(Pipeline.__table__.insert(), [{"id": 1, "name": "bench", "wdl": "bench.wdl"}])
+        con.execute(Workflow.__table__.insert(), [{"name": f"wf{i}", "wf_id": f"{i:08d}-0000-0000-0000-000000000000", "pipeline_id": 1} for i in range(workflow_count)])
+    engine.dispose()
+
+def run_writer(uri, mode, writer, updates, errors):
+    set_mode(mode)
+    os.environ["CW_DB_URI"] = uri
+    from click.testing import CliRunner
+    from cw import db
+    from cw.wf_status import status_cmd
+    db.sqlite_pragmas = pragmas_for_mode(mode)
+    runner = CliRunner()
+    with patch("cw.server.server_factory") as server_factory:
+        for i in range(updates):
+            server_factory.return_value.status_for_workflow.return_value = f"status{i}"
+            result = runner.invoke(status_cmd, [f"wf{writer}", "--update"])
+            if result.exit_code != 0:
+                errors.put(f"{writer}: {result.exception}")
+            db.session.remove()
+            db.dispose()
+
+def bench_writers(temp_dn, mode, writers, updates):
+    uri = "sqlite:///" + os.path.join(temp_dn, f"cw_{mode}.db")
+    set_mode(mode)
+    create_cw_db(uri, mode, writers)
+    ctx = multiprocessing.get_context("spawn")
+    errors = ctx.Queue()
+    procs = [ctx.Process(target=run_writer, args=(uri, mode, i, updates, errors)) for i in range(writers)]
+    start = time.time()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.time() - start
+    from mgi.database import create_engine
+    engine = create_engine(uri)
+    with engine.connect() as con:
+        updated = con.exec_driver_sql("SELECT COUNT(*) FROM workflow WHERE status = ?", (f"status{updates - 1}",)).scalar()
+    engine.dispose()
+    failed = [p.exitcode for p in procs].count(0) != writers or not errors.empty() or updated != writers
+    return elapsed, failed
+
+def bench_bulk(temp_dn, mode, path_count):
+    from mgi.database import create_engine
+    from mgi.models import db, EntityPath
+    uri = "sqlite:///" + os.path.join(temp_dn, f"mgi_{mode}.db")
+    set_mode(mode)
+    engine = create_engine(uri, sqlite_pragmas=pragmas_for_mode(mode))
+    db.metadata.create_all(engine)
+    with engine.begin() as con:
+        con.exec_driver_sql("INSERT INTO entity (id, name, kind) VALUES (1, 'SAMPLE', 'sample')")
+    chunk_size = max(1, path_count // 100)
+    start = time.time()
+    for chunk_start in range(0, path_count, chunk_size):
+        rows = []
+        for i in range(chunk_start, min(chunk_start + chunk_size, path_count)):
+            dn = f"/storage1/fs1/project/Active/samples/cohort_{i % 50}/SAMPLE_{i // 10:07d}"
+            value = f"{dn}/SAMPLE_{i // 10:07d}.{i % 10}.bam"
+            rows.append({"entity_id": 1, "value": value, "value_hash": hashlib.sha1(value.encode("utf-8")).hexdigest(), "directory": dn, "kind": "bam", "exists": True})
+        with engine.begin() as con:
+            con.execute(EntityPath.__table__.insert(), rows)
+    elapsed = time.time() - start
+    engine.dispose()
+    return elapsed
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    path_count = int(sys.argv[3]) if len(sys.argv) > 3 else 1000000
+    temp_d = tempfile.TemporaryDirectory()
+    print(f"{'mode':<8} {'writers':>10} {'bulk':>10}")
+    for mode in MODES:
+        writers_time, failed = bench_writers(temp_d.name, mode, writers, updates)
+        bulk_time = bench_bulk(temp_d.name, mode, path_count)
+        print(f"{mode:<8} {writers_time:9.2f}s {bulk_time:9.2f}s{'  (writers failed)' if failed else ''}")
+    temp_d.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,7 @@
-import os
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from sqlalchemy import create_engine
+import contextlib, os
 
 from cw.helpers import sqlite_uri_for_file
 
-flask_app = Flask(__name__)
-flask_app.config['SQLALCHEMY_DATABASE_URI'] = None
-flask_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(flask_app)
-def db_uri(db_uri=None):
-    if db_uri is not None:
-        flask_app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
-    return flask_app.config['SQLALCHEMY_DATABASE_URI']
-db.uri = db_uri
-
-migrate = Migrate(flask_app, db)
 DN = os.environ.get("CW_DN", None)
 if DN is None:
     DN = os.getcwd()
@@ -25,39 +9,95 @@ DB_URI = os.environ.get("CW_DB_URI", None)
 if DB_URI is None:
     DB_URI = sqlite_uri_for_file(os.path.join(DN, "server", "db"))
     #DB_URI = sqlite_uri_for_file(os.path.join(DN, "cw.db"))
-db.uri(DB_URI)
 
-from cw.models import Config, Pipeline, Workflow
+# The db and models are loaded on first use, so commands that do not need the DB start fast
+def __getattr__(name):
+    global db
+    if name == "db":
+        from mgi.database import Database
+        db = Database(uri=DB_URI)
+        return db
+    if name in ("Config", "Pipeline", "Workflow"):
+        import cw.models
+        return getattr(cw.models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class AppCon(object):
     def __init__(self):
         self.dn = DN
         self.resources_dn = os.path.join(os.path.dirname(__file__), "resources")
-        self.known_directories = set(["db", "logs", "runs", "server"])
+        self.known_directories = set(["cache", "db", "logs", "runs", "server"])
+        self._configs = None
+        self._configs_uri = None
+        self._dirty = set()
+        self._batch = 0
 
     def dn_for(self, name):
         if name not in self.known_directories:
             raise Exception(f"Unknown directory: {name}")
         return os.path.join(self.dn, name)
 
+    def load(self):
+        # All configs in one query, saved back with one commit
+        from cw import db
+        from cw.models import Config
+        self._configs = dict(((group, name), value) for group, name, value in db.session.query(Config.group, Config.name, Config.value))
+        self._configs_uri = db.uri()
+        self._dirty = set()
+
+    def configs(self):
+        from cw import db
+        if self._configs is None or self._configs_uri != db.uri():
+            self.load()
+        return self._configs
+
     def get(self, name, group="general"):
-        c = Config.query.filter(Config.group == group, Config.name == name).one_or_none()
-        if c is None:
-            return None
-        return c.value
+        return self.configs().get((group, name))
 
     def set(self, name, value, group="general"):
-        c = Config.query.filter(Config.group == group, Config.name == name).one_or_none()
-        if c is None:
-            c = Config(name=name, group=group)
-        c.value = value
-        db.session.add(c)
+        self.configs()[(group, name)] = value
+        self._dirty.add((group, name))
+        if not self._batch:
+            self.save()
+        return value
+
+    @contextlib.contextmanager
+    def batch(self):
+        # Set many configs, and save them together
+        self._batch += 1
+        try:
+            yield self
+        except BaseException:
+            # Drop the unsaved values, configs are loaded again on next use
+            self._dirty = set()
+            self._configs = None
+            raise
+        finally:
+            self._batch -= 1
+        if not self._batch:
+            self.save()
+
+    def save(self):
+        if not self._dirty:
+            return
+        from cw import db
+        from cw.models import Config
+        existing = dict(((c.group, c.name), c) for c in Config.query.filter(Config.name.in_(set(map(lambda k: k[1], self._dirty)))))
+        for group, name in self._dirty:
+            c = existing.get((group, name), None)
+            if c is None:
+                c = Config(name=name, group=group)
+            c.value = self._configs[(group, name)]
+            db.session.add(c)
         db.session.commit()
-        return c.value
+        self._dirty = set()
 #--
 appcon = AppCon()
 
 def create_db(uri=None, extra_configs=[]):
+    from mgi.database import create_engine
+    from cw import db
+    import cw.models
     if uri is None:
         uri = db.uri()
         if uri is None:
@@ -80,6 +120,7 @@ def create_db(uri=None, extra_configs=[]):
             ["server", "start_fn", os.path.join(server_dn, "start")],
             ]
     configs += extra_configs
-    for group, name, value in configs:
-        appcon.set(group=group, name=name, value=value)
+    with appcon.batch():
+        for group, name, value in configs:
+            appcon.set(group=group, name=name, value=value)
 #-- create_db
@@ -1,24 +1,17 @@
-import click, os, requests, subprocess, sys
+import click
+
+from mgi.lazy_click import LazyGroup
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
-@click.group(context_settings=CONTEXT_SETTINGS)
+@click.group(cls=LazyGroup, context_settings=CONTEXT_SETTINGS, lazy_commands={
+    "pipelines": ["cw.pipelines:cli", "commands for pipelines"],
+    "server": ["cw.server:cli", "commands for the cromwell server"],
+    "setup": ["cw.setup_cmd:setup_cmd", "setup cromwell"],
+    "utils": ["cw.utils:cli", "marginally useful tools"],
+    "wf": ["cw.wf_cli:cli", "commands for workflows"],
+    })
 def cli():
     """
     Cromwell on MGI Compute
     """
     pass
-
-from cw.pipelines import cli as pipelines_cli
-cli.add_command(pipelines_cli, "pipelines")
-
-from cw.server import cli as server_cli
-cli.add_command(server_cli, "server")
-
-from cw.setup_cmd import setup_cmd as cmd
-cli.add_command(cmd, "setup")
-
-from cw.wf_cli import cli as wf_cli
-cli.add_command(wf_cli, "wf")
-
-from cw.utils import cli as utils_cli
-cli.add_command(utils_cli, "utils")
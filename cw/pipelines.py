@@ -38,6 +38,9 @@ def add_cmd(features):
     print(f"Add pipeline {p.name} {p.wdl} {p.imports} {p.outputs}")
 cli.add_command(add_cmd, name="add")
 
+from cw.pl_build import build_cmd
+cli.add_command(build_cmd, name="build")
+
 from cw.pl_inputs import inputs_cmd
 cli.add_command(inputs_cmd, name="inputs")
 
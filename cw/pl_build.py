@@ -0,0 +1,108 @@
+import click, hashlib, os, re, sys, tempfile, zipfile
+
+from cw import appcon, db
+from cw.model_helpers import get_pipeline
+from cw.wdl import strip_comments
+
+@click.command(short_help="build pipeline imports zip")
+@click.argument("identifier", required=True, nargs=1)
+def build_cmd(identifier):
+    """
+    Build Pipeline Imports Zip
+
+    Resolve the imports of the pipeline WDL, recursively, and bundle them into a zip for submitting. The zip is cached by the content of the imported files, and only rebuilt when one of them changes. The pipeline imports will be updated to the cached zip.
+    """
+    pipeline = get_pipeline(identifier)
+    if pipeline is None:
+        sys.stderr.write(f"Failed to get pipeline for <{identifier}>\n")
+        sys.exit(1)
+    if not os.path.exists(pipeline.wdl):
+        sys.stderr.write(f"Pipeline {pipeline.name} WDL {pipeline.wdl} does not exist!\n")
+        sys.exit(1)
+    imports = resolve_imports(pipeline.wdl)
+    if len(imports) == 0:
+        sys.stdout.write(f"Pipeline {pipeline.name} WDL does not import any files, no imports zip needed.\n")
+        return
+    zip_fn, built = build_pipeline_imports(pipeline, imports)
+    if pipeline.imports != zip_fn:
+        pipeline.imports = zip_fn
+        db.session.add(pipeline)
+        db.session.commit()
+    sys.stdout.write(f"{'Built' if built else 'Using cached'} imports zip for pipeline {pipeline.name} with {len(imports)} files: {zip_fn}\n")
+#-- build_cmd
+
+import_re = re.compile(r"""^\s*import\s+["']([^"']+)["']""", re.MULTILINE)
+def resolve_imports(wdl_fn):
+    """
+    Map of imported WDL paths, relative to the main WDL directory, to their absolute paths.
+    """
+    root_dn = os.path.dirname(os.path.abspath(wdl_fn))
+    imports = {}
+    todo = [os.path.abspath(wdl_fn)]
+    seen = set(todo)
+    while todo:
+        fn = todo.pop()
+        with open(fn, "r") as f:
+            text = strip_comments(f.read())
+        for uri in import_re.findall(text):
+            if re.match(r"\A\w+://", uri):
+                continue
+            import_fn = os.path.normpath(os.path.join(os.path.dirname(fn), uri))
+            if import_fn in seen:
+                continue
+            seen.add(import_fn)
+            if not os.path.exists(import_fn):
+                raise Exception(f"Imported WDL <{uri}> in <{fn}> does not exist: {import_fn}")
+            rel_fn = os.path.relpath(import_fn, root_dn)
+            if rel_fn.startswith(os.pardir):
+                raise Exception(f"Imported WDL <{import_fn}> is not under the main WDL directory <{root_dn}>")
+            imports[rel_fn] = import_fn
+            todo.append(import_fn)
+    return imports
+#-- resolve_imports
+
+def imports_content_hash(imports):
+    h = hashlib.sha256()
+    for rel_fn in sorted(imports.keys()):
+        with open(imports[rel_fn], "rb") as f:
+            content_sha = hashlib.sha256(f.read()).hexdigest()
+        h.update(f"{rel_fn}\0{content_sha}\n".encode())
+    return h.hexdigest()
+#-- imports_content_hash
+
+def write_imports_zip(imports, zip_fn):
+    # Fixed order, timestamps and permissions, so the same files always give the same bytes
+    dn = os.path.dirname(zip_fn)
+    os.makedirs(dn, exist_ok=True)
+    fd, tmp_fn = tempfile.mkstemp(dir=dn, suffix=".zip.tmp")
+    with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w") as z:
+        for rel_fn in sorted(imports.keys()):
+            info = zipfile.ZipInfo(rel_fn, date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(imports[rel_fn], "rb") as src:
+                z.writestr(info, src.read())
+    os.replace(tmp_fn, zip_fn)
+#-- write_imports_zip
+
+def imports_cache_dn():
+    return os.path.join(appcon.dn_for("cache"), "imports")
+#-- imports_cache_dn
+
+def build_pipeline_imports(pipeline, imports=None):
+    """
+    Returns the cached imports zip for the pipeline and if it was (re)built.
+    """
+    if imports is None:
+        imports = resolve_imports(pipeline.wdl)
+    content_hash = imports_content_hash(imports)
+    zip_fn = os.path.join(imports_cache_dn(), f"{pipeline.name}.{content_hash[:16]}.zip")
+    if os.path.exists(zip_fn):
+        return zip_fn, False
+    write_imports_zip(imports, zip_fn)
+    return zip_fn, True
+#-- build_pipeline_imports
+
+def is_cached_imports(pipeline):
+    return pipeline.imports is not None and os.path.dirname(os.path.abspath(pipeline.imports)) == imports_cache_dn()
+#-- is_cached_imports
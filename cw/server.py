@@ -77,10 +77,11 @@ def start_cmd():
     #2022-07-07 17:07:03,041 cromwell-system-akka.dispatchers.engine-dispatcher-4 INFO  - Cromwell 60 service started on 0.0.0.0:8888...
 
 
-    url = appcon.set(group="server", name="job_id", value=job_id)
-    url = appcon.set(group="server", name="host", value=host)
     url = f"http://{host}:{port}"
-    url = appcon.set(group="server", name="url", value=url)
+    with appcon.batch():
+        appcon.set(group="server", name="job_id", value=job_id)
+        appcon.set(group="server", name="host", value=host)
+        appcon.set(group="server", name="url", value=url)
     sys.stdout.write(f"Updating application configuration...\n")
     rv, msg = cw.cromshell.update_server(url)
     sys.stderr.write(msg)
@@ -135,7 +136,8 @@ def stop_cmd():
     cmd = ["bkill", job_id]
     subprocess.call(cmd)
     sys.stdout.write(f"Updating application configuration...\n")
-    url = appcon.set(group="server", name="job_id", value=None)
-    url = appcon.set(group="server", name="host", value=None)
-    url = appcon.set(group="server", name="url", value=None)
+    with appcon.batch():
+        appcon.set(group="server", name="job_id", value=None)
+        appcon.set(group="server", name="host", value=None)
+        appcon.set(group="server", name="url", value=None)
 cli.add_command(stop_cmd, name="stop")
@@ -0,0 +1,228 @@
+import hashlib, json, os, re
+
+# WDL Types
+def parse_type(type_str):
+    type_str = type_str.strip()
+    optional = type_str.endswith("?")
+    if optional:
+        type_str = type_str[:-1]
+    nonempty = type_str.endswith("+")
+    if nonempty:
+        type_str = type_str[:-1]
+    found = re.match(r"\A(\w+)(?:\[(.*)\])?\Z", type_str.strip())
+    if not found:
+        raise Exception(f"Failed to parse WDL type: {type_str}")
+    params = []
+    if found.group(2) is not None:
+        params = list(map(parse_type, split_top_level(found.group(2), ",")))
+    return {"name": found.group(1), "params": params, "optional": optional, "nonempty": nonempty}
+#-- parse_type
+
+def type_to_str(wdl_type):
+    s = wdl_type["name"]
+    if wdl_type["params"]:
+        s += "[" + ", ".join(map(type_to_str, wdl_type["params"])) + "]"
+    if wdl_type["nonempty"]:
+        s += "+"
+    if wdl_type["optional"]:
+        s += "?"
+    return s
+#-- type_to_str
+
+def split_top_level(s, sep):
+    tokens, depth, quote, start = [], 0, None, 0
+    for i, c in enumerate(s):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in ("'", '"'):
+            quote = c
+        elif c in "[({":
+            depth += 1
+        elif c in "])}":
+            depth -= 1
+        elif c == sep and depth == 0:
+            tokens.append(s[start:i])
+            start = i + 1
+    tokens.append(s[start:])
+    return tokens
+#-- split_top_level
+
+# WDL Parsing
+def strip_comments(text):
+    lines = []
+    for line in text.splitlines():
+        quote = None
+        for i, c in enumerate(line):
+            if quote is not None:
+                if c == quote:
+                    quote = None
+            elif c in ("'", '"'):
+                quote = c
+            elif c == "#":
+                line = line[:i]
+                break
+        lines.append(line)
+    return "\n".join(lines)
+#-- strip_comments
+
+def find_block(text, start_re, start=0):
+    found = re.compile(start_re).search(text, start)
+    if not found:
+        return None, None
+    depth = 0
+    for i in range(found.end() - 1, len(text)):
+        if text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return found, text[found.end():i]
+    raise Exception(f"Unbalanced braces in WDL block starting at <{found.group(0)}>")
+#-- find_block
+
+def logical_lines(text):
+    lines, buf, depth = [], "", 0
+    for line in text.splitlines():
+        buf = f"{buf} {line.strip()}".strip()
+        for c in line:
+            if c in "[({":
+                depth += 1
+            elif c in "])}":
+                depth -= 1
+        if buf and depth <= 0:
+            lines.append(buf)
+            buf, depth = "", 0
+    if buf:
+        lines.append(buf)
+    return lines
+#-- logical_lines
+
+decl_re = re.compile(r"\A(?P<type>.+?)\s+(?P<name>[A-Za-z_]\w*)\s*(?:=\s*(?P<expr>.+))?\Z")
+def parse_wdl_inputs(wdl_text):
+    text = strip_comments(wdl_text)
+    wf_match, wf_block = find_block(text, r"\bworkflow\s+(\w+)\s*\{")
+    if wf_match is None:
+        raise Exception("No workflow found in WDL")
+    _, inputs_block = find_block(wf_block, r"\binput\s*\{")
+    inputs = {}
+    for line in logical_lines(inputs_block or ""):
+        found = decl_re.match(line)
+        if not found:
+            raise Exception(f"Failed to parse WDL input declaration: {line}")
+        wdl_type = parse_type(found.group("type"))
+        has_default = found.group("expr") is not None
+        inputs[found.group("name")] = {
+                "type": wdl_type,
+                "required": not wdl_type["optional"] and not has_default,
+                }
+    return {"workflow": wf_match.group(1), "inputs": inputs}
+#-- parse_wdl_inputs
+
+def file_sha256(fn):
+    h = hashlib.sha256()
+    with open(fn, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+#-- file_sha256
+
+# Pipeline Signatures
+_signatures = {}
+def pipeline_signature(pipeline, cache_dn=None):
+    """
+    Parsed WDL inputs signature for a pipeline, cached by the sha256 of its WDL in memory and, if given, on disk.
+    """
+    sha = file_sha256(pipeline.wdl)
+    key = (pipeline.id, sha)
+    if key in _signatures:
+        return _signatures[key]
+    cache_fn = None
+    if cache_dn is not None:
+        cache_fn = os.path.join(cache_dn, f"{pipeline.id}.signature.json")
+        if os.path.exists(cache_fn):
+            with open(cache_fn, "r") as f:
+                cached = json.load(f)
+            if cached.get("wdl_sha256") == sha:
+                _signatures[key] = cached
+                return cached
+    with open(pipeline.wdl, "r") as f:
+        signature = parse_wdl_inputs(f.read())
+    signature["wdl_sha256"] = sha
+    if cache_fn is not None:
+        os.makedirs(cache_dn, exist_ok=True)
+        with open(cache_fn, "w") as f:
+            json.dump(signature, f)
+    _signatures[key] = signature
+    return signature
+#-- pipeline_signature
+
+# Validation
+remote_file_re = re.compile(r"\A\w+://")
+def check_value(key, wdl_type, value, file_exists=os.path.exists):
+    if value is None:
+        if wdl_type["optional"]:
+            return []
+        return [f"Input <{key}> is null, but type {type_to_str(wdl_type)} is not optional"]
+    name = wdl_type["name"]
+    if name in ("String", "File", "Directory"):
+        if not isinstance(value, str):
+            return [f"Input <{key}> expected {name}, got {type(value).__name__}: {value}"]
+        if name != "String" and not remote_file_re.match(value) and not file_exists(value):
+            return [f"Input <{key}> {name} does not exist: {value}"]
+        return []
+    if name == "Boolean":
+        if not isinstance(value, bool):
+            return [f"Input <{key}> expected Boolean, got {type(value).__name__}: {value}"]
+        return []
+    if name == "Int":
+        if isinstance(value, bool) or not isinstance(value, int):
+            return [f"Input <{key}> expected Int, got {type(value).__name__}: {value}"]
+        return []
+    if name == "Float":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return [f"Input <{key}> expected Float, got {type(value).__name__}: {value}"]
+        return []
+    if name == "Array":
+        if not isinstance(value, list):
+            return [f"Input <{key}> expected {type_to_str(wdl_type)}, got {type(value).__name__}"]
+        if wdl_type["nonempty"] and len(value) == 0:
+            return [f"Input <{key}> is a non-empty array, but no values given"]
+        errors = []
+        for i, v in enumerate(value):
+            errors += check_value(f"{key}[{i}]", wdl_type["params"][0], v, file_exists)
+        return errors
+    if name == "Map":
+        if not isinstance(value, dict):
+            return [f"Input <{key}> expected {type_to_str(wdl_type)}, got {type(value).__name__}"]
+        errors = []
+        for k, v in value.items():
+            errors += check_value(f"{key}[{k}]", wdl_type["params"][1], v, file_exists)
+        return errors
+    if name == "Pair":
+        if not isinstance(value, dict) or set(value.keys()) != set(["left", "right"]):
+            return [f"Input <{key}> expected {type_to_str(wdl_type)} as an object with left and right"]
+        return check_value(f"{key}.left", wdl_type["params"][0], value["left"], file_exists) + check_value(f"{key}.right", wdl_type["params"][1], value["right"], file_exists)
+    # Object and structs
+    if not isinstance(value, dict):
+        return [f"Input <{key}> expected {type_to_str(wdl_type)} object, got {type(value).__name__}"]
+    return []
+#-- check_value
+
+def validate_inputs(signature, inputs, file_exists=os.path.exists):
+    wf_name = signature["workflow"]
+    errors = []
+    for name, decl in signature["inputs"].items():
+        key = ".".join([wf_name, name])
+        if key not in inputs:
+            if decl["required"]:
+                errors.append(f"Missing required input <{key}> of type {type_to_str(decl['type'])}")
+            continue
+        errors += check_value(key, decl["type"], inputs[key], file_exists)
+    for key in inputs.keys():
+        tokens = key.split(".")
+        # Only workflow level inputs, call inputs may be nested deeper
+        if len(tokens) == 2 and (tokens[0] != wf_name or tokens[1] not in signature["inputs"]):
+            errors.append(f"Unknown input <{key}>")
+    return errors
+#-- validate_inputs
@@ -1,10 +1,17 @@
 import click, sys, tabulate
 from cw import db, Workflow
 from cw.model_helpers import get_wf, get_pipeline, resolve_features, wf_features, wf_features_help
+from mgi.lazy_click import LazyGroup
 
 #curl --connect-timeout 5 --max-time 10 -s http://compute1-exec-226.ris.wustl.edu:8888/api/workflows/v1/c808fe24-0edd-46c4-ba23-ff881725e297/status {"status":"Succeeded","id":"c808fe24-0edd-46c4-ba23-ff881725e297"}
 
-@click.group(short_help="commands for workflows")
+@click.group(cls=LazyGroup, short_help="commands for workflows", lazy_commands={
+    "metadata": ["cw.wf_metadata:metadata_cmd", "get metadata of a workflow"],
+    "outputs": ["cw.wf_outputs:cli", "commands for wf outputs"],
+    "status": ["cw.wf_status:status_cmd", "get status of a workflow"],
+    "submit": ["cw.wf_submit:submit_cmd", "submit a workflow"],
+    "validate": ["cw.wf_validate:validate_cmd", "validate workflow inputs"],
+    })
 def cli():
     "Commands for Workflows"
     pass
@@ -53,18 +60,6 @@ def list_cmd():
     print(tabulate.tabulate(rows, ["WF_ID" , "NAME", "STATUS", "PIPELINE", "INPUTS"], tablefmt="simple"))
 cli.add_command(list_cmd, name="list")
 
-from cw.wf_metadata import metadata_cmd as cmd
-cli.add_command(cmd, name="metadata")
-
-from cw.wf_outputs import cli as outputs_cli
-cli.add_command(outputs_cli, name="outputs")
-
-from cw.wf_status import status_cmd as cmd
-cli.add_command(cmd, name="status")
-
-from cw.wf_submit import submit_cmd as cmd
-cli.add_command(cmd, name="submit")
-
 
 update_help = f"""
 Update a Workflow
@@ -2,7 +2,7 @@ import click, os, subprocess, time, sys
 
 from cw import db, Workflow
 from cw.model_helpers import get_pipeline
-import  cw.server
+import cw.pl_build, cw.server
 
 @click.command(short_help="submit a workflow")
 @click.argument("name", required=True, nargs=1)
@@ -40,7 +40,7 @@ def submit_cmd(name, pipeline_identifier, inputs_json):
     if status == "running":
         sys.stdout.write("Workflow is running and saved DB!\n")
     else:
-        sys.stdout.write("Workflow failed to start. Please verify by checking server logs in <server/log>. Typically failures are due to misconfiguration of inputs or missing files.\n")
+        sys.stdout.write("Workflow failed to start. Please verify by checking server logs in <server/log>. Typically failures are due to misconfiguration of inputs or missing files, check inputs with 'cw wf validate'.\n")
 #-- submit_cmd
 
 def submit_wf(pipeline, inputs_json):
@@ -53,8 +53,12 @@ def submit_wf(pipeline, inputs_json):
         sys.stdout.write(f"Cromwell server is not running or misconfigured.\n")
         return
     cmd = ["java", "-jar", "/apps/cromwell/cromwell.jar", "submit", pipeline.wdl, "-i", inputs_json, "--host", server.url()]
-    if pipeline.imports is not None:
-        cmd += ["--imports", pipeline.imports]
+    imports = pipeline.imports
+    if cw.pl_build.is_cached_imports(pipeline):
+        # Rebuilds the zip only if an imported WDL changed, the pipeline keeps its saved path
+        imports = cw.pl_build.build_pipeline_imports(pipeline)[0]
+    if imports is not None:
+        cmd += ["--imports", imports]
     return subprocess.check_output(cmd)
 #-- submit_wf
 
@@ -0,0 +1,62 @@
+import click, functools, json, os, sys
+from concurrent.futures import ThreadPoolExecutor
+
+from cw import appcon
+from cw.model_helpers import get_pipeline
+from cw.wdl import pipeline_signature, validate_inputs
+
+@click.command(short_help="validate workflow inputs")
+@click.argument("pipeline_identifier", required=True, nargs=1)
+@click.argument("inputs_jsons", required=True, nargs=-1)
+@click.option("--threads", "-t", type=int, default=8, show_default=True, help="Number of inputs files to check at once.")
+def validate_cmd(pipeline_identifier, inputs_jsons, threads):
+    """
+    Validate Workflow Inputs
+
+    \b
+    Give:
+    pipeline_identifier  pipeline name/id
+    inputs_jsons         one or more pipeline inputs json
+
+    Inputs are checked against the pipeline WDL input section for missing required inputs, unknown inputs, type mismatches and files that do not exist. The parsed WDL inputs are cached, and only re-parsed when the WDL changes.
+    """
+    pipeline = get_pipeline(pipeline_identifier)
+    if pipeline is None:
+        sys.stderr.write(f"Failed to find pipeline for <{pipeline_identifier}>!\n")
+        sys.exit(1)
+    if not os.path.exists(pipeline.wdl):
+        sys.stderr.write(f"Pipeline {pipeline.name} WDL {pipeline.wdl} does not exist!\n")
+        sys.exit(1)
+    signature = pipeline_signature(pipeline, cache_dn=appcon.dn_for("cache"))
+    results = validate_inputs_files(signature, inputs_jsons, threads=threads)
+    invalid = 0
+    for inputs_json, errors in results:
+        if errors:
+            invalid += 1
+            sys.stdout.write(f"[INVALID] {inputs_json}\n")
+            sys.stdout.write("".join(map(lambda e: f"  {e}\n", errors)))
+        else:
+            sys.stdout.write(f"[OK] {inputs_json}\n")
+    if invalid:
+        sys.stderr.write(f"Found {invalid} of {len(results)} inputs files with errors.\n")
+        sys.exit(1)
+#-- validate_cmd
+
+def validate_inputs_file(signature, inputs_json, file_exists=os.path.exists):
+    try:
+        with open(inputs_json, "r") as f:
+            inputs = json.load(f)
+    except (OSError, ValueError) as e:
+        return [f"Failed to load inputs json: {e}"]
+    if not isinstance(inputs, dict):
+        return ["Inputs json is not an object of inputs"]
+    return validate_inputs(signature, inputs, file_exists=file_exists)
+#-- validate_inputs_file
+
+def validate_inputs_files(signature, inputs_jsons, threads=8):
+    # Shared across inputs, so common files (references, etc) are only checked once
+    file_exists = functools.lru_cache(maxsize=None)(os.path.exists)
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        errors = executor.map(lambda fn: validate_inputs_file(signature, fn, file_exists), inputs_jsons)
+        return list(zip(inputs_jsons, errors))
+#-- validate_inputs_files
@@ -1,14 +1,11 @@
-import os
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-
-mgi_app = Flask(__name__)
-class Config(object):
-    SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-mgi_app.config.from_object(Config)
-db = SQLAlchemy(mgi_app)
-migrate = Migrate(mgi_app, db)
-
-from mgi import models
+# The db is created on first use, so commands that do not need it start fast
+def __getattr__(name):
+    global db
+    if name == "db":
+        from mgi.database import Database
+        db = Database(uri_env="SQLALCHEMY_DATABASE_URI")
+        return db
+    if name == "models":
+        import mgi.models
+        return mgi.models
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
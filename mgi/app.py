@@ -0,0 +1,12 @@
+from flask import Flask
+
+from mgi import db
+
+def create_app():
+    """
+    Flask app for a web UI, sharing the db sessions with the CLIs. Flask is optional, and not used by the CLIs.
+    """
+    app = Flask("mgi")
+    app.teardown_appcontext(lambda exc: db.session.remove())
+    return app
+#-- create_app
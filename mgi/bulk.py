@@ -0,0 +1,93 @@
+import csv, io, itertools
+
+def chunked(rows, size):
+    rows_i = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows_i, size))
+        if not chunk:
+            return
+        yield chunk
+#-- chunked
+
+def insert_for_dialect(con, table):
+    """
+    Dialect specific insert with on_conflict_do_* methods.
+    """
+    name = con.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise Exception(f"No upsert support for database dialect: {name}")
+    return insert(table)
+#-- insert_for_dialect
+
+def upsert_statement(con, table, index_elements, columns):
+    stmt = insert_for_dialect(con, table)
+    update_columns = [c for c in columns if c not in index_elements]
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_={c: stmt.excluded[c] for c in update_columns})
+#-- upsert_statement
+
+def upsert_rows(con, table, rows, index_elements, chunk_size=5000):
+    """
+    Insert rows, updating the given columns of rows that conflict on the index elements. Rows are dicts, grouped by their columns, so only given columns are updated.
+    """
+    count = 0
+    for chunk in chunked(rows, chunk_size):
+        for columns, group in itertools.groupby(sorted(chunk, key=lambda r: sorted(r.keys())), key=lambda r: sorted(r.keys())):
+            group = list(group)
+            con.execute(upsert_statement(con, table, index_elements, columns), group)
+            count += len(group)
+    return count
+#-- upsert_rows
+
+def copy_rows(con, table, rows, index_elements, chunk_size=100000):
+    """
+    Postgres fast path: COPY rows into a temporary staging table, then upsert them into the table with one INSERT ... SELECT per chunk.
+    """
+    count = 0
+    staging = f"_stage_{table.name}"
+    for chunk in chunked(rows, chunk_size):
+        for columns, group in itertools.groupby(sorted(chunk, key=lambda r: sorted(r.keys())), key=lambda r: sorted(r.keys())):
+            group = list(group)
+            quoted = ", ".join([f'"{c}"' for c in columns])
+            # Only the given columns, without defaults, so sequences are only used by the insert
+            con.exec_driver_sql(f"DROP TABLE IF EXISTS {staging}")
+            con.exec_driver_sql(f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {quoted} FROM "{table.name}" WITH NO DATA')
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for row in group:
+                writer.writerow(["\\N" if row[c] is None else row[c] for c in columns])
+            buf.seek(0)
+            with con.connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {staging} ({quoted}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+            update_columns = [c for c in columns if c not in index_elements]
+            conflict = ", ".join([f'"{c}"' for c in index_elements])
+            if update_columns:
+                on_conflict = f"DO UPDATE SET " + ", ".join([f'"{c}" = EXCLUDED."{c}"' for c in update_columns])
+            else:
+                on_conflict = "DO NOTHING"
+            con.exec_driver_sql(f'INSERT INTO "{table.name}" ({quoted}) SELECT {quoted} FROM {staging} ON CONFLICT ({conflict}) {on_conflict}')
+            count += len(group)
+    return count
+#-- copy_rows
+
+def can_copy(con):
+    # COPY FROM STDIN is done with copy_expert of psycopg2 cursors, looked up on the driver module
+    if con.dialect.name != "postgresql":
+        return False
+    extensions = getattr(con.dialect.dbapi, "extensions", None)
+    return hasattr(getattr(extensions, "cursor", None), "copy_expert")
+#-- can_copy
+
+def load_rows(con, table, rows, index_elements):
+    """
+    Bulk upsert rows into the table, with COPY on Postgres, and batched INSERT ... ON CONFLICT otherwise.
+    """
+    if can_copy(con):
+        return copy_rows(con, table, rows, index_elements)
+    return upsert_rows(con, table, rows, index_elements)
+#-- load_rows
@@ -0,0 +1,271 @@
+import click, csv, gzip, os, sys, time
+from sqlalchemy import Boolean, BigInteger, Integer, select
+
+from mgi.bulk import chunked, load_rows
+from mgi.models import db, eset_entity, Entity, EntityFeature, EntityPath, EntitySet, path_columns
+
+# Table, columns, natural key columns for import, and low cardinality columns to dictionary encode
+CATALOG = [
+    [Entity.__table__, ["id", "name", "kind"], ["name", "kind"], ["kind"]],
+    [EntitySet.__table__, ["id", "name", "kind"], ["name"], ["kind"]],
+    [EntityFeature.__table__, ["entity_id", "group", "name", "value"], ["entity_id", "group", "name"], ["group", "name"]],
+    [EntityPath.__table__, ["id", "entity_id", "group", "kind", "value", "size", "mtime", "checksum", "exists"], ["value_hash"], ["group", "kind"]],
+    [eset_entity, ["eset_id", "entity_id"], None, []],
+]
+# Id columns of the files, by the table they refer to
+REFERENCES = {"entity_id": "entity", "eset_id": "eset"}
+# NULL in tsv.gz files, as in Postgres COPY. Strings starting with a backslash get another one
+TSV_NULL = "\\N"
+FORMATS = {"arrow": "arrow", "parquet": "parquet", "tsv.gz": "tsv.gz"}
+
+def catalog_fn(dn, table, fmt):
+    return os.path.join(dn, f"{table.name}.{fmt}")
+#-- catalog_fn
+
+def arrow_schema(table, columns, dictionary_columns):
+    import pyarrow as pa
+    fields = []
+    for name in columns:
+        column_type = table.c[name].type
+        if isinstance(column_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, (BigInteger, Integer)):
+            arrow_type = pa.int64()
+        elif name in dictionary_columns:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+#-- arrow_schema
+
+class ArrowWriter():
+    """
+    Write batches of rows to parquet or arrow files. Dictionaries only grow across batches, so the arrow file gets delta dictionaries, not replacements, which the file format does not allow.
+    """
+    def __init__(self, fn, fmt, schema):
+        import pyarrow as pa
+        self.schema = schema
+        self.dictionaries = {field.name: {} for field in schema if pa.types.is_dictionary(field.type)}
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(fn, schema)
+        else:
+            self.sink = pa.OSFile(fn, "wb")
+            self.writer = pa.ipc.new_file(self.sink, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def write_rows(self, rows):
+        import pyarrow as pa
+        arrays = []
+        for i, field in enumerate(self.schema):
+            values = [r[i] for r in rows]
+            if field.name in self.dictionaries:
+                dictionary = self.dictionaries[field.name]
+                indices = [None if v is None else dictionary.setdefault(v, len(dictionary)) for v in values]
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(list(dictionary.keys()), type=pa.string())))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        if hasattr(self, "sink"):
+            self.sink.close()
+#-- ArrowWriter
+
+def tsv_value(v):
+    if v is None:
+        return TSV_NULL
+    if isinstance(v, bool):
+        return int(v)
+    if isinstance(v, str) and v.startswith("\\"):
+        return "\\" + v
+    return v
+#-- tsv_value
+
+def tsv_string(v):
+    if v == TSV_NULL:
+        return None
+    if v.startswith("\\"):
+        return v[1:]
+    return v
+#-- tsv_string
+
+class TsvWriter():
+    def __init__(self, fn, columns):
+        self.f = gzip.open(fn, "wt", compresslevel=6, newline="")
+        self.writer = csv.writer(self.f, delimiter="\t", lineterminator="\n")
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows([[tsv_value(v) for v in r] for r in rows])
+
+    def close(self):
+        self.f.close()
+#-- TsvWriter
+
+def export_catalog(dn, fmt, chunk_size=50000):
+    """
+    Stream the catalog tables into one file per table, in chunks read with a server side cursor. Returns the row counts by table.
+    """
+    os.makedirs(dn, exist_ok=True)
+    counts = {}
+    with db.engine.connect() as con:
+        con = con.execution_options(stream_results=True)
+        for table, columns, key_columns, dictionary_columns in CATALOG:
+            fn = catalog_fn(dn, table, fmt)
+            if fmt == "tsv.gz":
+                writer = TsvWriter(fn, columns)
+            else:
+                writer = ArrowWriter(fn, fmt, arrow_schema(table, columns, dictionary_columns))
+            counts[table.name] = 0
+            try:
+                result = con.execute(select(*[table.c[c] for c in columns]))
+                for rows in result.partitions(chunk_size):
+                    writer.write_rows(rows)
+                    counts[table.name] += len(rows)
+            finally:
+                writer.close()
+    return counts
+#-- export_catalog
+
+def read_catalog_file(fn, fmt, table, chunk_size):
+    # Batches of row dicts
+    if fmt == "tsv.gz":
+        converters = {}
+        for name in table.c.keys():
+            column_type = table.c[name].type
+            # Empty numbers and booleans are NULL too
+            if isinstance(column_type, Boolean):
+                converters[name] = lambda v: None if v in ("", TSV_NULL) else v == "1"
+            elif isinstance(column_type, (BigInteger, Integer)):
+                converters[name] = lambda v: None if v in ("", TSV_NULL) else int(v)
+            else:
+                converters[name] = tsv_string
+        with gzip.open(fn, "rt", newline="") as f:
+            rdr = csv.DictReader(f, delimiter="\t")
+            for chunk in chunked(rdr, chunk_size):
+                yield [{k: converters[k](v) for k, v in r.items()} for r in chunk]
+        return
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(fn).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+    import pyarrow as pa
+    with pa.memory_map(fn, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pylist()
+#-- read_catalog_file
+
+def detect_format(dn):
+    for fmt in FORMATS:
+        if os.path.exists(catalog_fn(dn, Entity.__table__, fmt)):
+            return fmt
+    raise Exception(f"No catalog files found in {dn}")
+#-- detect_format
+
+def ids_for_keys(con, table, key_columns, keys):
+    # Database ids of rows by their natural keys, selected by the first key column and matched on all
+    ids = {}
+    for chunk in chunked(list(set(keys)), 5000):
+        stmt = select(table.c.id, *[table.c[c] for c in key_columns]).where(table.c[key_columns[0]].in_({k[0] for k in chunk}))
+        for row in con.execute(stmt):
+            ids[tuple(row[1:])] = row[0]
+    return ids
+#-- ids_for_keys
+
+def rows_not_in_db(con, table, columns, rows):
+    # Rows of a table without a natural key that are not in the database, matched on all columns and selected by the last one, the first of the eset_entity index
+    keys = {tuple(row[c] for c in columns) for row in rows}
+    existing = set()
+    for chunk in chunked(list({k[-1] for k in keys}), 5000):
+        stmt = select(*[table.c[c] for c in columns]).where(table.c[columns[-1]].in_(chunk))
+        existing.update(tuple(row) for row in con.execute(stmt))
+    return [dict(zip(columns, k)) for k in sorted(keys - existing)]
+#-- rows_not_in_db
+
+def pyarrow_error(fmt):
+    # Error for the parquet and arrow formats without pyarrow, else None
+    if fmt == "tsv.gz":
+        return None
+    try:
+        import pyarrow
+    except ImportError:
+        return f"The {fmt} format needs the pyarrow package, install it with: pip install mgi[arrow]"
+    return None
+#-- pyarrow_error
+
+def import_catalog(dn, chunk_size=50000):
+    """
+    Bulk load catalog files written by export. Rows are upserted by their natural keys: entity name and kind, set name, feature entity, group and name, and path value. Ids are assigned by the database, and ids in the files are mapped to them. Set memberships are added if missing, checked in chunks. Returns the row counts by table.
+    """
+    fmt = detect_format(dn)
+    counts = {}
+    ids = {name: {} for name in REFERENCES.values()}
+    con = db.session.connection()
+    for table, columns, key_columns, dictionary_columns in CATALOG:
+        fn = catalog_fn(dn, table, fmt)
+        counts[table.name] = 0
+        if not os.path.exists(fn):
+            continue
+        for rows in read_catalog_file(fn, fmt, table, chunk_size):
+            for row in rows:
+                for column, name in REFERENCES.items():
+                    if column in row:
+                        if row[column] not in ids[name]:
+                            raise Exception(f"The {table.name} file refers to {column} {row[column]}, which is not in the {name} file")
+                        row[column] = ids[name][row[column]]
+                if table is EntityPath.__table__:
+                    row.update(path_columns(row["value"]))
+            file_ids = [row.pop("id") for row in rows] if "id" in columns else None
+            if key_columns is None:
+                rows = rows_not_in_db(con, table, columns, rows)
+                if rows:
+                    con.execute(table.insert(), rows)
+            else:
+                load_rows(con, table, rows, index_elements=key_columns)
+            if file_ids is not None and table.name in ids:
+                keys = [tuple(row[c] for c in key_columns) for row in rows]
+                db_ids = ids_for_keys(con, table, key_columns, keys)
+                ids[table.name].update(zip(file_ids, [db_ids[k] for k in keys]))
+            counts[table.name] += len(rows)
+    db.session.commit()
+    return counts
+#-- import_catalog
+
+@click.command(short_help="export the catalog to columnar files")
+@click.argument("directory", type=click.STRING, required=True, nargs=1)
+@click.option("--format", "-f", "fmt", type=click.Choice(list(FORMATS.keys())), default="parquet", show_default=True, help="File format, parquet and arrow need pyarrow")
+def export_cmd(directory, fmt):
+    """
+    Export the Catalog
+
+    Write entities, sets, features, paths and set memberships to one file per table in the directory, named like entity.parquet. Kind, group and feature name columns are dictionary encoded in parquet and arrow files. Tables are streamed from the database in chunks.
+    """
+    error = pyarrow_error(fmt)
+    if error is not None:
+        sys.stderr.write(f"{error}, or use tsv.gz\n")
+        sys.exit(1)
+    start = time.time()
+    counts = export_catalog(directory, fmt)
+    sys.stdout.write(f"Exported {' '.join([f'{n}:{c}' for n, c in counts.items()])} to {directory} in {time.time() - start:.1f}s\n")
+#-- export_cmd
+
+@click.command(short_help="import the catalog from exported files")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False), required=True, nargs=1)
+def import_cmd(directory):
+    """
+    Import the Catalog
+
+    Bulk load the files written by export, in any of its formats. Rows are added or updated by their natural keys (entity name and kind, set name, path value), so a snapshot can be restored into a new or existing database. Ids are assigned by the database, so they may differ from the exported ones.
+    """
+    error = pyarrow_error(detect_format(directory))
+    if error is not None:
+        sys.stderr.write(f"{error}\n")
+        sys.exit(1)
+    start = time.time()
+    counts = import_catalog(directory)
+    sys.stdout.write(f"Imported {' '.join([f'{n}:{c}' for n, c in counts.items()])} from {directory} in {time.time() - start:.1f}s\n")
+#-- import_cmd
@@ -1,21 +1,19 @@
 import click
 
+from mgi.lazy_click import LazyGroup
+
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
-@click.group(context_settings=CONTEXT_SETTINGS)
+@click.group(cls=LazyGroup, context_settings=CONTEXT_SETTINGS, lazy_commands={
+    "export": ["mgi.catalog:export_cmd", "export the catalog to columnar files"],
+    "import": ["mgi.catalog:import_cmd", "import the catalog from exported files"],
+    "paths": ["mgi.paths.cli:paths_cli", "find and summarize entity paths"],
+    "pl": ["mgi.pipelines.cli:pl_cli", "pipelines info and tools"],
+    "refs": ["mgi.refs.cli:refs_cli", "work with refs"],
+    "samples": ["mgi.samples.cli:samples_cli", "work with samples"],
+    "utils": ["mgi.utils:utils_cli", "hopefully handy commands"],
+    })
 def cli():
     """
     MGI Sample Management and Tools
     """
     pass
-
-from mgi.pipelines.cli import pl_cli
-cli.add_command(pl_cli, name="pl")
-
-from mgi.samples.cli import samples_cli
-cli.add_command(samples_cli, name="samples")
-
-from mgi.refs.cli import refs_cli
-cli.add_command(refs_cli, name="refs")
-
-from mgi.utils import utils_cli
-cli.add_command(utils_cli, name="utils")
@@ -0,0 +1,108 @@
+import os, sqlalchemy
+from sqlalchemy import orm
+
+# Set on each new SQLite connection, busy_timeout first so a journal mode change waits for other
+# connections. WAL lets readers run alongside a writer, and with synchronous NORMAL commits do not
+# fsync, only checkpoints do.
+SQLITE_PRAGMAS = {
+    "busy_timeout": 60000, # ms
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536, # KiB
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+# WAL needs shared memory between all connections, so it is not safe with writers on many hosts and
+# the DB on a network filesystem, like LSF jobs on NFS. There, set SQLITE_JOURNAL_MODE=DELETE (or
+# another rollback journal mode) in the environment, for these instead of the WAL ones.
+SQLITE_NETWORK_PRAGMAS = {
+    "synchronous": "FULL",
+    "mmap_size": 0,
+}
+
+def create_engine(uri, sqlite_pragmas=SQLITE_PRAGMAS, **kwargs):
+    engine = sqlalchemy.create_engine(uri, **kwargs)
+    if engine.dialect.name == "sqlite" and sqlite_pragmas:
+        pragmas = dict(sqlite_pragmas)
+        journal_mode = os.environ.get("SQLITE_JOURNAL_MODE", None)
+        if journal_mode is not None and journal_mode.upper() != "WAL":
+            pragmas.update(SQLITE_NETWORK_PRAGMAS)
+            pragmas["journal_mode"] = journal_mode
+        @sqlalchemy.event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_con, con_record):
+            cursor = dbapi_con.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return engine
+#-- create_engine
+
+class _QueryProperty(object):
+    def __get__(self, obj, cls):
+        return cls.__db__.session.query(cls)
+#-- _QueryProperty
+
+class Database(object):
+    """
+    Plain SQLAlchemy engine, session and declarative model base for the CLIs.
+
+    The URI is given, or taken from the uri_env environment variable when the engine is first needed. SQLAlchemy names (Column, String, relationship, ...) are available as attributes, and models have a query property, like Flask-SQLAlchemy.
+    """
+    def __init__(self, uri=None, uri_env=None, sqlite_pragmas=SQLITE_PRAGMAS):
+        self._uri = uri
+        self.uri_env = uri_env
+        self.sqlite_pragmas = sqlite_pragmas
+        self._engine = None
+        self._engine_uri = None
+        self.Model = orm.declarative_base()
+        self.Model.__db__ = self
+        self.Model.query = _QueryProperty()
+        self.metadata = self.Model.metadata
+        self._session = orm.scoped_session(lambda: orm.Session(bind=self.engine))
+
+    def __getattr__(self, name):
+        for module in (sqlalchemy, orm):
+            if hasattr(module, name):
+                return getattr(module, name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    @property
+    def session(self):
+        if self._engine is not None and self.uri() != self._engine_uri:
+            # The environment URI changed, so drop the session bound to the old engine
+            self._session.remove()
+            self.dispose()
+        return self._session
+
+    def uri(self, uri=None):
+        if uri is not None and uri != self._uri:
+            self._session.remove()
+            self.dispose()
+            self._uri = uri
+        if self._uri is None and self.uri_env is not None:
+            return os.environ.get(self.uri_env)
+        return self._uri
+
+    @property
+    def engine(self):
+        uri = self.uri()
+        if uri is None:
+            raise Exception(f"No DB URI given or found{' in ' + self.uri_env if self.uri_env else ''}!")
+        if self._engine is None or uri != self._engine_uri:
+            # First use, or the environment URI changed
+            if self._engine is not None:
+                self._session.remove()
+            self.dispose()
+            self._engine = create_engine(uri, sqlite_pragmas=self.sqlite_pragmas)
+            self._engine_uri = uri
+        return self._engine
+
+    def dispose(self):
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+            self._engine_uri = None
+
+    def create_all(self, engine=None):
+        self.metadata.create_all(engine or self.engine)
+#-- Database
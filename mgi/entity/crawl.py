@@ -0,0 +1,24 @@
+import time
+
+from mgi.entity.path import update_entities_paths
+from mgi.inventory import inventory_for_uri
+
+def crawl_entities_paths(root, entity_kind, features={}, threads=8, batch_size=5000):
+    """
+    Register the files under root as entity paths, loaded like paths update, with a commit per batch. Root can be a local directory, or an object store URI. Entity names and path kinds are resolved from the file names, and entities created as needed.
+
+    Returns a dict of stats: files, directories, added, updated, errors and seconds.
+    """
+    inventory = inventory_for_uri(root, threads=threads)
+    stats = {"files": 0}
+    def records():
+        for record in inventory:
+            stats["files"] += 1
+            yield record
+    start = time.time()
+    stats["added"], stats["updated"] = update_entities_paths(records(), features, entity_kind=entity_kind, batch_size=batch_size, commit_batches=True)
+    stats["directories"] = inventory.scanned
+    stats["errors"] = inventory.errors
+    stats["seconds"] = time.time() - start
+    return stats
+#-- crawl_entities_paths
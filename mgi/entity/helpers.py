@@ -51,6 +51,10 @@ class GcpStatReader():
 #-- GcpStatReader
 
 def paths_rdr_factory(fn):
+    from mgi.inventory import inventory_for_uri, is_inventory_uri
+    if is_inventory_uri(fn):
+        return inventory_for_uri(fn)
+
     if not os.path.exists(fn):
         return [{"entity": fn}]
 
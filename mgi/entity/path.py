@@ -1,6 +1,8 @@
 import click, csv
+from sqlalchemy import select
 
-from mgi.models import db, Entity, EntityPath
+from mgi.bulk import chunked, load_rows, upsert_rows
+from mgi.models import db, Entity, EntityPath, path_columns, value_hash
 from mgi.entity.helpers import resolve_entity_and_kind_from_value
 
 update_help = """
@@ -17,6 +19,7 @@ update_help = """
     group     A group to gather paths by
     kind      bam, gvcf, ...
     checksum  A checksum for the files
+    size      Size in bytes
     exists    True (true, 1, Y) or False (false, 2, N)
     value     The file or path
 
@@ -55,6 +58,11 @@ update_help = """
 
     FILE group=chohort_22
 
+    \b
+    UPDATE from a storage listing. Give a local directory, or a gs:// or s3:// URI, and all the files under it are added with their size, checksum (object stores) and modification time (local).
+
+    gs://bucket/cohort_22 group=chohort_22
+
     """
 
 def get_entity(name, kind):
@@ -66,7 +74,7 @@ def add_entity(name, kind):
 #-- add_entity
     
 def get_entity_path(features):
-    return EntityPath.query.filter(EntityPath.entity_id == features["entity_id"], EntityPath.value == features["value"]).one_or_none()
+    return EntityPath.query.filter(EntityPath.value_hash == value_hash(features["value"]), EntityPath.entity_id == features["entity_id"]).one_or_none()
 #-- get_entity_path
 
 def add_entity_path(attrs):
@@ -74,51 +82,98 @@ def add_entity_path(attrs):
 #-- add_entity_path
 
 def update_entity_path(ep, attrs):
-    for k, v in attrs:
+    for k, v in attrs.items():
         setattr(ep, k, v)
 #-- update_entity_path
 
-def update_entities_paths(rdr, features, entity_kind, create_entities=True):
+def resolve_entity_ids(names, kind, create_entities=True):
+    """
+    Map of entity names to ids, selected and created in bulk.
+    """
+    con = db.session.connection()
+    def select_ids(names):
+        ids = {}
+        for chunk in chunked(sorted(names), 500):
+            for entity_id, name in con.execute(select(Entity.id, Entity.name).where(Entity.kind == kind, Entity.name.in_(chunk))):
+                ids[name] = entity_id
+        return ids
+    ids = select_ids(names)
+    missing = set(names) - set(ids.keys())
+    if missing:
+        if not create_entities:
+            raise Exception(f"Entities do not exist: {' '.join(sorted(missing))}")
+        upsert_rows(con, Entity.__table__, [{"name": n, "kind": kind} for n in missing], index_elements=["name", "kind"])
+        ids.update(select_ids(missing))
+    return ids
+#-- resolve_entity_ids
+
+def existing_entity_path_hashes(hashes):
+    con = db.session.connection()
+    existing = set()
+    for chunk in chunked(sorted(hashes), 500):
+        existing.update(con.execute(select(EntityPath.value_hash).where(EntityPath.value_hash.in_(chunk))).scalars())
+    return existing
+#-- existing_entity_path_hashes
+
+def update_entities_paths(rdr, features, entity_kind, create_entities=True, batch_size=5000, commit_batches=False):
+    """
+    Upsert entity paths from dicts with a value, in batches. Entity names and kinds not given are resolved from the values. With commit_batches, each batch is committed, for long streams like crawls, otherwise all are committed at the end. Returns the added and updated counts.
+    """
+    features = dict(features)
+    features_entity_name = features.pop("entity", None)
+    if "exists" in features:
+        features["exists"] = to_bool(features["exists"])
     added, updated = 0, 0
-    for ep_d in rdr:
-        # Need a value
-        if "value" not in ep_d:
-            raise Exception(f"No entity path value given in:\n{ep_d}")
-
-        # Get entity name from ep dict, then check features
-        entity_name = ep_d.pop("entity", None)
-        if entity_name is None:
-            entity_name = features.pop("entity", None)
-
-        # If not given, get entity name and ep kind from file name
-        if entity_name is None or "kind" not in ep_id:
-            ename1, kind, ename2 = resolve_entity_and_kind_from_value(ep_d["value"])
-            if entity_name is None: # FIXME use ename2?
-                entity_name = ename1
-            if "kind" not in ep_d:
-                ep_d["kind"] = kind
-
-        # Add or create the entity
-        entity = get_entity(name=entity_name, kind=entity_kind)
-        if entity is None: # FIXME maybe do not create?
-            entity = add_entity(entity_name, entity_kind)
-            if entity is None:
-                raise Exception("Failed to create entity: {entity_name} {entity_kind}")
-            db.session.add(entity)
-            db.session.flush()
-
-        # Update the sp dict
-        ep_d["entity_id"] = entity.id
-        ep_d.update(features)
-        # Add or create the ep
-        ep = get_entity_path(ep_d)
-        if ep is None:
-            added += 1
-            ep = add_entity_path(ep_d)
-        else:
-            updated += 1
-            update_entity_path(ep, ep_d)
-        db.session.add(ep)
+    entity_ids = {}
+    for batch in chunked(rdr, batch_size):
+        eps = {}
+        for ep_d in batch:
+            ep_d = dict(ep_d)
+            # Need a value
+            if "value" not in ep_d:
+                raise Exception(f"No entity path value given in:\n{ep_d}")
+
+            # Get entity name from ep dict, then check features
+            entity_name = ep_d.pop("entity", None)
+            if entity_name is None:
+                entity_name = features_entity_name
+
+            # If not given, get entity name and ep kind from file name
+            if entity_name is None or "kind" not in ep_d:
+                ename1, kind, ename2 = resolve_entity_and_kind_from_value(ep_d["value"])
+                if entity_name is None: # FIXME use ename2?
+                    entity_name = ename1
+                if "kind" not in ep_d:
+                    ep_d["kind"] = kind
+
+            if "exists" in ep_d:
+                ep_d["exists"] = to_bool(ep_d["exists"])
+            if "size" in ep_d:
+                ep_d["size"] = int(ep_d["size"]) if ep_d["size"] not in [None, ""] else None
+            ep_d.update(features)
+            ep_d.update(path_columns(ep_d["value"]))
+            # Last one wins for repeated values
+            eps[ep_d["value_hash"]] = (entity_name, ep_d)
+
+        names = set([entity_name for entity_name, ep_d in eps.values()]) - set(entity_ids.keys())
+        if names:
+            entity_ids.update(resolve_entity_ids(names, entity_kind, create_entities=create_entities))
+        existing = existing_entity_path_hashes(eps.keys())
+        rows = []
+        for entity_name, ep_d in eps.values():
+            ep_d["entity_id"] = entity_ids[entity_name]
+            rows.append(ep_d)
+        load_rows(db.session.connection(), EntityPath.__table__, rows, index_elements=["value_hash"])
+        if commit_batches:
+            db.session.commit()
+        added += len(rows) - len(existing)
+        updated += len(existing)
     db.session.commit()
     return added, updated
 #-- update_entities_paths
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return value not in [None, "", "0", "false", "False", "n", "N"]
+#-- to_bool
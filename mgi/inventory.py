@@ -0,0 +1,266 @@
+import base64, os, queue, re, threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ParallelWalker():
+    """
+    Walk a tree of work items in a pool of threads, yielding results as they are found.
+
+    Subclasses implement scan(item), which calls submit(item) for more items to scan, and put(results) with a list of results. Results wait in a bounded queue, so the threads pause when the consumer falls behind, keeping memory bounded.
+    """
+    def __init__(self, threads=8, queue_size=64):
+        self.threads = threads
+        self.results = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.scanned = 0
+        self.errors = []
+
+    def start_items(self):
+        raise NotImplementedError
+
+    def scan(self, item):
+        raise NotImplementedError
+
+    def put(self, results):
+        while not self.stop.is_set():
+            try:
+                self.results.put(results, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def submit(self, item):
+        if self.stop.is_set():
+            return
+        with self.lock:
+            self.pending += 1
+        self.executor.submit(self._scan, item)
+
+    def _scan(self, item):
+        try:
+            if not self.stop.is_set():
+                self.scan(item)
+        except Exception as e:
+            self.errors.append(f"{item}: {e}")
+        finally:
+            with self.lock:
+                self.scanned += 1
+                self.pending -= 1
+                done = self.pending == 0
+            if done:
+                self.put(None)
+
+    def __iter__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        try:
+            for item in self.start_items():
+                self.submit(item)
+            while True:
+                results = self.results.get()
+                if results is None:
+                    break
+                yield from results
+        finally:
+            self.stop.set()
+            self.executor.shutdown(wait=True)
+#-- ParallelWalker
+
+class Inventory(ParallelWalker):
+    """
+    Storage inventory: iterate to get records of the files under a URI, as dicts with value, size and exists, and the checksum when storage gives one. Records are upserted as is, so fields storage does not know are left out, not None, to keep the stored values. Iteration is in parallel, so unordered. Use sorted_records() for records ordered by value.
+    """
+    def __init__(self, uri, threads=8, queue_size=64):
+        super().__init__(threads=threads, queue_size=queue_size)
+        self.uri = uri
+
+    def sorted_records(self):
+        raise NotImplementedError
+#-- Inventory
+
+class LocalInventory(Inventory):
+    """
+    Files under a local directory, scanned with os.scandir. Records also have the mtime. Symlinks are not followed, and there are no checksums. The directory is made absolute, so the record values are too.
+    """
+    def __init__(self, uri, threads=8, queue_size=64, files_per_put=1000):
+        super().__init__(os.path.abspath(os.path.expanduser(re.sub(r"\Afile://", "", uri))), threads=threads, queue_size=queue_size)
+        self.files_per_put = files_per_put
+
+    def record(self, entry):
+        st = entry.stat(follow_symlinks=False)
+        return {"value": entry.path, "size": st.st_size, "mtime": int(st.st_mtime), "exists": True}
+
+    def sorted_records(self, dn=None):
+        """
+        Depth first walk, in order of the full paths. Directories sort as their name with a trailing slash, so "a.txt" comes before the files in "a/", and "a/" before "a0". Only one directory listing per level is held.
+        """
+        if dn is None:
+            dn = os.path.normpath(self.uri)
+        try:
+            with os.scandir(dn) as it:
+                entries = []
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        entries.append((entry.name + "/", entry))
+                    elif entry.is_file(follow_symlinks=False):
+                        entries.append((entry.name, entry))
+        except OSError as e:
+            self.errors.append(f"{dn}: {e}")
+            return
+        for name, entry in sorted(entries, key=lambda e: e[0]):
+            if name.endswith("/"):
+                yield from self.sorted_records(entry.path)
+                continue
+            try:
+                yield self.record(entry)
+            except OSError as e:
+                self.errors.append(f"{entry.path}: {e}")
+
+    def start_items(self):
+        return [self.uri]
+
+    def scan(self, dn):
+        records = []
+        with os.scandir(dn) as it:
+            for entry in it:
+                if self.stop.is_set():
+                    return
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        self.submit(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        records.append(self.record(entry))
+                        if len(records) >= self.files_per_put:
+                            self.put(records)
+                            records = []
+                except OSError as e:
+                    self.errors.append(f"{entry.path}: {e}")
+        if records:
+            self.put(records)
+#-- LocalInventory
+
+class ObjectStoreInventory(Inventory):
+    """
+    Objects under a bucket prefix. Prefixes are listed with a "/" delimiter, so each "directory" is listed concurrently, and the next page of a listing is requested while the current one is loaded.
+
+    Backends implement list_page(prefix, page_token, delimiter), returning the page records, the common prefixes and the next page token. Object stores list in lexicographic order, so sorted_records() pages through a flat listing.
+    """
+    scheme = None
+    def __init__(self, uri, threads=16, queue_size=64, page_size=1000):
+        super().__init__(uri, threads=threads, queue_size=queue_size)
+        self.page_size = page_size
+        found = re.match(r"\A(\w+)://([^/]+)/?(.*)\Z", uri)
+        if not found or found.group(1) != self.scheme:
+            raise Exception(f"Invalid {self.scheme} URI: {uri}")
+        self.bucket = found.group(2)
+        self.prefix = found.group(3)
+        if self.prefix and not self.prefix.endswith("/"):
+            self.prefix += "/"
+
+    def object_uri(self, name):
+        return f"{self.scheme}://{self.bucket}/{name}"
+
+    def list_page(self, prefix, page_token, delimiter="/"):
+        raise NotImplementedError
+
+    def start_items(self):
+        return [(self.prefix, None)]
+
+    def sorted_records(self):
+        page_token = None
+        while True:
+            records, prefixes, page_token = self.list_page(self.prefix, page_token, delimiter=None)
+            yield from records
+            if not page_token:
+                return
+
+    def scan(self, item):
+        prefix, page_token = item
+        records, prefixes, next_token = self.list_page(prefix, page_token)
+        if next_token:
+            self.submit((prefix, next_token))
+        for p in prefixes:
+            self.submit((p, None))
+        if records:
+            self.put(records)
+#-- ObjectStoreInventory
+
+class GcsInventory(ObjectStoreInventory):
+    """
+    Google Cloud Storage objects. Needs google-cloud-storage. Set STORAGE_EMULATOR_HOST to use an emulator.
+    """
+    scheme = "gs"
+    def __init__(self, uri, **kwargs):
+        super().__init__(uri, **kwargs)
+        try:
+            from google.cloud import storage
+        except ImportError:
+            raise Exception("Listing gs:// URIs needs the google-cloud-storage package")
+        self.client = storage.Client()
+
+    def list_page(self, prefix, page_token, delimiter="/"):
+        blobs = self.client.list_blobs(self.bucket, prefix=prefix, delimiter=delimiter, page_token=page_token, max_results=self.page_size)
+        page = next(blobs.pages, None)
+        if page is None:
+            return [], [], None
+        records = []
+        for blob in page:
+            record = {"value": self.object_uri(blob.name), "size": blob.size, "exists": True}
+            if blob.md5_hash:
+                record["checksum"] = base64.b64decode(blob.md5_hash).hex()
+            elif blob.crc32c:
+                record["checksum"] = blob.crc32c
+            records.append(record)
+        return records, sorted(page.prefixes), blobs.next_page_token
+#-- GcsInventory
+
+class S3Inventory(ObjectStoreInventory):
+    """
+    Amazon S3 objects. Needs boto3. Set AWS_ENDPOINT_URL to use an emulator.
+    """
+    scheme = "s3"
+    def __init__(self, uri, **kwargs):
+        super().__init__(uri, **kwargs)
+        try:
+            import boto3
+        except ImportError:
+            raise Exception("Listing s3:// URIs needs the boto3 package")
+        self.client = boto3.client("s3", endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+
+    def list_page(self, prefix, page_token, delimiter="/"):
+        params = {"Bucket": self.bucket, "Prefix": prefix, "MaxKeys": self.page_size}
+        if delimiter:
+            params["Delimiter"] = delimiter
+        if page_token:
+            params["ContinuationToken"] = page_token
+        response = self.client.list_objects_v2(**params)
+        records = []
+        for obj in response.get("Contents", []):
+            # Multipart upload ETags are not MD5s
+            etag = obj.get("ETag", "").strip('"')
+            record = {"value": self.object_uri(obj["Key"]), "size": obj["Size"], "exists": True}
+            if etag and "-" not in etag:
+                record["checksum"] = etag
+            records.append(record)
+        prefixes = [p["Prefix"] for p in response.get("CommonPrefixes", [])]
+        return records, prefixes, response.get("NextContinuationToken") if response.get("IsTruncated") else None
+#-- S3Inventory
+
+inventories = {
+    "gs": GcsInventory,
+    "s3": S3Inventory,
+}
+
+def is_inventory_uri(uri):
+    found = re.match(r"\A(\w+)://", uri)
+    return (found and found.group(1) in inventories) or uri.startswith("file://") or os.path.isdir(os.path.expanduser(uri))
+#-- is_inventory_uri
+
+def inventory_for_uri(uri, **kwargs):
+    found = re.match(r"\A(\w+)://", uri)
+    if found and found.group(1) != "file":
+        if found.group(1) not in inventories:
+            raise Exception(f"No inventory for {found.group(1)}:// URIs, known are: {' '.join(sorted(inventories.keys()))}")
+        return inventories[found.group(1)](uri, **kwargs)
+    return LocalInventory(uri, **kwargs)
+#-- inventory_for_uri
@@ -0,0 +1,28 @@
+from alembic import context
+
+from mgi.database import create_engine
+from mgi.models import db
+
+config = context.config
+target_metadata = db.metadata
+
+def run_migrations_offline():
+    context.configure(url=config.get_main_option("sqlalchemy.url"), target_metadata=target_metadata, literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+#-- run_migrations_offline
+
+def run_migrations_online():
+    engine = create_engine(config.get_main_option("sqlalchemy.url"))
+    with engine.connect() as connection:
+        # SQLite cannot alter columns or constraints, so tables are copied
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+#-- run_migrations_online
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
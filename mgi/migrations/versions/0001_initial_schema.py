@@ -0,0 +1,64 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table("entity",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(length=48), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.UniqueConstraint("name", "kind", name="uniq_entity"),
+    )
+    op.create_index("ix_entity_name", "entity", ["name"])
+    op.create_index("ix_entity_kind", "entity", ["kind"])
+
+    op.create_table("eset",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.String(length=32)),
+        sa.Column("kind", sa.String(length=32)),
+    )
+    op.create_index("ix_eset_name", "eset", ["name"], unique=True)
+
+    op.create_table("eset_entity",
+        sa.Column("eset_id", sa.Integer, sa.ForeignKey("eset.id")),
+        sa.Column("entity_id", sa.Integer, sa.ForeignKey("entity.id")),
+    )
+
+    op.create_table("entity_feature",
+        sa.Column("entity_id", sa.Integer, sa.ForeignKey("entity.id"), primary_key=True),
+        sa.Column("group", sa.String(length=32), primary_key=True),
+        sa.Column("name", sa.String(length=48), primary_key=True),
+        sa.Column("value", sa.String(length=128)),
+        sa.UniqueConstraint("entity_id", "group", "name", name="uniq_efeature"),
+    )
+
+    op.create_table("entity_path",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("entity_id", sa.Integer, sa.ForeignKey("entity.id"), nullable=False),
+        sa.Column("group", sa.String(length=32)),
+        sa.Column("value", sa.String(length=256), nullable=False),
+        sa.Column("checksum", sa.String(length=32), nullable=True),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("exists", sa.Boolean),
+        sa.UniqueConstraint("entity_id", "value", name="uniq_epath"),
+    )
+    op.create_index("ix_entity_path_value", "entity_path", ["value"], unique=True)
+    op.create_index("ix_entity_path_kind", "entity_path", ["kind"])
+
+def downgrade():
+    op.drop_table("entity_path")
+    op.drop_table("entity_feature")
+    op.drop_table("eset_entity")
+    op.drop_index("ix_eset_name", "eset")
+    op.drop_table("eset")
+    op.drop_table("entity")
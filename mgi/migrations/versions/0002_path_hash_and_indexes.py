@@ -0,0 +1,62 @@
+"""path hash and indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import hashlib
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # uniq_entity (name, kind) serves name lookups
+    with op.batch_alter_table("entity") as batch_op:
+        batch_op.drop_index("ix_entity_name")
+        batch_op.alter_column("name", type_=sa.String(length=256), existing_type=sa.String(length=48), existing_nullable=False)
+
+    # uniq_efeature repeats the primary key
+    with op.batch_alter_table("entity_feature") as batch_op:
+        batch_op.drop_constraint("uniq_efeature", type_="unique")
+        batch_op.create_index("ix_entity_feature_value", ["group", "name", "value", "entity_id"])
+
+    op.create_index("ix_eset_entity_entity", "eset_entity", ["entity_id", "eset_id"])
+
+    op.add_column("entity_path", sa.Column("value_hash", sa.String(length=40), nullable=True))
+    entity_path = sa.table("entity_path", sa.column("id", sa.Integer), sa.column("value", sa.Text), sa.column("value_hash", sa.String))
+    con = op.get_bind()
+    rows = [{"_id": r.id, "value_hash": hashlib.sha1(r.value.encode("utf-8")).hexdigest()} for r in con.execute(sa.select(entity_path.c.id, entity_path.c.value))]
+    if rows:
+        con.execute(entity_path.update().where(entity_path.c.id == sa.bindparam("_id")).values(value_hash=sa.bindparam("value_hash")), rows)
+
+    # value is unique by its hash, which also covers uniq_epath (entity_id, value)
+    with op.batch_alter_table("entity_path") as batch_op:
+        batch_op.drop_constraint("uniq_epath", type_="unique")
+        batch_op.drop_index("ix_entity_path_value")
+        batch_op.alter_column("value", type_=sa.Text, existing_type=sa.String(length=256), existing_nullable=False)
+        batch_op.alter_column("value_hash", existing_type=sa.String(length=40), nullable=False)
+        batch_op.create_index("ix_entity_path_value_hash", ["value_hash"], unique=True)
+        batch_op.create_index("ix_entity_path_entity_id", ["entity_id"])
+
+def downgrade():
+    with op.batch_alter_table("entity_path") as batch_op:
+        batch_op.drop_index("ix_entity_path_entity_id")
+        batch_op.drop_index("ix_entity_path_value_hash")
+        batch_op.alter_column("value", type_=sa.String(length=256), existing_type=sa.Text, existing_nullable=False)
+        batch_op.create_index("ix_entity_path_value", ["value"], unique=True)
+        batch_op.create_unique_constraint("uniq_epath", ["entity_id", "value"])
+        batch_op.drop_column("value_hash")
+
+    op.drop_index("ix_eset_entity_entity", "eset_entity")
+
+    with op.batch_alter_table("entity_feature") as batch_op:
+        batch_op.drop_index("ix_entity_feature_value")
+        batch_op.create_unique_constraint("uniq_efeature", ["entity_id", "group", "name"])
+
+    with op.batch_alter_table("entity") as batch_op:
+        batch_op.alter_column("name", type_=sa.String(length=48), existing_type=sa.String(length=256), existing_nullable=False)
+        batch_op.create_index("ix_entity_name", ["name"])
@@ -0,0 +1,36 @@
+"""path directory and size
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import os
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def path_directory(value):
+    value = value.rstrip("/")
+    if value.startswith("/"):
+        value = os.path.normpath(value)
+    return os.path.dirname(value)
+
+def upgrade():
+    op.add_column("entity_path", sa.Column("directory", sa.Text().with_variant(sa.Text(collation="C"), "postgresql"), nullable=True))
+    op.add_column("entity_path", sa.Column("size", sa.BigInteger, nullable=True))
+    entity_path = sa.table("entity_path", sa.column("id", sa.Integer), sa.column("value", sa.Text), sa.column("directory", sa.Text))
+    con = op.get_bind()
+    rows = [{"_id": r.id, "directory": path_directory(r.value)} for r in con.execute(sa.select(entity_path.c.id, entity_path.c.value))]
+    if rows:
+        con.execute(entity_path.update().where(entity_path.c.id == sa.bindparam("_id")).values(directory=sa.bindparam("directory")), rows)
+    op.create_index("ix_entity_path_directory", "entity_path", ["directory"])
+
+def downgrade():
+    op.drop_index("ix_entity_path_directory", "entity_path")
+    with op.batch_alter_table("entity_path") as batch_op:
+        batch_op.drop_column("size")
+        batch_op.drop_column("directory")
@@ -0,0 +1,20 @@
+"""path mtime
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("entity_path", sa.Column("mtime", sa.BigInteger, nullable=True))
+
+def downgrade():
+    with op.batch_alter_table("entity_path") as batch_op:
+        batch_op.drop_column("mtime")
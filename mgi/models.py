@@ -1,8 +1,12 @@
+import hashlib, os
+
 from mgi import db
 
 eset_entity = db.Table('eset_entity', db.metadata,
     db.Column("eset_id", db.Integer, db.ForeignKey("eset.id")),
-    db.Column("entity_id", db.Integer, db.ForeignKey("entity.id"))
+    db.Column("entity_id", db.Integer, db.ForeignKey("entity.id")),
+    # Sets of an entity, and set membership checks
+    db.Index("ix_eset_entity_entity", "entity_id", "eset_id"),
 )
 
 class Entity(db.Model):
@@ -16,7 +20,8 @@ class Entity(db.Model):
     )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    name = db.Column(db.String(length=48), nullable=False, index=True)
+    # Lookups by name use uniq_entity
+    name = db.Column(db.String(length=256), nullable=False)
     kind = db.Column(db.String(length=16), nullable=False, index=True)
 
     features = db.relationship("EntityFeature", back_populates="entity", cascade="all, delete, save-update")
@@ -34,12 +39,8 @@ class Entity(db.Model):
 class EntityFeature(db.Model):
     __tablename__ = 'entity_feature'
     __table_args__ = (
-        db.UniqueConstraint(
-            "entity_id",
-            "group",
-            "name",
-            name="uniq_efeature",
-        ),
+        # Find entities by feature value, without reading the table
+        db.Index("ix_entity_feature_value", "group", "name", "value", "entity_id"),
     )
     entity_id = db.Column(db.Integer, db.ForeignKey("entity.id"), primary_key=True)
     group = db.Column(db.String(length=32), primary_key=True)
@@ -51,25 +52,52 @@ class EntityFeature(db.Model):
         return ":".join([self.name, self.group, self.value])
 #-- EntityFeature
 
+def value_hash(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+#-- value_hash
+
+def path_directory(value):
+    value = value.rstrip("/")
+    if value.startswith("/") and ("//" in value or "/." in value):
+        value = os.path.normpath(value)
+    # Same as os.path.dirname, without its overhead
+    head = value[:value.rfind("/") + 1]
+    return head.rstrip("/") or head
+#-- path_directory
+
+def path_columns(value):
+    """
+    Entity path columns derived from the value, for loading rows without the ORM.
+    """
+    return {"value_hash": value_hash(value), "directory": path_directory(value)}
+#-- path_columns
+
 class EntityPath(db.Model):
     __tablename__ = 'entity_path'
-    __table_args__ = (
-        db.UniqueConstraint(
-            'entity_id',
-            'value',
-            name='uniq_epath',
-        ),
-    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    entity_id = db.Column(db.Integer, db.ForeignKey("entity.id"), nullable=False)
+    entity_id = db.Column(db.Integer, db.ForeignKey("entity.id"), nullable=False, index=True)
     group = db.Column(db.String(length=32))
-    value = db.Column(db.String(length=256), nullable=False, unique=True, index=True)
+    # Paths can be longer than an index entry allows, so they are unique and looked up by hash
+    value = db.Column(db.Text, nullable=False)
+    value_hash = db.Column(db.String(length=40), nullable=False, unique=True, index=True)
+    # Parent directory, for finding paths under a directory with a range scan, so it is compared bytewise
+    directory = db.Column(db.Text().with_variant(db.Text(collation="C"), "postgresql"), nullable=True, index=True)
+    size = db.Column(db.BigInteger, nullable=True)
+    # Modification time, in seconds since the epoch
+    mtime = db.Column(db.BigInteger, nullable=True)
     checksum = db.Column(db.String(length=32), nullable=True)
     kind = db.Column(db.String(length=16), nullable=False, index=True)
     exists = db.Column(db.Boolean, default=False)
 
     entity = db.relationship("Entity", back_populates="paths", cascade="all, delete, save-update")
+
+    @db.validates("value")
+    def set_path_columns(self, key, value):
+        for k, v in path_columns(value).items():
+            setattr(self, k, v)
+        return value
+
     def __str__(self):
         return self.value
 #-- EntityPath
@@ -0,0 +1,135 @@
+import click, csv, os, sys
+from collections import defaultdict
+from sqlalchemy import and_, func, or_, select
+
+from mgi.models import db, Entity, EntityPath
+
+@click.group(short_help="find and summarize entity paths")
+def paths_cli():
+    """
+    Entity Paths!
+    """
+    pass
+
+def normalize_directory(dn):
+    if dn.startswith("/"):
+        dn = os.path.normpath(dn)
+    return dn.rstrip("/")
+#-- normalize_directory
+
+def under_directory(dn):
+    """
+    Filter for paths in the directory or below it. The directory column is compared bytewise, so everything below DN/ sorts before DN0, and the index is range scanned in order. Siblings like DN-old also fall in the range, and are filtered out.
+    """
+    dn = normalize_directory(dn)
+    if dn == "":
+        return and_(EntityPath.directory >= "/", EntityPath.directory < "0")
+    return and_(EntityPath.directory >= dn, EntityPath.directory < dn + "0", or_(EntityPath.directory == dn, EntityPath.directory >= dn + "/"))
+#-- under_directory
+
+def filter_paths(stmt, under=None, kind=None, missing=False):
+    if under is not None:
+        stmt = stmt.where(under_directory(under))
+    if kind is not None:
+        stmt = stmt.where(EntityPath.kind == kind)
+    if missing:
+        stmt = stmt.where(or_(EntityPath.exists == False, EntityPath.exists == None))
+    return stmt
+#-- filter_paths
+
+def tsv_writer():
+    return csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+#-- tsv_writer
+
+@paths_cli.command(name="find", short_help="find entity paths")
+@click.option("--under", "-u", type=click.STRING, help="Only paths in this directory, or below it")
+@click.option("--kind", "-k", type=click.STRING, help="Only paths of this kind")
+@click.option("--missing", "-m", is_flag=True, default=False, help="Only paths that do not exist")
+def find_cmd(under, kind, missing):
+    """
+    Find Entity Paths
+
+    Paths are written as TSV with entity, kind, size, exists and value columns, in directory order. Rows are streamed from the database as they are read.
+    """
+    stmt = select(Entity.name, EntityPath.kind, EntityPath.size, EntityPath.exists, EntityPath.value).join(Entity, Entity.id == EntityPath.entity_id)
+    stmt = filter_paths(stmt, under=under, kind=kind, missing=missing).order_by(EntityPath.directory)
+    con = db.session.connection().execution_options(stream_results=True)
+    writer = tsv_writer()
+    writer.writerow(["entity", "kind", "size", "exists", "value"])
+    for name, kind, size, exists, value in con.execute(stmt):
+        writer.writerow([name, kind, "" if size is None else size, "" if exists is None else int(exists), value])
+#-- find_cmd
+
+def rollup_directory(dn, directory, depth):
+    if directory.rstrip("/") == dn:
+        return dn
+    components = directory[len(dn):].lstrip("/").split("/")
+    return "/".join([dn] + components[:depth])
+#-- rollup_directory
+
+@paths_cli.command(name="du", short_help="sum entity path sizes by directory")
+@click.argument("directory", type=click.STRING, required=True, nargs=1)
+@click.option("--depth", "-d", type=click.INT, default=1, show_default=True, help="Directory levels below the given directory to show")
+@click.option("--kind", "-k", type=click.STRING, help="Only paths of this kind")
+def du_cmd(directory, depth, kind):
+    """
+    Sum Entity Path Sizes by Directory
+
+    Like du, sum the stored sizes of paths in the directory, rolled up to the subdirectories DEPTH levels below it. Sizes come from the database, nothing is read from the filesystem. Paths without a size are counted, but do not add to the size.
+
+    Writes a TSV of size in bytes, path count and directory, ending with the total.
+    """
+    dn = normalize_directory(directory)
+    stmt = select(EntityPath.directory, func.count(), func.sum(EntityPath.size)).group_by(EntityPath.directory)
+    stmt = filter_paths(stmt, under=dn, kind=kind)
+    rollup = defaultdict(lambda: [0, 0])
+    for path_dn, count, size in db.session.connection().execute(stmt):
+        totals = rollup[rollup_directory(dn, path_dn, depth)]
+        totals[0] += size or 0
+        totals[1] += count
+    total_size, total_count = 0, 0
+    writer = tsv_writer()
+    for rollup_dn in sorted(rollup.keys()):
+        size, count = rollup[rollup_dn]
+        total_size += size
+        total_count += count
+        if rollup_dn != dn:
+            writer.writerow([size, count, rollup_dn])
+    writer.writerow([total_size, total_count, dn or "/"])
+#-- du_cmd
+
+@paths_cli.command(name="reconcile", short_help="diff entity paths with storage")
+@click.argument("uri", type=click.STRING, required=True, nargs=1)
+@click.argument("features", nargs=-1)
+@click.option("--apply", "apply_changes", is_flag=True, default=False, help="Update the database with the differences")
+@click.option("--entity-kind", "-e", type=click.STRING, default="sample", show_default=True, help="Kind of entities for added paths")
+def reconcile_cmd(uri, features, apply_changes, entity_kind):
+    """
+    Reconcile Entity Paths with Storage
+
+    Compare the paths in the database under a local directory, or gs:// or s3:// URI, with the files in storage. Both are read sorted by path and merged in one pass, so memory stays bounded. Differences are written as TSV of status, path and changed fields. Statuses are:
+
+    \b
+    added    in storage, not in the database
+    removed  in the database as existing, not in storage
+    changed  size or checksum differ, or exists again
+
+    With --apply, added paths are loaded like paths update, with the given features as name=value pairs, removed paths are marked as not existing, and changed paths get the storage size, checksum and modification time. On SQLite, applying needs the default WAL journal mode.
+    """
+    from mgi.helpers import resolve_features
+    from mgi.inventory import inventory_for_uri
+    from mgi.paths.reconcile import reconcile_paths, ReconcileApplier
+    applier = None
+    if apply_changes:
+        features = resolve_features(features, known_features=["group", "kind"])
+        applier = ReconcileApplier(entity_kind=entity_kind, features=features)
+    inventory = inventory_for_uri(uri)
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    writer = tsv_writer()
+    for status, value, changes in reconcile_paths(inventory.uri, inventory, applier=applier):
+        counts[status] += 1
+        writer.writerow([status, value, ",".join(changes)])
+    for error in inventory.errors:
+        sys.stderr.write(f"Failed to list {error}\n")
+    sys.stderr.write(f"{'Applied' if apply_changes else 'Found'} {counts['added']} added, {counts['removed']} removed and {counts['changed']} changed paths.\n")
+#-- reconcile_cmd
@@ -0,0 +1,136 @@
+from sqlalchemy import bindparam, select, update
+
+from mgi.bulk import chunked
+from mgi.entity.path import update_entities_paths
+from mgi.models import db, EntityPath
+from mgi.paths.cli import under_directory
+
+def db_paths_stream(con, root):
+    """
+    Entity paths in or below root, ordered by value. Ordered bytewise on Postgres, to match the storage listing.
+    """
+    order_by = EntityPath.value.collate("C") if con.dialect.name == "postgresql" else EntityPath.value
+    stmt = select(EntityPath.value, EntityPath.value_hash, EntityPath.size, EntityPath.checksum, EntityPath.exists).where(under_directory(root)).order_by(order_by)
+    for value, value_hash, size, checksum, exists in con.execution_options(stream_results=True).execute(stmt):
+        yield {"value": value, "value_hash": value_hash, "size": size, "checksum": checksum, "exists": exists}
+#-- db_paths_stream
+
+def check_can_apply(con):
+    # Changes are committed while the DB paths are still read, which only WAL allows on SQLite
+    if con.dialect.name == "sqlite" and con.exec_driver_sql("PRAGMA journal_mode").scalar().lower() != "wal":
+        raise Exception("Applying reconcile changes to SQLite needs the WAL journal mode, unset SQLITE_JOURNAL_MODE")
+#-- check_can_apply
+
+def check_sorted(records, name):
+    last = None
+    for record in records:
+        if last is not None and record["value"] <= last:
+            raise Exception(f"The {name} paths are not sorted, found {record['value']} after {last}")
+        last = record["value"]
+        yield record
+#-- check_sorted
+
+def changed_fields(db_record, storage_record):
+    changes = []
+    if not db_record["exists"]:
+        changes.append("exists")
+    for name in ("size", "checksum"):
+        if storage_record.get(name) is not None and db_record[name] is not None and storage_record[name] != db_record[name]:
+            changes.append(name)
+    return changes
+#-- changed_fields
+
+def diff_sorted(db_records, storage_records):
+    """
+    Merge two streams of path records sorted by value, yielding (status, db record, storage record, changed fields) for each path. Status is added, removed, changed or same. Paths marked as not existing in the DB, and not in storage, are the same. Runs in one pass, holding one record of each stream.
+    """
+    db_i = check_sorted(db_records, "DB")
+    storage_i = check_sorted(storage_records, "storage")
+    db_r = next(db_i, None)
+    storage_r = next(storage_i, None)
+    while db_r is not None or storage_r is not None:
+        if storage_r is None or (db_r is not None and db_r["value"] < storage_r["value"]):
+            yield ("removed" if db_r["exists"] else "same"), db_r, None, []
+            db_r = next(db_i, None)
+        elif db_r is None or storage_r["value"] < db_r["value"]:
+            yield "added", None, storage_r, []
+            storage_r = next(storage_i, None)
+        else:
+            changes = changed_fields(db_r, storage_r)
+            yield ("changed" if changes else "same"), db_r, storage_r, changes
+            db_r = next(db_i, None)
+            storage_r = next(storage_i, None)
+#-- diff_sorted
+
+class ReconcileApplier():
+    """
+    Apply reconcile differences in batches: added paths are loaded like paths update, removed paths are marked as not existing, and changed paths get the storage size, checksum and mtime.
+    """
+    def __init__(self, entity_kind, features={}, batch_size=5000):
+        self.entity_kind = entity_kind
+        self.features = features
+        self.batch_size = batch_size
+        self.batches = {"added": [], "removed": [], "changed": []}
+
+    def add(self, status, db_record, storage_record):
+        if status not in self.batches:
+            return
+        self.batches[status].append((db_record, storage_record))
+        if len(self.batches[status]) >= self.batch_size:
+            self.flush(status)
+
+    def flush(self, status):
+        batch = self.batches[status]
+        self.batches[status] = []
+        if not batch:
+            return
+        if status == "added":
+            update_entities_paths([dict(s) for d, s in batch], self.features, entity_kind=self.entity_kind, batch_size=self.batch_size)
+            return
+        con = db.session.connection()
+        if status == "removed":
+            stmt = update(EntityPath.__table__).where(EntityPath.value_hash == bindparam("_hash")).values(exists=False)
+            con.execute(stmt, [{"_hash": d["value_hash"]} for d, s in batch])
+        else:
+            columns = ["size", "checksum", "mtime"]
+            for row_columns, rows in self.group_by_columns(batch, columns).items():
+                values = {c: bindparam(c) for c in row_columns}
+                values["exists"] = True
+                stmt = update(EntityPath.__table__).where(EntityPath.value_hash == bindparam("_hash")).values(**values)
+                con.execute(stmt, rows)
+        db.session.commit()
+
+    def group_by_columns(self, batch, columns):
+        # Only set what storage gave, like checksums from object stores
+        groups = {}
+        for d, s in batch:
+            row = {c: s[c] for c in columns if s.get(c) is not None}
+            row["_hash"] = d["value_hash"]
+            groups.setdefault(tuple(sorted(c for c in row.keys() if c != "_hash")), []).append(row)
+        return groups
+
+    def finish(self):
+        for status in list(self.batches.keys()):
+            self.flush(status)
+#-- ReconcileApplier
+
+def reconcile_paths(root, inventory, applier=None):
+    """
+    Diff the DB paths under root with the sorted storage listing, yielding (status, value, changed fields) of the differences. The DB is read on its own connection, so changes can be applied while streaming.
+    """
+    con = db.engine.connect()
+    try:
+        if applier is not None:
+            check_can_apply(con)
+        db_records = db_paths_stream(con, root)
+        for status, db_record, storage_record, changes in diff_sorted(db_records, inventory.sorted_records()):
+            if status == "same":
+                continue
+            if applier is not None:
+                applier.add(status, db_record, storage_record)
+            yield status, (db_record or storage_record)["value"], changes
+        if applier is not None:
+            applier.finish()
+    finally:
+        con.close()
+#-- reconcile_paths
@@ -1,6 +1,6 @@
-import click, csv, os, tabulate, sys
+import click, csv, json, os, tabulate, sys, time
 from collections import defaultdict
-from mgi.pipelines import hic
+from mgi.pipelines import hic, qc, rna
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.group(context_settings=CONTEXT_SETTINGS)
@@ -11,28 +11,6 @@ def pl_cli():
     pass
 
 # CLI Helpers
-def resolve_samples(samples_and_dns):
-    samples = []
-    for sample_and_dns in samples_and_dns:
-        group = []
-        tokens = sample_and_dns.split(":")
-        if len(tokens) == 2:
-            label = tokens[0]
-        elif len(tokens) == 3:
-            label = tokens[1]
-        else:
-            raise Exception(f"")
-        dn = os.path.abspath(tokens[-1])
-        sample = {
-                "name": tokens[0],
-                "label": label,
-                "dn": dn,
-                "stats_fn": os.path.join(dn, "stats_1.json")}
-        sample["stats"] = hic.load_stats(sample["stats_fn"])
-        samples.append(sample)
-    return samples
-#--
-
 def group_samples_by_name(samples):
     groups = defaultdict(lambda: [])
     for sample in samples:
@@ -40,6 +18,29 @@ def group_samples_by_name(samples):
     return groups
 #--
 
+def write_reports(pipeline, samples, reports):
+    # Text reports of a QC pipeline: table, tsv, summary and json
+    if "table" in reports or "tsv" in reports:
+        headers, data = qc.get_stats_table(pipeline, samples)
+        if "table" in reports:
+            print(f"\n\n{tabulate.tabulate(data, headers=headers)}\n\n")
+        if "tsv" in reports:
+            wtr = csv.writer(sys.stdout, delimiter="\t")
+            wtr.writerow(headers)
+            for row in data:
+                wtr.writerow(row)
+    if "summary" in reports or "json" in reports:
+        summary = qc.get_summary(pipeline, samples)
+        if "summary" in reports:
+            headers, data = qc.summary_to_rows(summary)
+            wtr = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+            wtr.writerow(headers)
+            for row in data:
+                wtr.writerow(row)
+        if "json" in reports:
+            sys.stdout.write(json.dumps({"samples": len(samples), "benchmarks": summary}, indent=2) + "\n")
+#--
+
 # HiC
 @pl_cli.group(name="hic", help="hic pipelines helpers")
 def hic_cli():
@@ -53,7 +54,7 @@ def hic_cli():
 # histograms by metric grouped by sample
 # histograms, tables by sample(s)
 
-reports_available = ["ch", "table",]
+reports_available = ["ch", "detail", "table", "tsv", "summary", "json"]
 @hic_cli.command(name="benchmarks", short_help="")
 @click.argument("samples", nargs=-1)
 @click.option("--output", "-o", default=".", help="Output directory to write files.")
@@ -61,7 +62,12 @@ reports_available = ["ch", "table",]
         help="Comma separated report to run: {' '.join(reports_available}",
         callback=lambda ctx, param, value: value.split(","),
         )
-def benchmarks_cmd(samples, output, reports):
+@click.option("--threads", "-t", type=click.INT, default=16, show_default=True, help="Stats files to load at once")
+@click.option("--format", "-f", "fmt", type=click.Choice(hic.PLOT_FORMATS), default="png", show_default=True, help="Histograms as a PNG per plot, one multi-page PDF, or a sprite sheet PNG")
+@click.option("--processes", "-p", type=click.INT, default=os.cpu_count(), show_default=True, help="Processes to render histograms")
+@click.option("--from-db", is_flag=True, help="Get ingested stats from the DB, samples are the names given to ingest, or none for all")
+@click.option("--status", "-s", type=click.STRING, help="With --from-db, only samples with a benchmark of this status, like fail")
+def benchmarks_cmd(samples, output, reports, threads, fmt, processes, from_db, status):
     """
     ENCODE HiC Benchmarks
 
@@ -81,25 +87,170 @@ def benchmarks_cmd(samples, output, reports):
     detail    Benchmarks metrics by sample
     table     Text table of benchmarks
     tsv       TSV output
+    summary   TSV cohort summary of each benchmark: percentiles, MAD, status counts and outliers
+    json      JSON cohort summary, with the outlier sample labels
+
+    Histograms are written to the output directory, as a PNG per plot (SAMPLE.ch.png, SAMPLE.detail.png), or with --format, as one multi-page PDF (benchmarks.ch.pdf) or a sprite sheet of thumbnails (benchmarks.ch.png). Bars are colored by benchmark status.
 
+    Loaded stats are cached by file path, size and mtime in MGI_CACHE_DN, or ~/.cache/mgi, so later runs only stat the stats files.
+
+    \b
+    With --from-db, stats stored by ingest are used, no files are read:
+    mgi pl hic benchmarks --from-db --status fail -r tsv
     """
-    samples = resolve_samples(sorted(samples))
+    if from_db:
+        samples = hic.load_samples_from_db(sorted(samples) or None, status=status)
+        if not samples:
+            sys.stderr.write("No ingested hic stats found for the given samples\n")
+            sys.exit(1)
+    elif status is not None:
+        sys.stderr.write("The --status option needs --from-db\n")
+        sys.exit(1)
+    else:
+        samples = qc.resolve_samples(qc.get_pipeline("hic"), sorted(samples), threads=threads)
     groups = group_samples_by_name(samples)
     output_dn = os.path.abspath(output)
     if "ch" in reports:
-        pass
-        #hic.create_benchmarks_comparative_histograms(groups, output_dn)
+        hic.create_benchmarks_comparative_histograms(samples, groups, output_dn, fmt=fmt, processes=processes)
     if "detail" in reports:
-        pass
-        #for sample in samples:
-        #    hic.create_benchmarks_detail_histogram(sample, output_dn)
-    if "table" in reports or "tsv" in reports:
-        headers, data = hic.get_benchmarks_stats(samples)
-        if "table" in reports:
-            print(f"\n\n{tabulate.tabulate(data, headers=headers)}\n\n")
-        if "tsv" in reports:
-            wtr = csv.writer(sys.stdout, delimiter="\t")
-            wtr.writerow(headers)
-            for row in data:
-                wtr.writerow(row)
+        hic.create_benchmarks_detail_histograms(samples, output_dn, fmt=fmt, processes=processes)
+    write_reports(qc.get_pipeline("hic"), samples, reports)
+#--
+
+@hic_cli.command(name="ingest", short_help="store hic stats in the DB")
+@click.argument("samples", nargs=-1, required=True)
+@click.option("--threads", "-t", type=click.INT, default=16, show_default=True, help="Stats files to load at once")
+@click.option("--batch-size", "-b", type=click.INT, default=500, show_default=True, help="Samples to store per transaction")
+def ingest_cmd(samples, threads, batch_size):
+    """
+    Ingest HiC Stats
+
+    Give samples and directories like benchmarks. Each run is stored as a sample entity, named by its label, with its normalized stats and benchmark statuses as features in the hic_qc group. Stats of a sample that was ingested before are replaced.
+
+    \b
+    Then get benchmarks from the DB:
+    mgi pl hic benchmarks --from-db -r table
+    """
+    start = time.time()
+    samples = qc.resolve_samples(qc.get_pipeline("hic"), sorted(samples), threads=threads)
+    count = hic.ingest_samples(samples, batch_size=batch_size)
+    sys.stdout.write(f"Ingested {len(samples)} samples with {count} features in {time.time() - start:.1f}s\n")
+#--
+
+# QC
+@pl_cli.group(name="qc", help="pipeline QC reports")
+def qc_cli():
+    """
+    Pipelines QC
+
+    QC benchmarks of the registered pipelines, with thresholds from YAML specs.
+    """
+    pass
+#--
+
+@qc_cli.command(name="pipelines", short_help="list QC pipelines and benchmarks")
+def qc_pipelines_cmd():
+    """
+    List QC Pipelines
+
+    Shows the benchmarks of each pipeline with QC, their thresholds and the spec they are read from.
+    """
+    rows = []
+    for name in qc.pipeline_names():
+        pipeline = qc.get_pipeline(name)
+        for benchmark_name, benchmark in pipeline.benchmarks.items():
+            rows.append([name, benchmark_name, benchmark.get("cat", ""), benchmark["desc"], ",".join(pipeline.stat_types), pipeline.thresholds_fn])
+    print(tabulate.tabulate(rows, headers=["PIPELINE", "BENCHMARK", "CATEGORY", "THRESHOLD", "STATS", "SPEC"]))
+#--
+
+qc_reports_available = ["table", "tsv", "summary", "json"]
+@qc_cli.command(name="report", short_help="QC reports for samples of a pipeline")
+@click.argument("pipeline", nargs=1)
+@click.argument("samples", nargs=-1, required=True)
+@click.option("--reports", "-r", default=qc_reports_available[0], show_default=True,
+        help=f"Comma separated reports to run: {' '.join(qc_reports_available)}",
+        callback=lambda ctx, param, value: value.split(","),
+        )
+@click.option("--threads", "-t", type=click.INT, default=16, show_default=True, help="Samples to load at once")
+def qc_report_cmd(pipeline, samples, reports, threads):
+    """
+    QC Report
+
+    Give the pipeline, and samples with their output directories, as DIRECTORY, SAMPLE:DIRECTORY or SAMPLE:LABEL:DIRECTORY. A directory alone is named by its base name. The pipeline finds its QC files in each directory. Loaded stats are cached like for hic benchmarks.
+
+    \b
+    Reports
+    table     Text table of benchmarks, a column per sample
+    tsv       TSV of the table
+    summary   TSV cohort summary of each benchmark: percentiles, MAD, status counts and outliers
+    json      JSON cohort summary, with the outlier sample labels
+    """
+    try:
+        pipeline = qc.get_pipeline(pipeline)
+    except Exception as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    samples = qc.resolve_samples(pipeline, sorted(samples), threads=threads)
+    write_reports(pipeline, samples, reports)
+#--
+
+# RNA
+@pl_cli.group(name="rna", help="rna-seq pipelines helpers")
+def rna_cli():
+    """
+    RNA-seq Pipelines
+    """
+    pass
+#--
+
+@rna_cli.command(name="qc", short_help="cohort matrix of rna-seq alignment QC")
+@click.argument("samples", nargs=-1)
+@click.option("--workflow", "-w", "workflows", multiple=True, help="Get the QC files of the align calls of a cromwell workflow, by id, name or cw DB id. May be given many times")
+@click.option("--output", "-o", type=click.STRING, help="File to write, parquet if it ends with .parquet, otherwise TSV. Default is TSV to STDOUT")
+@click.option("--threads", "-t", type=click.INT, default=16, show_default=True, help="Samples to load at once")
+def rna_qc_cmd(samples, workflows, output, threads):
+    """
+    RNA-seq QC
+
+    Collect the samtools flagstat and STAR log QC JSONs written by the align task (*_genome_flagstat.json and *_Log.final.json), and write a cohort matrix with a row per library. The files of a library are paired by their bamroot prefix, so a directory can have many libraries, like the shards of a workflow, each named SAMPLE.BAMROOT. Columns are input reads, read length, then the count, percent and status of each benchmark, and the flags, listing the benchmarks that did not pass.
+
+    \b
+    Give run directories, found recursively, as DIRECTORY, SAMPLE:DIRECTORY or SAMPLE:LABEL:DIRECTORY:
+    mgi pl rna qc /data/runs/* -o cohort.parquet
+
+    \b
+    Or cromwell workflows, with their outputs from the metadata:
+    mgi pl rna qc -w 3f1c2a9e-... -w rna-sample2
+
+    Thresholds are in the rna spec, see: mgi pl qc pipelines. Loaded stats are cached like for hic benchmarks.
+    """
+    if not samples and not workflows:
+        sys.stderr.write("No samples or workflows given\n")
+        sys.exit(1)
+    if output is not None and output.endswith(".parquet"):
+        try:
+            import pyarrow
+        except ImportError:
+            sys.stderr.write("Parquet output needs the pyarrow package, install it with: pip install mgi[arrow], or use TSV\n")
+            sys.exit(1)
+    pipeline = qc.get_pipeline("rna")
+    try:
+        resolved = qc.resolve_samples(pipeline, sorted(samples), threads=threads) if samples else []
+        from_workflows = []
+        for workflow in workflows:
+            from_workflows += rna.samples_from_workflow(workflow)
+        resolved += qc.load_samples(pipeline, from_workflows, threads=threads)
+    except Exception as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    headers, rows = rna.get_cohort_table(resolved)
+    if output is None:
+        rna.write_cohort_tsv(sys.stdout, headers, rows)
+    elif output.endswith(".parquet"):
+        rna.write_cohort_parquet(output, headers, rows)
+    else:
+        with open(output, "w", newline="") as f:
+            rna.write_cohort_tsv(f, headers, rows)
+    if output is not None:
+        sys.stderr.write(f"Wrote {len(rows)} samples to {output}\n")
 #--
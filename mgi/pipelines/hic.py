@@ -1,81 +1,10 @@
-import json, numpy as np, operator, os, tabulate, yaml
+import json, os
 from collections import defaultdict
-import matplotlib.pyplot as plt
+
+from mgi.pipelines import qc
 
 def get_benchmarks():
-    return {
-            # Alignment
-            "aligned": { # >.9; .75-.9; <.75
-                "cat": "alignment",
-                "original_name": "2_alignments",
-                "ops": [[operator.ge, 75], [operator.gt, 90]],
-                "status": ["fail", "marg", "pass"],
-                "desc": ">90% (<75%)",
-                },
-            "unique": { # ? Guessing 75%
-                "cat": "alignment",
-                "original_name": "total_unique",
-                "ops": [[operator.ge, 40]],
-                "status": ["fail", "pass"],
-                "desc": ">=40%",
-                },
-            "chimeric": { # .1-.3 typical
-                "cat": "alignment",
-                "original_name": "chimera_paired",
-                "ops": [[operator.ge, 10], [operator.le, 30]],
-                "status": ["atypical", "atypical", "typical"],
-                "desc": "10-30%",
-                },
-            "duplicates": { # <.4 pass
-                "cat": "alignment",
-                "original_name": "total_duplicates",
-                "ops": [[operator.lt, 40]],
-                "status": ["marg", "pass"],
-                "desc": "<40%",
-                },
-            "unmapped": { # <.1 typical
-                "cat": "alignment",
-                "original_name": "chimera_ambiguous",
-                "ops": [[operator.le, 10]],
-                "status": ["atypical", "typical"],
-                "desc": "<10%",
-                },
-            # HiC
-            "hic_contacts": { # >.5; .2-.5; <.2
-                "cat": "hic",
-                "ops": [[operator.ge, 20], [operator.gt, 50]],
-                "status": ["fail", "marg", "pass"],
-                "desc": ">50% (<20%)",
-                },
-            "inter_chromosomal": { # <.4 typical
-                "cat": "hic",
-                "ops": [[operator.lt, 40]],
-                "status": ["atypical", "typical"],
-                "desc": "<40%",
-                },
-            "intra_chromosomal": { # >.4 typical
-                "cat": "hic",
-                "ops": [[operator.gt, 40]],
-                "status": ["atypical", "typical"],
-                "desc": ">40%",
-                },
-            # intra fragment   <.1; .1-.2; >.2
-            #"intra_fragment": [[[operator.lt, .1], [operator.lt, .2], [operator.lt, 1]], ["fail", "marginal", "pass"], ">40%"],
-            #ligations #fail < .05 #marginal .05 .25 #pass > .25
-            "short_range": { # <.3; .3-.6; >.6
-                "cat": "hic",
-                "ops": [[operator.lt, 30], [operator.le, 60]],
-                "status": ["fail", "marg", "pass"],
-                "desc": "<30% (>60%)",
-                },
-            "long_range": { # >.35; .2-.35; <.2
-                "cat": "hic",
-                "original_name": "long_range_greater_than_20kb",
-                "ops": [[operator.gt, 35], [operator.ge, 20]],
-                "status": ["fail", "marg", "pass"],
-                "desc": ">35% (<20%)",
-                },
-            }
+    return qc.get_pipeline("hic").benchmarks
 #--
 
 def get_benchmark_names_for_category(cat):
@@ -137,34 +66,304 @@ def load_stats(stats_fn):
     return new_stats
 #--
 
+@qc.register
+class HicQc(qc.QcPipeline):
+    """
+    ENCODE Hi-C benchmarks, on the stats_1.json of a sample directory, with percents of sequenced and unique read pairs.
+    """
+    name = "hic"
+    stat_types = ["seqd", "uniq"]
+    stat_labels = {"uniq": "uniq"}
+
+    def stats_fns(self, dn):
+        return [os.path.join(dn, "stats_1.json")]
+
+    def load_stats(self, fns):
+        return load_stats(fns[0])
+#-- HicQc
+
+STAT_TYPES = HicQc.stat_types
+
+def stats_cache_fn():
+    return qc.stats_cache_fn("hic")
+#--
+
+def load_stats_many(stats_fns, threads=16, cache_fn=None):
+    """
+    Load stats files in a pool of threads, with the stats cache. Set cache_fn to False to not use the cache.
+    """
+    if cache_fn is None:
+        cache_fn = stats_cache_fn()
+    return qc.load_stats_many(lambda fns: load_stats(fns[0]), [[fn] for fn in stats_fns], threads=threads, cache_fn=cache_fn, cache_version=qc.get_pipeline("hic").cache_version)
+#--
+
+def get_benchmarks_matrix(samples):
+    return qc.get_matrix(qc.get_pipeline("hic"), samples)
+#--
+
+def evaluate_benchmarks(pcts):
+    return qc.evaluate(qc.get_pipeline("hic"), pcts)
+#--
+
 def get_benchmarks_stats(samples):
-    benchmarks = get_benchmarks()
-    rows = []
-    for name in benchmarks.keys():
-        ops = benchmarks[name]["ops"]
-        statuses = benchmarks[name]["status"]
-        desc = benchmarks[name]["desc"]
-        new_rows = [ [name, desc], [name+" uniq", desc] ]
-        #new_rows = [ [name+" %", desc], [name+" uniq %", desc] ]
-        for j, subn in enumerate(["seqd", "uniq"]):
-            for sample in samples:
-                stats_v = sample["stats"][name][subn][0]
-                stats_pct = sample["stats"][name][subn][1]
-                if stats_pct is not None:
-                    ops_evals = list(map(lambda op: op[0](stats_pct, op[1]), ops))
-                    status = statuses[ops_evals.count(True)]
-                    #value = "{:.2%}".format(stats_pct/100)
-                else:
-                    continue
-                new_rows[j].append(f"{status}")
-                new_rows[j].append(f"{stats_pct}")
-                new_rows[j].append(f"{stats_v}")
-            j += 1
-        for row in new_rows:
-            if len(row) > 2:
-                rows.append(row)
-    headers=["STAT", "THRESHOLD"]
-    for s in samples:
-        headers += [s["label"].upper(), "PCT", "VALUE"]
-    return headers, rows
+    return qc.get_stats_table(qc.get_pipeline("hic"), samples)
+#--
+
+def get_benchmarks_summary(samples, outlier_z=qc.OUTLIER_Z):
+    return qc.get_summary(qc.get_pipeline("hic"), samples, outlier_z=outlier_z)
+#--
+
+# Histograms
+STATUS_COLORS = {"pass": "tab:green", "typical": "tab:green", "marg": "tab:orange", "fail": "tab:red", "atypical": "tab:gray"}
+PLOT_FORMATS = ["png", "pdf", "sprite"]
+HATCHES = ["", "//", "..", "xx", "\\\\", "oo"]
+
+def get_benchmarks_plots(samples, groups=None):
+    """
+    Plots as [key, title, series], where series are [label, percents, statuses] with one value per benchmark. With groups, one plot per group, of the sequenced percents of its runs. Else, one plot per sample, of its sequenced and unique percents.
+    """
+    import numpy as np
+    pcts = get_benchmarks_matrix(samples)
+    statuses = evaluate_benchmarks(pcts)
+    def series(i, k, label):
+        return [label, [None if np.isnan(v) else float(v) for v in pcts[i, :, k]], list(statuses[i, :, k])]
+    index = {id(s): i for i, s in enumerate(samples)}
+    plots = []
+    if groups is not None:
+        for name, group in groups.items():
+            plots.append([name, name, [series(index[id(s)], 0, s["label"]) for s in group]])
+        return plots
+    for i, s in enumerate(samples):
+        key = s["name"] if s["name"] == s["label"] else ".".join([s["name"], s["label"]])
+        plots.append([key, f"{s['name']} {s['label']}" if key != s["name"] else key, [series(i, 0, "sequenced"), series(i, 1, "unique")]])
+    return plots
+#--
+
+class BenchmarksPlotter():
+    """
+    Benchmark histograms, alignment and hic side by side, on an Agg canvas, so no display is needed. The figure, its layout and bars are made once, and each plot only sets bar heights, colors and labels. Bars are remade when the number of series changes.
+
+    With blit, the static parts of the figure (axes, ticks, labels) are drawn once and kept as a background, and each plot draws only the bars, legend and title on a copy of it. Vector output, like PDF, needs blit off.
+    """
+    def __init__(self, dpi=100, blit=True):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.dpi = dpi
+        self.blit = blit
+        self.figure = None
+        self.canvas_class = FigureCanvasAgg
+        self.figure_class = Figure
+        names = list(get_benchmarks().keys())
+        self.categories = []
+        for cat in ["alignment", "hic"]:
+            self.categories.append([cat, [names.index(n) for n in get_benchmark_names_for_category(cat)]])
+        self.bars = None
+
+    def make_figure(self, count):
+        import numpy as np
+        names = list(get_benchmarks().keys())
+        self.figure = self.figure_class(figsize=(12, 5), dpi=self.dpi, layout="constrained")
+        self.canvas = self.canvas_class(self.figure)
+        self.title = self.figure.suptitle("X")
+        self.bars = []
+        width = .8 / count
+        for ax, (cat, idxs) in zip(self.figure.subplots(1, 2), self.categories):
+            x = np.arange(len(idxs))
+            containers = [ax.bar(x - .4 + width * (j + .5), np.full(len(idxs), 100.), width, hatch=HATCHES[j % len(HATCHES)], edgecolor="black") for j in range(count)]
+            self.bars.append(containers)
+            ax.set_xticks(x, labels=[names[i] for i in idxs], rotation=30, ha="right")
+            ax.set_ylim(0, 100)
+            ax.set_ylabel("%")
+            ax.set_title(cat)
+        # Lay out once, with room for the title and legend labels, then keep the layout
+        self.legend = self.figure.legend(handles=self.bars[0], labels=["X" * 10] * count, loc="outside right upper")
+        for patch in self.legend.get_patches():
+            patch.set_facecolor("white")
+        self.canvas.draw()
+        self.figure.set_layout_engine("none")
+        self.animated = [self.title, self.legend] + [rect for containers in self.bars for container in containers for rect in container]
+        if self.blit:
+            for artist in self.animated:
+                artist.set_animated(True)
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def draw(self, title, series):
+        if self.bars is None or len(self.bars[0]) != len(series):
+            self.make_figure(len(series))
+        for (cat, idxs), containers in zip(self.categories, self.bars):
+            for container, (label, pcts, statuses) in zip(containers, series):
+                for rect, i in zip(container, idxs):
+                    rect.set_height(0 if pcts[i] is None else pcts[i])
+                    rect.set_facecolor(STATUS_COLORS.get(statuses[i], "white"))
+        for text, (label, pcts, statuses) in zip(self.legend.get_texts(), series):
+            text.set_text(label)
+        self.title.set_text(title)
+        if self.blit:
+            self.canvas.restore_region(self.background)
+            for artist in self.animated:
+                self.figure.draw_artist(artist)
+
+    def rgb(self):
+        import numpy as np
+        if not self.blit:
+            self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba())[:, :, :3].copy()
+
+    def save_png(self, fn):
+        from PIL import Image
+        if not self.blit:
+            self.canvas.draw()
+        # Straight from the canvas buffer. Flat colors compress well even at the fastest level.
+        Image.frombuffer("RGBA", self.canvas.get_width_height(), self.canvas.buffer_rgba(), "raw", "RGBA", 0, 1).convert("RGB").save(fn, compress_level=1)
+#-- BenchmarksPlotter
+
+def render_benchmarks_plots(plots, kind, output_dn, fmt):
+    """
+    Render plots with one plotter. PNGs are saved as kind files in the output directory, and their file names returned. Sprites are returned as small RGB arrays.
+    """
+    plotter = BenchmarksPlotter(dpi=40 if fmt == "sprite" else 100)
+    rendered = []
+    for key, title, series in plots:
+        plotter.draw(title, series)
+        if fmt == "sprite":
+            rendered.append(plotter.rgb())
+        else:
+            fn = os.path.join(output_dn, f"{key}.{kind}.png")
+            plotter.save_png(fn)
+            rendered.append(fn)
+    return rendered
+#--
+
+def create_benchmarks_histograms(plots, kind, output_dn, fmt="png", processes=1):
+    """
+    Write benchmark histograms: a PNG per plot, one multi-page PDF, or a sprite sheet PNG of thumbnails, named benchmarks.KIND.pdf or .png. PNGs and sprites are rendered in a process pool for larger cohorts. Returns the files written.
+    """
+    os.makedirs(output_dn, exist_ok=True)
+    if fmt == "pdf":
+        from matplotlib.backends.backend_pdf import PdfPages
+        fn = os.path.join(output_dn, f"benchmarks.{kind}.pdf")
+        plotter = BenchmarksPlotter(blit=False)
+        with PdfPages(fn) as pdf:
+            for key, title, series in plots:
+                plotter.draw(title, series)
+                pdf.savefig(plotter.figure)
+        return [fn]
+    if processes > 1 and len(plots) > 2 * processes:
+        from concurrent.futures import ProcessPoolExecutor
+        size = -(-len(plots) // processes)
+        chunks = [plots[i:i+size] for i in range(0, len(plots), size)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            rendered = [r for chunk in executor.map(render_benchmarks_plots, chunks, [kind] * len(chunks), [output_dn] * len(chunks), [fmt] * len(chunks)) for r in chunk]
+    else:
+        rendered = render_benchmarks_plots(plots, kind, output_dn, fmt)
+    if fmt != "sprite":
+        return rendered
+    import numpy as np
+    from matplotlib.image import imsave
+    height, width, depth = rendered[0].shape
+    columns = int(np.ceil(np.sqrt(len(rendered))))
+    rows = -(-len(rendered) // columns)
+    sheet = np.full((rows * height, columns * width, depth), 255, dtype=np.uint8)
+    for i, image in enumerate(rendered):
+        r, c = divmod(i, columns)
+        sheet[r*height:(r+1)*height, c*width:(c+1)*width] = image
+    fn = os.path.join(output_dn, f"benchmarks.{kind}.png")
+    imsave(fn, sheet)
+    return [fn]
+#--
+
+def create_benchmarks_comparative_histograms(samples, groups, output_dn, fmt="png", processes=1):
+    return create_benchmarks_histograms(get_benchmarks_plots(samples, groups), "ch", output_dn, fmt=fmt, processes=processes)
+#--
+
+def create_benchmarks_detail_histograms(samples, output_dn, fmt="png", processes=1):
+    return create_benchmarks_histograms(get_benchmarks_plots(samples), "detail", output_dn, fmt=fmt, processes=processes)
+#--
+
+# DB
+QC_GROUP = "hic_qc"
+
+def stats_to_features(sample, statuses):
+    """
+    Entity feature name and values of a sample's stats, with the benchmark statuses from evaluate_benchmarks. Values are JSON, so numbers come back with their types. Missing values are left out.
+    """
+    stats = sample["stats"]
+    features = {
+            "sample": sample["name"],
+            "dn": sample["dn"],
+            "sequenced": stats["sequenced"],
+            "unique": stats["unique"],
+            "multimapped.seqd.pct": stats["multimapped"]["seqd"],
+            }
+    for j, name in enumerate(get_benchmarks().keys()):
+        for k, subn in enumerate(STAT_TYPES):
+            v, pct = stats[name][subn]
+            features[f"{name}.{subn}.value"] = v
+            features[f"{name}.{subn}.pct"] = pct
+            features[f"{name}.{subn}.status"] = statuses[j, k]
+    return {n: json.dumps(v) for n, v in features.items() if v is not None}
+#--
+
+def features_to_sample(entity_name, features):
+    """
+    Sample, with stats like load_stats, from its entity features.
+    """
+    features = {n: json.loads(v) for n, v in features.items()}
+    stats = {
+            "sequenced": features.get("sequenced"),
+            "unique": features.get("unique"),
+            "multimapped": {"seqd": features.get("multimapped.seqd.pct")},
+            }
+    for name in sorted(get_benchmarks().keys()):
+        stats[name] = {subn: [features.get(f"{name}.{subn}.value"), features.get(f"{name}.{subn}.pct")] for subn in STAT_TYPES}
+    return {"name": features.get("sample", entity_name), "label": entity_name, "dn": features.get("dn"), "stats": stats}
+#--
+
+def ingest_samples(samples, entity_kind="sample", batch_size=500):
+    """
+    Store samples stats as features of their entities, named by sample label, in the hic_qc group. Each batch replaces the features of its entities in one bulk load, so values gone from the stats do not linger. Returns the number of features stored.
+    """
+    from sqlalchemy import delete
+    from mgi.bulk import chunked, load_rows
+    from mgi.entity.path import resolve_entity_ids
+    from mgi.models import db, EntityFeature
+    count = 0
+    for batch in chunked(samples, batch_size):
+        statuses = evaluate_benchmarks(get_benchmarks_matrix(batch))
+        entity_ids = resolve_entity_ids(set([s["label"] for s in batch]), entity_kind, create_entities=True)
+        rows = []
+        for i, sample in enumerate(batch):
+            for name, value in stats_to_features(sample, statuses[i]).items():
+                rows.append({"entity_id": entity_ids[sample["label"]], "group": QC_GROUP, "name": name, "value": value})
+        con = db.session.connection()
+        con.execute(delete(EntityFeature.__table__).where(EntityFeature.group == QC_GROUP, EntityFeature.entity_id.in_(entity_ids.values())))
+        load_rows(con, EntityFeature.__table__, rows, index_elements=["entity_id", "group", "name"])
+        db.session.commit()
+        count += len(rows)
+    return count
+#--
+
+def load_samples_from_db(names=None, status=None, entity_kind="sample"):
+    """
+    Ingested samples, by entity name, or all. With status, only samples with a benchmark of that status, found with the feature value index.
+    """
+    from sqlalchemy import select
+    from mgi.bulk import chunked
+    from mgi.models import db, Entity, EntityFeature
+    stmt = select(Entity.name, EntityFeature.name, EntityFeature.value).join(EntityFeature, EntityFeature.entity_id == Entity.id).where(Entity.kind == entity_kind, EntityFeature.group == QC_GROUP)
+    if status is not None:
+        status_names = [f"{n}.{subn}.status" for n in get_benchmarks().keys() for subn in STAT_TYPES]
+        with_status = select(EntityFeature.entity_id).where(EntityFeature.group == QC_GROUP, EntityFeature.name.in_(status_names), EntityFeature.value == json.dumps(status))
+        stmt = stmt.where(Entity.id.in_(with_status))
+    features = defaultdict(dict)
+    con = db.session.connection()
+    if names is None:
+        stmts = [stmt]
+    else:
+        stmts = [stmt.where(Entity.name.in_(chunk)) for chunk in chunked(names, 500)]
+    for s in stmts:
+        for entity_name, name, value in con.execute(s):
+            features[entity_name][name] = value
+    return [features_to_sample(n, features[n]) for n in sorted(features.keys())]
 #--
@@ -0,0 +1,359 @@
+import functools, hashlib, importlib, json, operator, os, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# Threshold operators in the YAML specs, and their NumPy versions. NumPy is imported when needed, to keep the CLI startup fast.
+OPS = {
+        "lt": operator.lt,
+        "le": operator.le,
+        "gt": operator.gt,
+        "ge": operator.ge,
+        }
+NUMPY_OPS = {
+        operator.lt: "less",
+        operator.le: "less_equal",
+        operator.gt: "greater",
+        operator.ge: "greater_equal",
+        }
+THRESHOLDS_DN = os.path.join(os.path.dirname(__file__), "thresholds")
+# Modules with QC pipelines, imported when a pipeline is needed
+PLUGIN_MODULES = ["mgi.pipelines.hic", "mgi.pipelines.rna"]
+
+def load_thresholds(fn):
+    """
+    Benchmarks from a YAML threshold spec: a mapping of benchmark names to cat, ops, status and desc. Ops are [operator, threshold] pairs, and the status at the index of the number of true ops is given, so status needs one more entry than ops.
+    """
+    import yaml
+    with open(fn, "r") as f:
+        spec = yaml.safe_load(f)
+    benchmarks = {}
+    for name, benchmark in spec.items():
+        benchmark = dict(benchmark)
+        for op, threshold in benchmark["ops"]:
+            if op not in OPS:
+                raise Exception(f"Unknown operator {op} for benchmark {name} in {fn}, known are: {' '.join(OPS.keys())}")
+        benchmark["ops"] = [[OPS[op], threshold] for op, threshold in benchmark["ops"]]
+        if len(benchmark["status"]) != len(benchmark["ops"]) + 1:
+            raise Exception(f"Benchmark {name} in {fn} needs one more status than ops")
+        benchmarks[name] = benchmark
+    return benchmarks
+#-- load_thresholds
+
+class QcPipeline():
+    """
+    QC plugin for a pipeline. Subclasses set the name, and implement stats_fns(dn), giving the QC files of a sample directory, and load_stats(fns), giving its stats. Pipelines with many libraries in a directory implement libraries(dn) instead of stats_fns. Stats map benchmark names to stat types, each a [value, percent] pair, like {"aligned": {"seqd": [900, 90.0], "uniq": [...]}}. Thresholds are read from THRESHOLDS_DN/NAME.yaml.
+
+    Stat types after the first are shown as the benchmark name and the stat label. Bump the stats_version when load_stats changes, so cached stats are loaded again.
+    """
+    name = None
+    stat_types = ["value"]
+    stat_labels = {}
+    stats_version = 1
+
+    def __init__(self, thresholds_fn=None):
+        if thresholds_fn is None:
+            thresholds_fn = os.path.join(THRESHOLDS_DN, f"{self.name}.yaml")
+        self.thresholds_fn = thresholds_fn
+
+    @functools.cached_property
+    def benchmarks(self):
+        return load_thresholds(self.thresholds_fn)
+
+    @functools.cached_property
+    def cache_version(self):
+        """
+        Version of the cached stats: the stats version and a hash of the threshold spec, as loaded stats can depend on the benchmarks.
+        """
+        with open(self.thresholds_fn, "rb") as f:
+            return f"{self.stats_version}:{hashlib.sha1(f.read()).hexdigest()}"
+
+    @functools.cached_property
+    def compiled(self):
+        """
+        Benchmark names, with their thresholds as NumPy comparisons and their statuses as arrays, to index by the number of passed comparisons.
+        """
+        import numpy as np
+        compiled = []
+        for name, benchmark in self.benchmarks.items():
+            ops = [[getattr(np, NUMPY_OPS[op]), threshold] for op, threshold in benchmark["ops"]]
+            compiled.append([name, ops, np.array(benchmark["status"], dtype=object)])
+        return compiled
+
+    def stat_name(self, name, subn):
+        if subn == self.stat_types[0]:
+            return name
+        return " ".join([name, self.stat_labels.get(subn, subn)])
+
+    def stats_fns(self, dn):
+        raise NotImplementedError
+
+    def libraries(self, dn):
+        """
+        QC files of each library in a sample directory, as library names to files. One unnamed library by default.
+        """
+        return {None: self.stats_fns(dn)}
+
+    def load_stats(self, fns):
+        raise NotImplementedError
+#-- QcPipeline
+
+pipelines = {}
+_instances = {}
+
+def register(cls):
+    pipelines[cls.name] = cls
+    return cls
+#-- register
+
+def import_plugins():
+    for module in PLUGIN_MODULES:
+        importlib.import_module(module)
+#-- import_plugins
+
+def get_pipeline(name):
+    import_plugins()
+    if name not in pipelines:
+        raise Exception(f"No QC for pipeline {name}, known are: {' '.join(sorted(pipelines.keys()))}")
+    if name not in _instances:
+        _instances[name] = pipelines[name]()
+    return _instances[name]
+#-- get_pipeline
+
+def pipeline_names():
+    import_plugins()
+    return sorted(pipelines.keys())
+#-- pipeline_names
+
+# Loading
+def stats_cache_fn(name):
+    """
+    Cache of loaded stats of a pipeline: in MGI_CACHE_DN if set, else the XDG cache directory.
+    """
+    dn = os.environ.get("MGI_CACHE_DN")
+    if not dn:
+        dn = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "mgi")
+    return os.path.join(dn, f"{name}-stats.db")
+#-- stats_cache_fn
+
+class StatsCache():
+    """
+    Loaded stats in a SQLite file, keyed by the stats file path, size and mtime, and the version of the loader. A stats file that changed, or stats cached by another version, get loaded again.
+    """
+    def __init__(self, fn, version=""):
+        os.makedirs(os.path.dirname(os.path.abspath(fn)), exist_ok=True)
+        self.version = version
+        self.con = sqlite3.connect(fn, timeout=60)
+        columns = [r[1] for r in self.con.execute("PRAGMA table_info(stats)")]
+        if columns and "version" not in columns:
+            # Cache from before versions, load the stats again
+            self.con.execute("DROP TABLE stats")
+        self.con.execute("CREATE TABLE IF NOT EXISTS stats (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, version TEXT, stats TEXT)")
+
+    def get_many(self, keys):
+        found = {}
+        paths = [k[0] for k in keys]
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i+500]
+            for path, size, mtime_ns, stats in self.con.execute(f"SELECT path, size, mtime_ns, stats FROM stats WHERE version = ? AND path IN ({','.join('?' * len(chunk))})", [self.version, *chunk]):
+                found[(path, size, mtime_ns)] = stats
+        return {k: json.loads(found[k]) for k in keys if k in found}
+
+    def put_many(self, items):
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO stats (path, size, mtime_ns, version, stats) VALUES (?, ?, ?, ?, ?)", [[*k, self.version, json.dumps(v, separators=(",", ":"))] for k, v in items])
+
+    def close(self):
+        self.con.close()
+#-- StatsCache
+
+def stats_key(fns):
+    # Samples with many QC files are keyed by all their paths, total size and latest mtime
+    sts = [os.stat(fn) for fn in fns]
+    return ("\n".join([os.path.abspath(fn) for fn in fns]), sum([st.st_size for st in sts]), max([st.st_mtime_ns for st in sts]))
+#-- stats_key
+
+def load_stats_many(load, fns_list, threads=16, cache_fn=False, cache_version=""):
+    """
+    Load the stats of samples, each a list of QC files, with load(fns) in a pool of threads, so the latency of networked storage overlaps. Stats in the cache, with the same size, mtime and cache_version, cost one stat call per file. Give a cache_fn, like from stats_cache_fn(), to use the cache, and the cache_version of the pipeline.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        keys = list(executor.map(stats_key, fns_list))
+        cache = None
+        cached = {}
+        if cache_fn:
+            try:
+                cache = StatsCache(cache_fn, version=cache_version)
+                cached = cache.get_many(keys)
+            except (OSError, sqlite3.Error):
+                # Cache is optional, like on a read only home
+                cache = None
+        missing = [k for k in keys if k not in cached]
+        loaded = list(executor.map(load, [k[0].split("\n") for k in missing]))
+    if cache is not None:
+        try:
+            cache.put_many(zip(missing, loaded))
+        except sqlite3.Error:
+            pass
+        cache.close()
+    cached.update(zip(missing, loaded))
+    return [cached[k] for k in keys]
+#-- load_stats_many
+
+def resolve_samples(pipeline, samples_and_dns, threads=16, cache_fn=None):
+    """
+    Samples from DIRECTORY, SAMPLE:DIRECTORY or SAMPLE:LABEL:DIRECTORY strings, with their stats loaded by the pipeline. A directory alone is named by its base name. QC files are found in the directories in a pool of threads. A directory with many libraries gives a sample for each, with the library name added to the sample name and label.
+    """
+    samples = []
+    for sample_and_dns in samples_and_dns:
+        tokens = sample_and_dns.split(":")
+        if len(tokens) not in (1, 2, 3):
+            raise Exception(f"Expected DIRECTORY, SAMPLE:DIRECTORY or SAMPLE:LABEL:DIRECTORY, not {sample_and_dns}")
+        dn = os.path.abspath(tokens[-1])
+        name = tokens[0] if len(tokens) > 1 else os.path.basename(dn)
+        samples.append({"name": name, "label": tokens[1] if len(tokens) == 3 else name, "dn": dn})
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        libraries = list(executor.map(pipeline.libraries, [s["dn"] for s in samples]))
+    resolved = []
+    for sample, sample_libraries in zip(samples, libraries):
+        if len(sample_libraries) == 1:
+            sample["stats_fns"] = next(iter(sample_libraries.values()))
+            resolved.append(sample)
+            continue
+        for library, fns in sample_libraries.items():
+            resolved.append({"name": f"{sample['name']}.{library}", "label": f"{sample['label']}.{library}", "dn": sample["dn"], "stats_fns": fns})
+    return load_samples(pipeline, resolved, threads=threads, cache_fn=cache_fn)
+#-- resolve_samples
+
+def load_samples(pipeline, samples, threads=16, cache_fn=None):
+    """
+    Load the stats of samples with their stats_fns, using the pipeline stats cache, unless cache_fn is False.
+    """
+    if cache_fn is None:
+        cache_fn = stats_cache_fn(pipeline.name)
+    for sample, stats in zip(samples, load_stats_many(pipeline.load_stats, [s["stats_fns"] for s in samples], threads=threads, cache_fn=cache_fn, cache_version=pipeline.cache_version)):
+        sample["stats"] = stats
+    return samples
+#-- load_samples
+
+# Evaluation
+def get_matrix(pipeline, samples):
+    """
+    Benchmark percents of the samples, as a samples x benchmarks x stat types matrix. Missing percents are NaN.
+    """
+    import numpy as np
+    names = list(pipeline.benchmarks.keys())
+    pcts = np.full((len(samples), len(names), len(pipeline.stat_types)), np.nan)
+    for i, sample in enumerate(samples):
+        for j, name in enumerate(names):
+            stats = sample["stats"].get(name, {})
+            for k, subn in enumerate(pipeline.stat_types):
+                pct = stats.get(subn, [None, None])[1]
+                if pct is not None:
+                    pcts[i, j, k] = pct
+    return pcts
+#-- get_matrix
+
+def evaluate(pipeline, pcts):
+    """
+    Statuses for a matrix of percents from get_matrix, evaluating each benchmark for the whole cohort at once. Missing percents get None.
+    """
+    import numpy as np
+    statuses = np.full(pcts.shape, None, dtype=object)
+    for j, (name, ops, status_names) in enumerate(pipeline.compiled):
+        passed = np.zeros(pcts.shape[0:1] + pcts.shape[2:], dtype=int)
+        for ufunc, threshold in ops:
+            passed += ufunc(pcts[:, j, :], threshold)
+        statuses[:, j, :] = status_names[passed]
+    statuses[np.isnan(pcts)] = None
+    return statuses
+#-- evaluate
+
+def get_stats_table(pipeline, samples):
+    """
+    Headers and rows of the benchmarks, a row per benchmark and stat type, with status, percent and value columns for each sample. Missing percents are skipped.
+    """
+    pcts = get_matrix(pipeline, samples)
+    statuses = evaluate(pipeline, pcts)
+    rows = []
+    for j, (name, ops, status_names) in enumerate(pipeline.compiled):
+        desc = pipeline.benchmarks[name]["desc"]
+        new_rows = [[pipeline.stat_name(name, subn), desc] for subn in pipeline.stat_types]
+        for k, subn in enumerate(pipeline.stat_types):
+            for i, sample in enumerate(samples):
+                if statuses[i, j, k] is None:
+                    continue
+                stats_v, stats_pct = sample["stats"][name][subn]
+                new_rows[k] += [f"{statuses[i, j, k]}", f"{stats_pct}", f"{stats_v}"]
+        for row in new_rows:
+            if len(row) > 2:
+                rows.append(row)
+    headers=["STAT", "THRESHOLD"]
+    for s in samples:
+        headers += [s["label"].upper(), "PCT", "VALUE"]
+    return headers, rows
+#-- get_stats_table
+
+# Cohort summary
+SUMMARY_PERCENTILES = [5, 25, 50, 75, 95]
+OUTLIER_Z = 3.5
+
+def get_summary(pipeline, samples, outlier_z=OUTLIER_Z):
+    """
+    Cohort summary of each benchmark percent, computed over the whole stats matrix at once: count, mean, min, percentiles, max, median absolute deviation (MAD), status counts, and outliers. Outliers have a robust z score, |pct - median| / (1.4826 * MAD), over outlier_z. Benchmarks without percents are left out.
+
+    Returns dicts in the order of the benchmarks table, with outliers as sample labels.
+    """
+    import numpy as np, warnings
+    pcts = get_matrix(pipeline, samples)
+    statuses = evaluate(pipeline, pcts)
+    with warnings.catch_warnings():
+        # All NaN benchmarks, they are left out
+        warnings.simplefilter("ignore", RuntimeWarning)
+        counts = np.sum(~np.isnan(pcts), axis=0)
+        means = np.nanmean(pcts, axis=0)
+        mins = np.nanmin(pcts, axis=0)
+        maxs = np.nanmax(pcts, axis=0)
+        percentiles = np.nanpercentile(pcts, SUMMARY_PERCENTILES, axis=0)
+        medians = percentiles[SUMMARY_PERCENTILES.index(50)]
+        deviations = np.abs(pcts - medians)
+        mads = np.nanmedian(deviations, axis=0)
+        outliers = deviations > outlier_z * 1.4826 * np.where(mads > 0, mads, np.inf)
+    labels = np.array([s["label"] for s in samples], dtype=object)
+    summary = []
+    for j, (name, ops, status_names) in enumerate(pipeline.compiled):
+        benchmark = pipeline.benchmarks[name]
+        for k, subn in enumerate(pipeline.stat_types):
+            if counts[j, k] == 0:
+                continue
+            status_counts = {n: 0 for n in dict.fromkeys(benchmark["status"])}
+            found, found_counts = np.unique(statuses[:, j, k][~np.isnan(pcts[:, j, k])].astype(str), return_counts=True)
+            status_counts.update({str(n): int(c) for n, c in zip(found, found_counts)})
+            row = {
+                    "stat": pipeline.stat_name(name, subn),
+                    "threshold": benchmark["desc"],
+                    "count": int(counts[j, k]),
+                    "mean": float(means[j, k]),
+                    "min": float(mins[j, k]),
+                    }
+            for i, p in enumerate(SUMMARY_PERCENTILES):
+                row[f"p{p}"] = float(percentiles[i, j, k])
+            row["max"] = float(maxs[j, k])
+            row["mad"] = float(mads[j, k])
+            row["statuses"] = status_counts
+            row["outliers"] = list(labels[outliers[:, j, k]])
+            summary.append(row)
+    return summary
+#-- get_summary
+
+def summary_to_rows(summary):
+    """
+    Headers and rows of a cohort summary for TSV, with numbers to 2 decimals, statuses as name=count and the number of outliers.
+    """
+    headers = ["STAT", "THRESHOLD", "COUNT", "MEAN", "MIN"] + [f"P{p}" for p in SUMMARY_PERCENTILES] + ["MAX", "MAD", "STATUSES", "OUTLIERS"]
+    rows = []
+    for r in summary:
+        row = [r["stat"], r["threshold"], r["count"]]
+        row += [f"{r[k]:.2f}" for k in ["mean", "min"] + [f"p{p}" for p in SUMMARY_PERCENTILES] + ["max", "mad"]]
+        row += [",".join([f"{n}={c}" for n, c in r["statuses"].items()]), len(r["outliers"])]
+        rows.append(row)
+    return headers, rows
+#-- summary_to_rows
@@ -0,0 +1,174 @@
+import csv, glob, json, os
+
+from mgi.pipelines import qc
+
+FLAGSTAT_SUFFIX = "_genome_flagstat.json"
+STARLOG_SUFFIX = "_Log.final.json"
+
+def to_number(value):
+    """
+    Numbers from QC values, which may be strings like "1,024", "95.40%" or "N/A". Not numbers give None.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = str(value).strip().rstrip("%").replace(",", "")
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return None
+#--
+
+def pct_of(count, total):
+    if count is None or not total:
+        return None
+    return round(count * 100 / total, 2)
+#--
+
+def load_qc_json(fn):
+    # QCMetric JSONs have the content under the metric name
+    with open(fn, "r") as f:
+        data = json.load(f)
+    if len(data) == 1 and isinstance(next(iter(data.values())), dict):
+        return next(iter(data.values()))
+    return data
+#--
+
+def load_stats(flagstat_fn, starlog_fn):
+    """
+    Stats of a library from its samtools flagstat and STAR log QC JSONs, as benchmark names to a [count, percent] value. Keys are the ones of the qc_utils flagstat and STAR log parsers, single end flagstats have no paired counts.
+    """
+    flagstat = {k: to_number(v) for k, v in load_qc_json(flagstat_fn).items()}
+    star = {k: to_number(v) for k, v in load_qc_json(starlog_fn).items()}
+    splices = star.get("Number of splices: Total")
+    paired = flagstat.get("paired")
+    stats = {
+            "input_reads": [star.get("Number of input reads"), None],
+            "read_length": [star.get("Average input read length"), None],
+            "mapped": [flagstat.get("mapped"), flagstat.get("mapped_pct")],
+            "properly_paired": [flagstat.get("paired_properly"), flagstat.get("paired_properly_pct")] if paired else [None, None],
+            "uniquely_mapped": [star.get("Uniquely mapped reads number"), star.get("Uniquely mapped reads %")],
+            "multimapped": [star.get("Number of reads mapped to multiple loci"), star.get("% of reads mapped to multiple loci")],
+            "too_many_loci": [star.get("Number of reads mapped to too many loci"), star.get("% of reads mapped to too many loci")],
+            "unmapped_too_short": [star.get("Number of reads unmapped: too short"), star.get("% of reads unmapped: too short")],
+            "annotated_splices": [star.get("Number of splices: Annotated (sjdb)"), pct_of(star.get("Number of splices: Annotated (sjdb)"), splices)],
+            "non_canonical_splices": [star.get("Number of splices: Non-canonical"), pct_of(star.get("Number of splices: Non-canonical"), splices)],
+            "mismatch_rate": [None, star.get("Mismatch rate per base, %")],
+            }
+    return {name: {"value": value} for name, value in stats.items()}
+#--
+
+def find_qc_files(dn):
+    """
+    The flagstat and STAR log QC JSONs of each library in or under a run directory, like a Cromwell call execution directory, a workflow root with shards, or the working directory of an align.py manifest. Files are paired by their bamroot prefix, and given as library names, the prefix relative to the directory, to the [flagstat, STAR log] pair. A file without its pair is an error.
+    """
+    def find(pattern):
+        return sorted(glob.glob(os.path.join(glob.escape(dn), pattern), recursive=True))
+    fns = find(f"*{FLAGSTAT_SUFFIX}") + find(f"*{STARLOG_SUFFIX}")
+    if not fns:
+        fns = find(os.path.join("**", f"*{FLAGSTAT_SUFFIX}")) + find(os.path.join("**", f"*{STARLOG_SUFFIX}"))
+    if not fns:
+        raise Exception(f"No *{FLAGSTAT_SUFFIX} or *{STARLOG_SUFFIX} found in {dn}")
+    libraries = {}
+    for fn in fns:
+        suffix = FLAGSTAT_SUFFIX if fn.endswith(FLAGSTAT_SUFFIX) else STARLOG_SUFFIX
+        libraries.setdefault(os.path.relpath(fn[:-len(suffix)], dn), {})[suffix] = fn
+    for library, found in libraries.items():
+        for suffix in (FLAGSTAT_SUFFIX, STARLOG_SUFFIX):
+            if suffix not in found:
+                raise Exception(f"No {library}{suffix} found for {next(iter(found.values()))}")
+    return {library: [found[FLAGSTAT_SUFFIX], found[STARLOG_SUFFIX]] for library, found in sorted(libraries.items())}
+#--
+
+@qc.register
+class RnaQc(qc.QcPipeline):
+    """
+    RNA-seq alignment benchmarks, on the flagstat and STAR log QC JSONs of each library of the align task.
+    """
+    name = "rna"
+
+    def stats_fns(self, dn):
+        libraries = self.libraries(dn)
+        if len(libraries) != 1:
+            raise Exception(f"Found {len(libraries)} libraries in {dn}, expected one")
+        return next(iter(libraries.values()))
+
+    def libraries(self, dn):
+        return find_qc_files(dn)
+
+    def load_stats(self, fns):
+        return load_stats(*fns)
+#-- RnaQc
+
+def samples_from_workflow(identifier):
+    """
+    Samples for the done align calls of a Cromwell workflow, with the QC JSONs from its metadata. Workflows are found with cw, by Cromwell id, name or cw DB id. Samples are named by the workflow name, and the shard if many.
+    """
+    import cw.wf_metadata
+    from cw.model_helpers import get_wf
+    wf = get_wf(identifier)
+    if wf is None:
+        raise Exception(f"Failed to get workflow for <{identifier}>")
+    metadata = cw.wf_metadata.metadata_for_wf(wf)
+    calls = metadata.get("calls", {}).get(f"{metadata['workflowName']}.align", [])
+    done = [c for c in calls if c.get("executionStatus") == "Done"]
+    samples = []
+    for call in done:
+        name = wf.name if len(calls) == 1 else f"{wf.name}.{call['shardIndex']}"
+        outputs = call.get("outputs", {})
+        if outputs.get("flagstat_json") is None or outputs.get("log_json") is None:
+            continue
+        samples.append({"name": name, "label": name, "dn": os.path.dirname(outputs["flagstat_json"]), "stats_fns": [outputs["flagstat_json"], outputs["log_json"]]})
+    return samples
+#--
+
+def get_cohort_table(samples):
+    """
+    Headers and rows of the cohort matrix, a row per library: input reads and read length, then the count, percent and status of each benchmark, and the flags, benchmarks that did not pass, as name=status.
+    """
+    pipeline = qc.get_pipeline("rna")
+    statuses = qc.evaluate(pipeline, qc.get_matrix(pipeline, samples))
+    names = list(pipeline.benchmarks.keys())
+    headers = ["sample", "label", "input_reads", "read_length"]
+    for name in names:
+        headers += [f"{name}_count", f"{name}_pct", f"{name}_status"]
+    headers.append("flags")
+    rows = []
+    for i, sample in enumerate(samples):
+        stats = sample["stats"]
+        row = [sample["name"], sample["label"], stats["input_reads"]["value"][0], stats["read_length"]["value"][0]]
+        flags = []
+        for j, name in enumerate(names):
+            count, pct = stats[name]["value"]
+            status = statuses[i, j, 0]
+            row += [count, pct, status]
+            if status not in (None, "pass", "typical"):
+                flags.append(f"{name}={status}")
+        row.append(",".join(flags))
+        rows.append(row)
+    return headers, rows
+#--
+
+def write_cohort_tsv(f, headers, rows):
+    wtr = csv.writer(f, delimiter="\t", lineterminator="\n")
+    wtr.writerow(headers)
+    wtr.writerows([["" if v is None else v for v in r] for r in rows])
+#--
+
+def write_cohort_parquet(fn, headers, rows):
+    import pyarrow as pa, pyarrow.parquet as pq
+    columns = {}
+    for i, name in enumerate(headers):
+        values = [r[i] for r in rows]
+        if name.endswith("_pct"):
+            arrow_type = pa.float64()
+        elif name in ("input_reads", "read_length") or name.endswith("_count"):
+            arrow_type = pa.float64() if any(isinstance(v, float) for v in values) else pa.int64()
+        else:
+            arrow_type = pa.string()
+        columns[name] = pa.array(values, type=arrow_type)
+    pq.write_table(pa.table(columns), fn)
+#--
@@ -77,7 +77,7 @@ from mgi.entity.path import update_help, update_entities_paths;
 @click.argument("tsv", nargs=1)
 @click.argument("features", nargs=-1)
 def refs_paths_update_cmd(tsv, features):
-    features = resolve_features(features, known_features=["entity", "value", "checksum", "exists", "group", "kind"], boolean_features=["exists"])
+    features = resolve_features(features, known_features=["entity", "value", "checksum", "exists", "group", "kind", "size"], boolean_features=["exists"])
     rdr = rdr_factory(tsv)
     added, updated = update_entities_paths(rdr=rdr, features=features, entity_kind="ref", create_entities=True)
     sys.stdout.write(f"Done. Added {added} and updated {updated} of {added+updated} given paths.\n")
@@ -77,8 +77,30 @@ from mgi.entity.path import update_help, update_entities_paths;
 @click.argument("tsv", nargs=1)
 @click.argument("features", nargs=-1)
 def samples_paths_update_cmd(tsv, features):
-    features = resolve_features(features, known_features=["entity", "value", "checksum", "exists", "group", "kind"], boolean_features=["exists"])
+    features = resolve_features(features, known_features=["entity", "value", "checksum", "exists", "group", "kind", "size"], boolean_features=["exists"])
     rdr = rdr_factory(tsv)
     added, updated = update_entities_paths(rdr=rdr, features=features, entity_kind="ref", create_entities=True)
     sys.stdout.write(f"Done. Added {added} and updated {updated} of {added+updated} given paths.\n")
 #-- samples_paths_update_cmd
+
+@samples_paths_cli.command(name="crawl", short_help="register samples paths from a directory tree")
+@click.argument("root", type=click.Path(exists=True, file_okay=False), nargs=1)
+@click.argument("features", nargs=-1)
+@click.option("--threads", "-t", type=click.INT, default=8, show_default=True, help="Directories to scan at once")
+@click.option("--batch-size", "-b", type=click.INT, default=5000, show_default=True, help="Paths to write to the database per commit")
+def samples_paths_crawl_cmd(root, features, threads, batch_size):
+    """
+    Crawl a Directory Tree for Samples Paths
+
+    Walk the directory tree under ROOT, and add or update the files as samples paths, with their size and modification time. Sample names and path kinds are resolved from the file names, and missing samples are created. Symlinks are not followed.
+
+    Give features for all paths as name=value pairs, like group=cohort_22.
+    """
+    from mgi.entity.crawl import crawl_entities_paths
+    features = resolve_features(features, known_features=["group", "kind"])
+    stats = crawl_entities_paths(root, entity_kind="sample", features=features, threads=threads, batch_size=batch_size)
+    for error in stats["errors"]:
+        sys.stderr.write(f"Failed to scan {error}\n")
+    rate = stats["files"] / stats["seconds"] if stats["seconds"] else 0
+    sys.stdout.write(f"Crawled {stats['files']} files in {stats['directories']} directories in {stats['seconds']:.1f}s ({rate:.0f} files/sec). Added {stats['added']} and updated {stats['updated']} paths.\n")
+#-- samples_paths_crawl_cmd
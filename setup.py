@@ -11,10 +11,8 @@ tests_require = [
 ]
 
 install_requires=[
+    "alembic>=1.4",
     "click>=8.0",
-    "flask",
-    "flask-migrate",
-    "flask-sqlalchemy",
     "Jinja2>=3.0",
     "matplotlib",
     "numpy",
@@ -33,6 +31,7 @@ setup(
     license=license,
     url="https://github.com/hall-lab/mgi-tk.git",
     install_requires=install_requires,
+    extras_require={"arrow": ["pyarrow"], "gcs": ["google-cloud-storage"], "postgres": ["psycopg2"], "s3": ["boto3"], "web": ["flask"]},
     entry_points="""
         [console_scripts]
         mgi=mgi.cli:cli
@@ -41,7 +40,7 @@ setup(
     setup_requires=["pytest-runner"],
     test_suite="nose.collector",
     tests_requires=tests_require,
-    packages=find_packages(include=["mgi", "mgi.entity", "mgi.pipelines", "mgi.refs", "mgi.samples", "cw"], exclude=("tests")),
+    packages=find_packages(include=["mgi", "mgi.entity", "mgi.paths", "mgi.pipelines", "mgi.refs", "mgi.samples", "cw"], exclude=("tests")),
     include_package_data=True,
-    package_data={"cw": ["resources/*"]},
+    package_data={"cw": ["resources/*"], "mgi.pipelines": ["thresholds/*.yaml"], "mgi": ["migrations/*.py", "migrations/*.mako", "migrations/versions/*.py"]},
 )
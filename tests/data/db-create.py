@@ -8,6 +8,8 @@ else:
     fn = os.path.abspath(sys.argv[1])
 fn = os.path.abspath(fn)
 url = "sqlite:///" + os.path.abspath(fn)
+# Keep the test DB a single file
+os.environ["SQLITE_JOURNAL_MODE"] = "DELETE"
 if os.path.exists(fn):
     os.remove(fn)
 create_db(url)
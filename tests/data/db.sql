@@ -1,13 +1,9 @@
-/* id name kind */
-INSERT INTO 'entity' VALUES(1, 'H_G002', 'sample');
-INSERT INTO 'entity' VALUES(2, 'GRCh38', 'reference');
-/* entity_id group name value */
-INSERT INTO 'entity_feature' VALUES(1, 'qc', 'qc_pass', '1');
-INSERT INTO 'entity_feature' VALUES(2, 'qc', 'coverage', '30X');
-/* id entity_id group value checksum exists kind */
-INSERT INTO 'entity_path' VALUES(1, 1, 'analysis1', '/mnt/data/samples/HG002.merged.bam', 'checksum', 'merged bam', True);
-INSERT INTO 'entity_path' VALUES(2, 2, 'no alt', '/mnt/data/references/GRCh38.fasta', 'checksum', 'fasta', True);
-/* ESET id name kind */
-INSERT INTO 'eset' VALUES(1, 'hic', 'data group');
-/* ESET ENTITIES */
-INSERT INTO 'eset_entity' VALUES(1, 1);
+INSERT INTO 'entity' (id, name, kind) VALUES(1, 'H_G002', 'sample');
+INSERT INTO 'entity' (id, name, kind) VALUES(2, 'GRCh38', 'reference');
+INSERT INTO 'entity_feature' (entity_id, "group", name, value) VALUES(1, 'qc', 'qc_pass', '1');
+INSERT INTO 'entity_feature' (entity_id, "group", name, value) VALUES(2, 'qc', 'coverage', '30X');
+/* value_hash is the SHA1 of value */
+INSERT INTO 'entity_path' (id, entity_id, "group", value, value_hash, directory, size, checksum, kind, "exists") VALUES(1, 1, 'analysis1', '/mnt/data/samples/HG002.merged.bam', 'c9aed413e985e45c24317fd8babb3ebfebf9e011', '/mnt/data/samples', 1024, 'checksum', 'merged bam', True);
+INSERT INTO 'entity_path' (id, entity_id, "group", value, value_hash, directory, size, checksum, kind, "exists") VALUES(2, 2, 'no alt', '/mnt/data/references/GRCh38.fasta', '24d979df36f41dd04ca92e88bbde4b02bd6fdb5c', '/mnt/data/references', 2048, 'checksum', 'fasta', True);
+INSERT INTO 'eset' (id, name, kind) VALUES(1, 'hic', 'data group');
+INSERT INTO 'eset_entity' (eset_id, entity_id) VALUES(1, 1);
@@ -1,4 +1,35 @@
-import os, shutil, tempfile, unittest
+import os, re, shutil, subprocess, sys, tempfile, unittest
+
+# Runs the cli of a module with the args, for imported_modules
+HELP_STATEMENT = """from {module} import cli
+try:
+    cli({args})
+except SystemExit:
+    pass"""
+
+def imported_modules(statement):
+    # Names in sys.modules after running the statement in a fresh interpreter
+    code = statement + "\nimport sys\nsys.stderr.write('\\n'.join(['--modules--'] + list(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stderr
+    if "--modules--" not in output:
+        raise Exception(f"Failed to run: {statement}\n{output}")
+    return set(output.split("--modules--\n", 1)[1].splitlines())
+#-- imported_modules
+
+# Import time budget of the CLIs in milliseconds, lenient for loaded machines. Set MGI_TEST_STARTUP_MS=150 to check the target.
+STARTUP_MS = int(os.environ.get("MGI_TEST_STARTUP_MS", 500))
+
+def import_time(module):
+    # Cumulative import time of a module in milliseconds, from python -X importtime in a fresh interpreter
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stderr
+    for line in output.splitlines():
+        found = re.match(r"\Aimport time:\s+\d+ \|\s+(\d+) \| " + re.escape(module) + r"\Z", line)
+        if found:
+            return int(found.group(1)) / 1000
+    raise Exception(f"No import time for {module}:\n{output}")
+#-- import_time
 
 class TestBaseWithDb(unittest.TestCase):
     @classmethod
@@ -12,8 +43,18 @@ class TestBaseWithDb(unittest.TestCase):
         os.environ["SQLALCHEMY_DATABASE_URI"] = self.db_url
 
     def setUp(self):
+        self.remove_sessions()
         self.copy_db()
 
+    def tearDown(self):
+        self.remove_sessions()
+
+    def remove_sessions(self):
+        # Sessions and pooled connections must not carry over to the next copy of the DB
+        import mgi
+        mgi.db.session.remove()
+        mgi.db.dispose()
+
     def copy_db(self):
         shutil.copyfile(self.src_db_fn, self.db_fn)
 
@@ -0,0 +1,102 @@
+import os, shutil, socket, subprocess, tempfile, unittest
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+        self.db_url = "sqlite:///" + os.path.join(self.temp_d.name, "test.db")
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def test_chunked(self):
+        from mgi.bulk import chunked
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    def load_and_check(self, url):
+        from mgi.database import create_engine
+        from mgi.models import db
+        engine = create_engine(url)
+        db.metadata.create_all(engine)
+        try:
+            self.load_and_check_rows(engine)
+        finally:
+            engine.dispose()
+
+    def load_and_check_rows(self, engine):
+        from mgi.bulk import load_rows
+        from mgi.models import db, Entity, EntityPath, value_hash
+        with engine.begin() as con:
+            load_rows(con, Entity.__table__, [{"name": "HG002", "kind": "sample"}, {"name": "HG003", "kind": "sample"}], index_elements=["name", "kind"])
+            load_rows(con, Entity.__table__, [{"name": "HG002", "kind": "sample"}], index_elements=["name", "kind"])
+            self.assertEqual(con.execute(db.select(db.func.count()).select_from(Entity.__table__)).scalar(), 2)
+            values = [f"/data/HG002.{i}.bam" for i in range(1000)]
+            rows = [{"entity_id": 1, "group": "g", "value": v, "value_hash": value_hash(v), "kind": "bam", "exists": True} for v in values]
+            self.assertEqual(load_rows(con, EntityPath.__table__, rows, index_elements=["value_hash"]), 1000)
+            # Updates only the given columns
+            load_rows(con, EntityPath.__table__, [{"entity_id": 1, "value": values[0], "value_hash": value_hash(values[0]), "kind": "cram"}], index_elements=["value_hash"])
+            got = con.execute(db.select(EntityPath.kind, EntityPath.group, EntityPath.exists).where(EntityPath.value == "/data/HG002.0.bam")).one()
+            self.assertEqual(tuple(got), ("cram", "g", True))
+            self.assertEqual(con.execute(db.select(db.func.count()).select_from(EntityPath.__table__)).scalar(), 1000)
+
+    def test_load_rows_sqlite(self):
+        self.load_and_check(self.db_url)
+
+    def test_can_copy(self):
+        from types import SimpleNamespace
+        from mgi.bulk import can_copy
+        class Cursor():
+            def copy_expert(self, sql, f):
+                pass
+        def con_for(name, dbapi):
+            # No connection, so opening a cursor fails
+            return SimpleNamespace(dialect=SimpleNamespace(name=name, dbapi=dbapi))
+        self.assertTrue(can_copy(con_for("postgresql", SimpleNamespace(extensions=SimpleNamespace(cursor=Cursor)))))
+        self.assertFalse(can_copy(con_for("postgresql", SimpleNamespace())))
+        self.assertFalse(can_copy(con_for("sqlite", SimpleNamespace(extensions=SimpleNamespace(cursor=Cursor)))))
+
+    def test_load_rows_postgres(self):
+        # Runs on the server at MGI_TEST_POSTGRES_URL, or on a new one if Postgres is installed
+        try:
+            import psycopg2
+        except ImportError:
+            self.skipTest("psycopg2 is not installed")
+        if os.environ.get("MGI_TEST_POSTGRES_URL"):
+            return self.load_and_check_postgres(os.environ["MGI_TEST_POSTGRES_URL"])
+        if not shutil.which("initdb") or not shutil.which("pg_ctl"):
+            self.skipTest("Postgres is not installed, and MGI_TEST_POSTGRES_URL is not set")
+        data_dn = os.path.join(self.temp_d.name, "pg")
+        subprocess.check_call(["initdb", "-D", data_dn, "-A", "trust", "-U", "mgi"], stdout=subprocess.DEVNULL)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        subprocess.check_call(["pg_ctl", "-D", data_dn, "-o", f"-p {port} -k {self.temp_d.name} -h 127.0.0.1", "-w", "start"], stdout=subprocess.DEVNULL)
+        try:
+            self.load_and_check_postgres(f"postgresql://mgi@127.0.0.1:{port}/postgres")
+        finally:
+            subprocess.check_call(["pg_ctl", "-D", data_dn, "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+
+    def load_and_check_postgres(self, server_url):
+        # In a new database on the server, dropped afterwards
+        from sqlalchemy.engine import make_url
+        from mgi.bulk import can_copy
+        from mgi.database import create_engine
+        name = f"mgi_test_bulk_{os.getpid()}"
+        server = create_engine(server_url, isolation_level="AUTOCOMMIT")
+        with server.connect() as con:
+            con.exec_driver_sql(f"CREATE DATABASE {name}")
+        try:
+            url = make_url(server_url).set(database=name)
+            engine = create_engine(url)
+            with engine.connect() as con:
+                self.assertTrue(can_copy(con))
+            engine.dispose()
+            self.load_and_check(url)
+        finally:
+            with server.connect() as con:
+                con.exec_driver_sql(f"DROP DATABASE IF EXISTS {name}")
+            server.dispose()
+#-- BulkTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
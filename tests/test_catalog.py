@@ -0,0 +1,127 @@
+import os, sys, unittest
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from tests.test_base_classes import TestBaseWithDb
+
+try:
+    import pyarrow
+    # Formats of the tests, parquet and arrow need pyarrow
+    FORMATS = ["tsv.gz", "parquet", "arrow"]
+except ImportError:
+    pyarrow = None
+    FORMATS = ["tsv.gz"]
+
+class CatalogTest(TestBaseWithDb):
+    def test_export_and_import(self):
+        from mgi.catalog import export_catalog, import_catalog
+        from mgi.database import create_engine
+        from mgi.models import db, Entity, EntityPath, EntitySet, value_hash
+        from mgi.utils import create_db
+        for fmt in FORMATS:
+            dn = os.path.join(self.temp_d.name, fmt)
+            counts = export_catalog(dn, fmt, chunk_size=1)
+            self.assertEqual(counts, {"entity": 2, "eset": 1, "entity_feature": 2, "entity_path": 2, "eset_entity": 1})
+            self.assertTrue(os.path.exists(os.path.join(dn, f"entity_path.{fmt}")))
+
+            # Restore into a new DB
+            db_url = "sqlite:///" + os.path.join(self.temp_d.name, f"{fmt}.db")
+            create_db(db_url)
+            os.environ["SQLALCHEMY_DATABASE_URI"] = db_url
+            try:
+                counts = import_catalog(dn)
+                self.assertEqual(counts, {"entity": 2, "eset": 1, "entity_feature": 2, "entity_path": 2, "eset_entity": 1})
+                self.assertEqual([e.name for e in Entity.query.order_by(Entity.id)], ["H_G002", "GRCh38"])
+                ep = EntityPath.query.get(1)
+                self.assertEqual((ep.value, ep.kind, ep.size, ep.exists, ep.checksum), ("/mnt/data/samples/HG002.merged.bam", "merged bam", 1024, True, "checksum"))
+                self.assertEqual(ep.value_hash, value_hash(ep.value))
+                self.assertEqual(ep.directory, "/mnt/data/samples")
+                self.assertEqual([e.name for e in EntitySet.query.get(1).entities], ["H_G002"])
+                self.assertEqual(len(Entity.query.get(1).features), 1)
+                # Again, nothing duplicated
+                counts = import_catalog(dn)
+                self.assertEqual(counts["eset_entity"], 0)
+                self.assertEqual(EntityPath.query.count(), 2)
+            finally:
+                db.session.remove()
+                os.environ["SQLALCHEMY_DATABASE_URI"] = self.db_url
+
+        if pyarrow is None:
+            return
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(os.path.join(self.temp_d.name, "parquet", "entity_path.parquet"))
+        self.assertEqual(str(schema.field("kind").type), "dictionary<values=string, indices=int32, ordered=0>")
+        self.assertEqual(str(schema.field("size").type), "int64")
+
+    def test_import_into_existing_db(self):
+        from mgi.catalog import export_catalog, import_catalog
+        from mgi.models import db, Entity, EntityFeature, EntityPath, EntitySet
+        from mgi.utils import create_db
+        EntityFeature.query.filter_by(name="qc_pass").one().value = "\\N"
+        EntityFeature.query.filter_by(name="coverage").one().value = ""
+        EntityPath.query.get(2).checksum = None
+        db.session.commit()
+        for fmt in FORMATS[:2]:
+            dn = os.path.join(self.temp_d.name, fmt)
+            export_catalog(dn, fmt)
+
+            # Ids of the existing DB differ from the exported ones
+            db_url = "sqlite:///" + os.path.join(self.temp_d.name, f"existing_{fmt}.db")
+            create_db(db_url)
+            os.environ["SQLALCHEMY_DATABASE_URI"] = db_url
+            try:
+                db.session.add_all([Entity(id=1, name="HG003", kind="sample"), Entity(id=5, name="GRCh38", kind="reference"), EntitySet(id=1, name="other", kind="data group")])
+                db.session.commit()
+                counts = import_catalog(dn)
+                self.assertEqual(counts, {"entity": 2, "eset": 1, "entity_feature": 2, "entity_path": 2, "eset_entity": 1})
+                self.assertEqual([(e.id, e.name) for e in Entity.query.order_by(Entity.id)], [(1, "HG003"), (5, "GRCh38"), (6, "H_G002")])
+                hg002 = Entity.query.filter_by(name="H_G002").one()
+                self.assertEqual([(f.name, f.value) for f in hg002.features], [("qc_pass", "\\N")])
+                self.assertEqual([(f.name, f.value) for f in Entity.query.get(5).features], [("coverage", "")])
+                self.assertEqual([p.value for p in hg002.paths], ["/mnt/data/samples/HG002.merged.bam"])
+                self.assertEqual([p.checksum for p in Entity.query.get(5).paths], [None])
+                self.assertEqual([e.name for e in EntitySet.query.filter_by(name="hic").one().entities], ["H_G002"])
+                self.assertEqual(EntitySet.query.get(1).entities, [])
+                # Again, nothing duplicated
+                counts = import_catalog(dn)
+                self.assertEqual(counts["eset_entity"], 0)
+                self.assertEqual((Entity.query.count(), EntityFeature.query.count(), EntityPath.query.count()), (3, 2, 2))
+            finally:
+                db.session.remove()
+                os.environ["SQLALCHEMY_DATABASE_URI"] = self.db_url
+
+    def test_export_and_import_cmds(self):
+        from mgi.cli import cli
+        runner = CliRunner()
+        dn = os.path.join(self.temp_d.name, "export")
+
+        result = runner.invoke(cli, ["export", "--help"])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cli, ["export", dn, "--format", "tsv.gz"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertRegex(result.output, f"^Exported entity:2 eset:1 entity_feature:2 entity_path:2 eset_entity:1 to {dn} in ")
+
+        result = runner.invoke(cli, ["import", "--help"])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cli, ["import", dn], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertRegex(result.output, f"^Imported entity:2 eset:1 entity_feature:2 entity_path:2 eset_entity:0 from {dn} in ")
+
+        # Parquet files without pyarrow
+        with patch.dict(sys.modules, {"pyarrow": None}):
+            result = runner.invoke(cli, ["export", dn, "--format", "parquet"])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("The parquet format needs the pyarrow package, install it with: pip install mgi[arrow], or use tsv.gz", result.output)
+            with open(os.path.join(self.temp_d.name, "entity.parquet"), "w"):
+                pass
+            result = runner.invoke(cli, ["import", self.temp_d.name])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("The parquet format needs the pyarrow package", result.output)
+#-- CatalogTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
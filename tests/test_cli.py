@@ -2,6 +2,7 @@ import click, unittest
 from click.testing import CliRunner
 
 from mgi.cli import cli
+from tests.test_base_classes import HELP_STATEMENT, STARTUP_MS, import_time, imported_modules
 
 @click.command()
 def the_test_cmd():
@@ -36,6 +37,18 @@ class CliTest(unittest.TestCase):
             print(result.output)
             raise
         self.assertEqual(result.output, "Hello World!\n")
+
+    def test_startup_imports(self):
+        heavy_modules = ["flask", "matplotlib", "numpy", "requests", "sqlalchemy"]
+        modules = imported_modules(HELP_STATEMENT.format(module="mgi.cli", args=["--help"]))
+        for name in heavy_modules:
+            self.assertNotIn(name, modules)
+        self.assertLess(import_time("mgi.cli"), STARTUP_MS)
+
+        modules = imported_modules(HELP_STATEMENT.format(module="mgi.cli", args=["pl", "--help"]))
+        self.assertIn("mgi.pipelines.cli", modules)
+        for name in ["matplotlib", "numpy"]:
+            self.assertNotIn(name, modules)
 # -- CliTest
 
 if __name__ == '__main__':
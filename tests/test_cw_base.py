@@ -58,11 +58,11 @@ class BaseWithDb(unittest.TestCase):
 
 class BaseWithDbTest(BaseWithDb):
     def test1_setup(self):
-        from cw import flask_app
+        from cw import db
         self.assertTrue(bool(self.temp_d))
         self.assertTrue(bool(self.db_fn))
         self.assertTrue(os.path.exists(self.db_fn))
-        self.assertEqual(flask_app.config["SQLALCHEMY_DATABASE_URI"], self.db_uri)
+        self.assertEqual(db.uri(), self.db_uri)
 #-- BaseWithDbTest
 
 class CwTest(BaseWithDb):
@@ -84,6 +84,28 @@ class CwTest(BaseWithDb):
         c = Config.query.filter(Config.group == "general", Config.name == "foo").one_or_none()
         self.assertEqual(c.value, "baz")
 
+    def test_appcon_load_and_batch(self):
+        from cw import appcon, Config
+        appcon.load()
+        self.assertEqual(appcon.get(group="server", name="port"), "8888")
+        with appcon.batch():
+            appcon.set(group="batch", name="one", value="1")
+            appcon.set(group="batch", name="two", value="2")
+            self.assertEqual(appcon.get(group="batch", name="one"), "1")
+            self.assertEqual(Config.query.filter(Config.group == "batch").count(), 0)
+        self.assertEqual(Config.query.filter(Config.group == "batch").count(), 2)
+        appcon.load()
+        self.assertEqual(appcon.get(group="batch", name="two"), "2")
+
+        with self.assertRaisesRegex(Exception, "Oops"):
+            with appcon.batch():
+                appcon.set(group="batch", name="three", value="3")
+                raise Exception("Oops")
+        self.assertIsNone(appcon.get(group="batch", name="three"))
+        appcon.set(group="batch", name="four", value="4")
+        self.assertEqual(Config.query.filter(Config.group == "batch").count(), 3)
+        self.assertEqual(Config.query.filter(Config.group == "batch", Config.name == "three").count(), 0)
+
     def test_appcon_server_fns(self):
         from cw import appcon
         for n in ["conf", "run", "start"]:
@@ -2,6 +2,7 @@ import click, unittest
 from click.testing import CliRunner
 
 from cw.cli import cli
+from tests.test_base_classes import HELP_STATEMENT, STARTUP_MS, import_time, imported_modules
 
 class CwCliTest(unittest.TestCase):
     def test_cromulent_cli(self):
@@ -32,6 +33,13 @@ class CwCliTest(unittest.TestCase):
 
         result = runner.invoke(cli, ["setup", "--help"])
         self.assertEqual(result.exit_code, 0)
+
+    def test_startup_imports(self):
+        heavy_modules = ["flask", "jinja2", "requests", "sqlalchemy", "tabulate"]
+        modules = imported_modules(HELP_STATEMENT.format(module="cw.cli", args=["--help"]))
+        for name in heavy_modules:
+            self.assertNotIn(name, modules)
+        self.assertLess(import_time("cw.cli"), STARTUP_MS)
 #--
 
 if __name__ == '__main__':
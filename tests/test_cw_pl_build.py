@@ -0,0 +1,98 @@
+import os, time, unittest, zipfile
+from click.testing import CliRunner
+
+from tests.test_cw_base import BaseWithDb
+
+class CwPlBuildTest(BaseWithDb):
+    def _setUpClass(self):
+        import cw
+        self.wdl_dn = os.path.join(self.pipelines_dn, "hic")
+        os.makedirs(os.path.join(self.wdl_dn, "tasks"))
+        self.wdl = os.path.join(self.wdl_dn, "hic.wdl")
+        with open(self.wdl, "w") as f:
+            f.write('version 1.0\nimport "tasks/align.wdl" as align\n#import "tasks/blah.wdl" as blah\nimport "https://example.com/x.wdl"\nworkflow hic {}\n')
+        with open(os.path.join(self.wdl_dn, "tasks", "align.wdl"), "w") as f:
+            f.write('version 1.0\nimport "../common.wdl" as common\nimport "bwa.wdl"\n')
+        with open(os.path.join(self.wdl_dn, "tasks", "bwa.wdl"), "w") as f:
+            f.write('version 1.0\nimport "align.wdl"\n')
+        with open(os.path.join(self.wdl_dn, "common.wdl"), "w") as f:
+            f.write('version 1.0\n')
+        p = cw.Pipeline(name="__BUILD__", wdl=self.wdl)
+        cw.db.session.add(p)
+        cw.db.session.commit()
+        self.pipeline = p
+
+    def test1_resolve_imports(self):
+        from cw.pl_build import resolve_imports
+        imports = resolve_imports(self.wdl)
+        self.assertEqual(sorted(imports.keys()), ["common.wdl", os.path.join("tasks", "align.wdl"), os.path.join("tasks", "bwa.wdl")])
+        self.assertEqual(imports["common.wdl"], os.path.join(self.wdl_dn, "common.wdl"))
+
+        outside_wdl = os.path.join(self.wdl_dn, "tasks", "outside.wdl")
+        with open(outside_wdl, "w") as f:
+            f.write('version 1.0\nimport "../../other/x.wdl"\n')
+        os.makedirs(os.path.join(self.pipelines_dn, "other"), exist_ok=True)
+        with open(os.path.join(self.pipelines_dn, "other", "x.wdl"), "w") as f:
+            f.write('version 1.0\n')
+        with self.assertRaisesRegex(Exception, "is not under the main WDL directory"):
+            resolve_imports(outside_wdl)
+
+        missing_wdl = os.path.join(self.wdl_dn, "missing.wdl")
+        with open(missing_wdl, "w") as f:
+            f.write('version 1.0\nimport "nope.wdl"\n')
+        with self.assertRaisesRegex(Exception, "does not exist"):
+            resolve_imports(missing_wdl)
+
+    def test2_build_pipeline_imports(self):
+        from cw.pl_build import build_pipeline_imports, imports_cache_dn
+        zip_fn, built = build_pipeline_imports(self.pipeline)
+        self.assertTrue(built)
+        self.assertEqual(os.path.dirname(zip_fn), imports_cache_dn())
+        with zipfile.ZipFile(zip_fn) as z:
+            self.assertEqual(z.namelist(), ["common.wdl", "tasks/align.wdl", "tasks/bwa.wdl"])
+        with open(zip_fn, "rb") as f:
+            content = f.read()
+
+        # Cached
+        zip_fn2, built = build_pipeline_imports(self.pipeline)
+        self.assertFalse(built)
+        self.assertEqual(zip_fn2, zip_fn)
+
+        # Deterministic
+        os.remove(zip_fn)
+        time.sleep(0.01)
+        zip_fn2, built = build_pipeline_imports(self.pipeline)
+        self.assertTrue(built)
+        with open(zip_fn2, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+        # Rebuild on change
+        with open(os.path.join(self.wdl_dn, "common.wdl"), "a") as f:
+            f.write("# changed\n")
+        zip_fn3, built = build_pipeline_imports(self.pipeline)
+        self.assertTrue(built)
+        self.assertNotEqual(zip_fn3, zip_fn)
+
+    def test3_build_cmd(self):
+        from cw import Pipeline
+        from cw.pl_build import build_cmd as cmd, is_cached_imports
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cmd, ["__BLAH__"])
+        self.assertEqual(result.exit_code, 1)
+
+        result = runner.invoke(cmd, ["__BUILD__"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        p = Pipeline.query.filter(Pipeline.name == "__BUILD__").one()
+        self.assertTrue(is_cached_imports(p))
+        self.assertEqual(result.output, f"Using cached imports zip for pipeline __BUILD__ with 3 files: {p.imports}\n")
+#--
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
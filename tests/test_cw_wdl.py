@@ -0,0 +1,107 @@
+import os, tempfile, unittest
+
+class CwWdlTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+        self.wdl = """version 1.0
+
+struct RunEnv {
+  String docker
+  Int cpu
+}
+
+workflow rna {
+    meta {
+        author: "Eddie Belter"
+    }
+
+    input {
+        # bamroot: root name
+        String bamroot
+        Array[Array[File]] fastqs_R1
+        Array[Array[File]] fastqs_R2 = []
+        File align_index
+        Int align_cpu = 8
+        Int? bam_to_signals_cpu = 2
+        String? align_disks = "local-disk 100 HDD" # comment
+        Float? fraction
+        Boolean flag = false
+        Map[String, Int] sizes = {
+          "a": 1,
+          "b": 2,
+        }
+    }
+
+    RunEnv runenv = {
+      "docker": "docker",
+      "cpu": align_cpu,
+    }
+}
+"""
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def test_parse_type(self):
+        from cw.wdl import parse_type, type_to_str
+        for s in ("String", "Int?", "Array[File]+", "Array[Array[File]]", "Map[String, Int]", "Pair[Int, Array[String]]?"):
+            self.assertEqual(type_to_str(parse_type(s)), s)
+        t = parse_type("Array[File]+")
+        self.assertEqual(t["name"], "Array")
+        self.assertTrue(t["nonempty"])
+        self.assertFalse(t["optional"])
+        self.assertEqual(t["params"][0]["name"], "File")
+        with self.assertRaisesRegex(Exception, "Failed to parse WDL type"):
+            parse_type("Array[File")
+
+    def test_parse_wdl_inputs(self):
+        from cw.wdl import parse_wdl_inputs
+        signature = parse_wdl_inputs(self.wdl)
+        self.assertEqual(signature["workflow"], "rna")
+        self.assertEqual(list(signature["inputs"].keys()), ["bamroot", "fastqs_R1", "fastqs_R2", "align_index", "align_cpu", "bam_to_signals_cpu", "align_disks", "fraction", "flag", "sizes"])
+        required = sorted(filter(lambda n: signature["inputs"][n]["required"], signature["inputs"].keys()))
+        self.assertEqual(required, ["align_index", "bamroot", "fastqs_R1"])
+
+        with self.assertRaisesRegex(Exception, "No workflow found"):
+            parse_wdl_inputs("version 1.0\n")
+
+    def test_validate_inputs(self):
+        from cw.wdl import parse_wdl_inputs, validate_inputs
+        signature = parse_wdl_inputs(self.wdl)
+        fn = os.path.join(self.temp_d.name, "r1.fastq.gz")
+        with open(fn, "w") as f:
+            f.write("")
+
+        inputs = {
+                "rna.bamroot": "HG002",
+                "rna.fastqs_R1": [[fn]],
+                "rna.align_index": "gs://bucket/index.tgz",
+                "rna.align_cpu": 4,
+                "rna.fraction": 1,
+                "rna.bam_to_signals_cpu": None,
+                }
+        self.assertEqual(validate_inputs(signature, inputs), [])
+
+        inputs = {
+                "rna.fastqs_R1": [[fn, "/blah/r1.fastq.gz"]],
+                "rna.align_index": 1,
+                "rna.align_cpu": "4",
+                "rna.flag": "true",
+                "rna.sizes": {"a": 1.5},
+                "rna.extra": "blah",
+                "rna.align.ncpus": 4,
+                }
+        errors = validate_inputs(signature, inputs)
+        self.assertEqual(errors, [
+            "Missing required input <rna.bamroot> of type String",
+            "Input <rna.fastqs_R1[0][1]> File does not exist: /blah/r1.fastq.gz",
+            "Input <rna.align_index> expected File, got int: 1",
+            "Input <rna.align_cpu> expected Int, got str: 4",
+            "Input <rna.flag> expected Boolean, got str: true",
+            "Input <rna.sizes[a]> expected Int, got float: 1.5",
+            "Unknown input <rna.extra>",
+            ])
+#-- CwWdlTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -78,6 +78,19 @@ class CwWfTest(BaseWithDb):
         self.assertEqual(f"{out.read()}", "")
         co_p.assert_called_once()
         co_p.assert_called_with(["java", "-jar", "/apps/cromwell/cromwell.jar", "submit", pipeline.wdl, "-i", self.wf_inputs, "--host", server.url()])
+
+        # Cached imports are rebuilt for the command, the pipeline is not changed
+        from cw.pl_build import imports_cache_dn
+        imports = os.path.join(imports_cache_dn(), "align.old.zip")
+        pipeline.imports = imports
+        cw.db.session.commit()
+        with patch("cw.pl_build.build_pipeline_imports", return_value=["__ZIP__", True]):
+            submit_wf(pipeline, self.wf_inputs)
+        co_p.assert_called_with(["java", "-jar", "/apps/cromwell/cromwell.jar", "submit", pipeline.wdl, "-i", self.wf_inputs, "--host", server.url(), "--imports", "__ZIP__"])
+        self.assertEqual(pipeline.imports, imports)
+        self.assertNotIn(pipeline, cw.db.session.dirty)
+        pipeline.imports = None
+        cw.db.session.commit()
         sys.stdout = sys.__stdout__
 
     def test3_resolve_wf_id_from_submit_output(self):
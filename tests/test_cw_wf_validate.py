@@ -0,0 +1,76 @@
+import json, os, unittest
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from tests.test_cw_base import BaseWithDb
+
+class CwWfValidateTest(BaseWithDb):
+    def _setUpClass(self):
+        import cw
+        self.wdl = os.path.join(self.pipelines_dn, "validate.wdl")
+        with open(self.wdl, "w") as f:
+            f.write("version 1.0\nworkflow wf {\n  input {\n    String name\n    File fasta\n    Int cpu = 1\n  }\n}\n")
+        self.fasta = os.path.join(self.pipelines_dn, "ref.fasta")
+        with open(self.fasta, "w") as f:
+            f.write(">chr1\nACGT\n")
+        p = cw.Pipeline(name="__VALIDATE__", wdl=self.wdl)
+        cw.db.session.add(p)
+        cw.db.session.commit()
+        self.pipeline = p
+
+    def write_inputs(self, name, inputs):
+        fn = os.path.join(self.temp_d.name, name)
+        with open(fn, "w") as f:
+            json.dump(inputs, f)
+        return fn
+
+    def test_pipeline_signature(self):
+        from cw import appcon
+        from cw.wdl import pipeline_signature, _signatures
+        cache_dn = appcon.dn_for("cache")
+        signature = pipeline_signature(self.pipeline, cache_dn=cache_dn)
+        self.assertEqual(signature["workflow"], "wf")
+        self.assertEqual(sorted(signature["inputs"].keys()), ["cpu", "fasta", "name"])
+        self.assertTrue(os.path.exists(os.path.join(cache_dn, f"{self.pipeline.id}.signature.json")))
+
+        # Cached on disk, not re-parsed
+        _signatures.clear()
+        with patch("cw.wdl.parse_wdl_inputs") as parse_p:
+            self.assertEqual(pipeline_signature(self.pipeline, cache_dn=cache_dn), signature)
+            parse_p.assert_not_called()
+
+    def test_validate_cmd(self):
+        from cw.wf_validate import validate_cmd as cmd
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cmd, ["__VALIDATE__"])
+        self.assertEqual(result.exit_code, 2)
+        result = runner.invoke(cmd, ["__BLAH__", "inputs.json"])
+        self.assertEqual(result.exit_code, 1)
+
+        good = self.write_inputs("good.json", {"wf.name": "HG002", "wf.fasta": self.fasta})
+        result = runner.invoke(cmd, ["__VALIDATE__", good], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertEqual(result.output, f"[OK] {good}\n")
+
+        bad = self.write_inputs("bad.json", {"wf.fasta": "/blah/ref.fasta", "wf.cpu": "2"})
+        result = runner.invoke(cmd, ["__VALIDATE__", good, bad], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 1)
+        expected_output = f"""[OK] {good}
+[INVALID] {bad}
+  Missing required input <wf.name> of type String
+  Input <wf.fasta> File does not exist: /blah/ref.fasta
+  Input <wf.cpu> expected Int, got str: 2
+Found 1 of 2 inputs files with errors.
+"""
+        self.assertEqual(result.output, expected_output)
+#--
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
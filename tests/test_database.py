@@ -0,0 +1,114 @@
+import multiprocessing, os, tempfile, unittest
+
+def _write_things(db_uri, start, count):
+    from mgi.database import create_engine
+    engine = create_engine(db_uri)
+    for i in range(start, start + count):
+        with engine.begin() as con:
+            con.exec_driver_sql("UPDATE counter SET n = n + 1")
+            con.exec_driver_sql("INSERT INTO thing (id) VALUES (?)", (i,))
+    engine.dispose()
+
+class DatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+        self.db_uri = "sqlite:///" + os.path.join(self.temp_d.name, "test.db")
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def test_database(self):
+        from mgi.database import Database
+        db = Database(uri_env="__TEST_DB_URI__")
+        with self.assertRaisesRegex(Exception, "No DB URI given or found in __TEST_DB_URI__"):
+            db.engine
+
+        class Thing(db.Model):
+            __tablename__ = "thing"
+            id = db.Column(db.Integer, primary_key=True)
+            name = db.Column(db.String(length=32))
+
+        os.environ["__TEST_DB_URI__"] = self.db_uri
+        try:
+            self.assertEqual(db.uri(), self.db_uri)
+            db.create_all()
+            db.session.add(Thing(id=1, name="blah"))
+            db.session.commit()
+            self.assertEqual(Thing.query.get(1).name, "blah")
+            self.assertEqual(Thing.query.filter(Thing.name == "blah").count(), 1)
+
+            # Changing the URI gives new engine and session
+            other_uri = "sqlite:///" + os.path.join(self.temp_d.name, "other.db")
+            engine = db.engine
+            db.uri(other_uri)
+            self.assertEqual(db.uri(), other_uri)
+            self.assertNotEqual(db.engine, engine)
+            db.create_all()
+            self.assertEqual(Thing.query.count(), 0)
+        finally:
+            os.environ.pop("__TEST_DB_URI__")
+            db.session.remove()
+            db.dispose()
+
+    def test_sqlite_pragmas(self):
+        from mgi.database import create_engine, SQLITE_PRAGMAS
+        engine = create_engine(self.db_uri)
+        with engine.connect() as con:
+            self.assertEqual(con.exec_driver_sql("PRAGMA journal_mode").scalar(), "wal")
+            self.assertEqual(con.exec_driver_sql("PRAGMA synchronous").scalar(), 1) # NORMAL
+            self.assertEqual(con.exec_driver_sql("PRAGMA busy_timeout").scalar(), SQLITE_PRAGMAS["busy_timeout"])
+            self.assertEqual(con.exec_driver_sql("PRAGMA cache_size").scalar(), SQLITE_PRAGMAS["cache_size"])
+            self.assertEqual(con.exec_driver_sql("PRAGMA mmap_size").scalar(), SQLITE_PRAGMAS["mmap_size"])
+        engine.dispose()
+
+        # Network filesystem opt out
+        os.environ["SQLITE_JOURNAL_MODE"] = "delete"
+        try:
+            engine = create_engine(self.db_uri)
+            with engine.connect() as con:
+                self.assertEqual(con.exec_driver_sql("PRAGMA journal_mode").scalar(), "delete")
+                self.assertEqual(con.exec_driver_sql("PRAGMA synchronous").scalar(), 2) # FULL
+                self.assertEqual(con.exec_driver_sql("PRAGMA mmap_size").scalar(), 0)
+            engine.dispose()
+        finally:
+            os.environ.pop("SQLITE_JOURNAL_MODE")
+
+        # Back to WAL when not asked for
+        engine = create_engine(self.db_uri)
+        with engine.connect() as con:
+            self.assertEqual(con.exec_driver_sql("PRAGMA journal_mode").scalar(), "wal")
+        engine.dispose()
+
+        engine = create_engine(self.db_uri, sqlite_pragmas=None)
+        with engine.connect() as con:
+            self.assertEqual(con.exec_driver_sql("PRAGMA busy_timeout").scalar(), 5000) # pysqlite default
+        engine.dispose()
+
+    def test_sqlite_concurrent_writers(self):
+        from mgi.database import create_engine
+        engine = create_engine(self.db_uri)
+        with engine.begin() as con:
+            con.exec_driver_sql("CREATE TABLE thing (id INTEGER PRIMARY KEY)")
+            con.exec_driver_sql("CREATE TABLE counter (n INTEGER)")
+            con.exec_driver_sql("INSERT INTO counter VALUES (0)")
+        procs = [multiprocessing.Process(target=_write_things, args=(self.db_uri, i * 50, 50)) for i in range(8)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        self.assertEqual([p.exitcode for p in procs], [0] * 8)
+        with engine.connect() as con:
+            self.assertEqual(con.exec_driver_sql("SELECT n FROM counter").scalar(), 400)
+            self.assertEqual(con.exec_driver_sql("SELECT COUNT(*) FROM thing").scalar(), 400)
+        engine.dispose()
+
+    def test_no_flask(self):
+        from tests.test_base_classes import imported_modules
+        for statement in ("import mgi.models", "import cw.models"):
+            modules = imported_modules(statement)
+            self.assertNotIn("flask", modules)
+            self.assertNotIn("flask_sqlalchemy", modules)
+#-- DatabaseTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
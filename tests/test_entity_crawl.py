@@ -0,0 +1,83 @@
+import os, unittest
+from click.testing import CliRunner
+
+from tests.test_base_classes import TestBaseWithDb
+
+class EntityCrawlTest(TestBaseWithDb):
+    def make_tree(self):
+        root = os.path.join(self.temp_d.name, self._testMethodName)
+        for dn, fns in (("HG002", ["HG002.bam", "HG002.bam.bai"]), ("HG003/qc", ["HG003.txt"]), ("empty", [])):
+            os.makedirs(os.path.join(root, dn), exist_ok=True)
+            for fn in fns:
+                with open(os.path.join(root, dn, fn), "w") as f:
+                    f.write(fn)
+        os.symlink(os.path.join(root, "HG002"), os.path.join(root, "link"))
+        return root
+
+    def test_crawl_cmd(self):
+        from mgi.models import Entity, EntityPath
+        from mgi.samples.cli import samples_paths_crawl_cmd as cmd
+        root = self.make_tree()
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cmd, [os.path.join(root, "blah")])
+        self.assertEqual(result.exit_code, 2)
+
+        result = runner.invoke(cmd, [root, "group=crawl", "--batch-size", "2"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertRegex(result.output, r"^Crawled 3 files in 5 directories in [\d\.]+s \(\d+ files/sec\)\. Added 3 and updated 0 paths\.\n$")
+        eps = EntityPath.query.filter(EntityPath.group == "crawl").order_by(EntityPath.value).all()
+        self.assertEqual([(ep.entity.name, ep.entity.kind, ep.kind, ep.size, ep.exists) for ep in eps], [
+            ("HG002", "sample", "bam", 9, True),
+            ("HG002", "sample", "bam", 13, True),
+            ("HG003", "sample", "", 9, True),
+            ])
+        self.assertEqual(eps[0].mtime, int(os.stat(eps[0].value).st_mtime))
+        self.assertEqual(eps[0].directory, os.path.join(root, "HG002"))
+
+        result = runner.invoke(cmd, [root], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertRegex(result.output, r"Added 0 and updated 3 paths\.\n$")
+        self.assertEqual(Entity.query.filter(Entity.kind == "sample", Entity.name.in_(["HG002", "HG003"])).count(), 2)
+
+    def test_crawl_keeps_checksums(self):
+        from mgi.entity.crawl import crawl_entities_paths
+        from mgi.models import db, EntityPath
+        root = self.make_tree()
+        crawl_entities_paths(root, entity_kind="sample")
+        ep = EntityPath.query.filter(EntityPath.value == os.path.join(root, "HG002", "HG002.bam")).one()
+        ep.checksum = "abc"
+        db.session.commit()
+        stats = crawl_entities_paths(root, entity_kind="sample")
+        self.assertEqual((stats["added"], stats["updated"]), (0, 3))
+        db.session.expire_all()
+        self.assertEqual(ep.checksum, "abc")
+
+    def test_crawl_relative_root(self):
+        from mgi.models import EntityPath
+        from mgi.samples.cli import samples_paths_crawl_cmd as cmd
+        root = self.make_tree()
+        runner = CliRunner()
+        cwd = os.getcwd()
+        os.chdir(os.path.dirname(root))
+        try:
+            result = runner.invoke(cmd, [os.path.basename(root), "group=crawl"], catch_exceptions=False)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(result.exit_code, 0)
+        eps = EntityPath.query.filter(EntityPath.group == "crawl").order_by(EntityPath.value).all()
+        self.assertEqual([(ep.value, ep.directory) for ep in eps], [
+            (os.path.join(root, "HG002", "HG002.bam"), os.path.join(root, "HG002")),
+            (os.path.join(root, "HG002", "HG002.bam.bai"), os.path.join(root, "HG002")),
+            (os.path.join(root, "HG003", "qc", "HG003.txt"), os.path.join(root, "HG003", "qc")),
+            ])
+#-- EntityCrawlTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -42,10 +42,42 @@ class EntityPathTest(TestBaseWithDb):
             f.write("\t".join([value])+"\n")
 
         rdr = rdr_factory(fn)
-        update_entities_paths(rdr, {"group": "prod"}, entity_kind="ref")
+        self.assertEqual(update_entities_paths(rdr, {"group": "prod"}, entity_kind="ref"), (1, 0))
         e = get_entity(name="sample_111", kind="ref")
         self.assertTrue(e)
         ep = get_entity_path({"entity_id": e.id, "value": value})
+        self.assertEqual(ep.group, "prod")
+        self.assertEqual(ep.kind, "bam")
+
+        rdr = rdr_factory(fn)
+        self.assertEqual(update_entities_paths(rdr, {"group": "dev", "exists": True}, entity_kind="ref"), (0, 1))
+        ep = get_entity_path({"entity_id": e.id, "value": value})
+        self.assertEqual(ep.group, "dev")
+        self.assertTrue(ep.exists)
+
+    def test_ep_update_from_inventory(self):
+        from mgi.entity.path import update_entities_paths, get_entity, get_entity_path
+        from mgi.entity.helpers import paths_rdr_factory as rdr_factory
+        from mgi.models import db
+        dn = os.path.join(self.temp_d.name, "cohort")
+        os.makedirs(os.path.join(dn, "sample_222"))
+        for i in range(5):
+            with open(os.path.join(dn, "sample_222", f"sample_222.{i}.bam"), "w") as f:
+                f.write("bam")
+
+        self.assertEqual(update_entities_paths(rdr_factory(dn), {"group": "cohort"}, entity_kind="sample", batch_size=2), (5, 0))
+        e = get_entity(name="sample_222", kind="sample")
+        ep = get_entity_path({"entity_id": e.id, "value": os.path.join(dn, "sample_222", "sample_222.0.bam")})
+        self.assertEqual(ep.size, 3)
+        self.assertEqual(ep.group, "cohort")
+        self.assertTrue(ep.exists)
+
+        # Local files have no checksums, so a stored one is kept
+        ep.checksum = "abc"
+        db.session.commit()
+        self.assertEqual(update_entities_paths(rdr_factory(dn), {}, entity_kind="sample"), (0, 5))
+        db.session.expire_all()
+        self.assertEqual(ep.checksum, "abc")
 
 # -- EntityPathTest
 
@@ -0,0 +1,147 @@
+import hashlib, os, tempfile, threading, unittest
+
+from mgi.inventory import ObjectStoreInventory
+
+class MemoryInventory(ObjectStoreInventory):
+    # Object store backend listing from a dict of names to sizes
+    scheme = "mem"
+    def __init__(self, uri, objects, **kwargs):
+        super().__init__(uri, **kwargs)
+        self.objects = objects
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def list_page(self, prefix, page_token, delimiter="/"):
+        with self.calls_lock:
+            self.calls.append((prefix, page_token))
+        names, prefixes = [], set()
+        for name in sorted(self.objects.keys()):
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix):]
+            if delimiter and delimiter in rest:
+                prefixes.add(prefix + rest.split("/")[0] + "/")
+            else:
+                names.append(name)
+        start = int(page_token or 0)
+        page = names[start:start + self.page_size]
+        next_token = str(start + self.page_size) if start + self.page_size < len(names) else None
+        records = [{"value": self.object_uri(n), "size": self.objects[n], "exists": True} for n in page]
+        return records, sorted(prefixes) if page_token is None else [], next_token
+#-- MemoryInventory
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def make_tree(self):
+        root = os.path.join(self.temp_d.name, "tree")
+        for dn, fns in (("HG002", ["HG002.bam", "HG002.bam.bai"]), ("HG003/qc", ["HG003.txt"]), ("empty", [])):
+            os.makedirs(os.path.join(root, dn), exist_ok=True)
+            for fn in fns:
+                with open(os.path.join(root, dn, fn), "w") as f:
+                    f.write(fn)
+        os.symlink(os.path.join(root, "HG002"), os.path.join(root, "link"))
+        return root
+
+    def test_local_inventory(self):
+        from mgi.inventory import LocalInventory
+        root = self.make_tree()
+        inventory = LocalInventory("file://" + root, threads=4, files_per_put=1)
+        records = sorted(inventory, key=lambda r: r["value"])
+        self.assertEqual([os.path.relpath(r["value"], root) for r in records], ["HG002/HG002.bam", "HG002/HG002.bam.bai", "HG003/qc/HG003.txt"])
+        self.assertEqual(records[0]["size"], 9)
+        self.assertEqual(records[0]["mtime"], int(os.stat(records[0]["value"]).st_mtime))
+        self.assertEqual(records[0]["exists"], True)
+        self.assertEqual(inventory.scanned, 5)
+        self.assertEqual(inventory.errors, [])
+
+        # Stops early
+        inventory = LocalInventory(root, threads=2, queue_size=1, files_per_put=1)
+        for r in inventory:
+            break
+
+        # Sorted, with directories as their name and a slash
+        for fn in ("HG002.txt", "HG002-old.bam", "HG0020.bam"):
+            with open(os.path.join(root, fn), "w") as f:
+                f.write(fn)
+        values = [r["value"] for r in LocalInventory(root + "/").sorted_records()]
+        self.assertEqual([os.path.relpath(v, root) for v in values], ["HG002-old.bam", "HG002.txt", "HG002/HG002.bam", "HG002/HG002.bam.bai", "HG0020.bam", "HG003/qc/HG003.txt"])
+        self.assertEqual(values, sorted(values))
+
+        inventory = LocalInventory(os.path.join(root, "blah"))
+        self.assertEqual(list(inventory), [])
+        self.assertEqual(len(inventory.errors), 1)
+
+        # Relative roots give absolute values
+        cwd = os.getcwd()
+        os.chdir(self.temp_d.name)
+        try:
+            inventory = LocalInventory("tree/HG002")
+            self.assertEqual(inventory.uri, os.path.join(root, "HG002"))
+            self.assertEqual(sorted(r["value"] for r in inventory), [os.path.join(root, "HG002", fn) for fn in ("HG002.bam", "HG002.bam.bai")])
+            self.assertEqual([r["value"] for r in LocalInventory("file://tree/HG003").sorted_records()], [os.path.join(root, "HG003", "qc", "HG003.txt")])
+        finally:
+            os.chdir(cwd)
+
+    def test_object_store_inventory(self):
+        objects = {f"cohort/S{i}/S{i}.{j}.bam": i * 10 + j for i in range(20) for j in range(7)}
+        objects["cohort/README"] = 1
+        objects["other/x.bam"] = 1
+        inventory = MemoryInventory("mem://bucket/cohort", objects, threads=4, page_size=3)
+        self.assertEqual(inventory.bucket, "bucket")
+        self.assertEqual(inventory.prefix, "cohort/")
+        records = sorted(inventory, key=lambda r: r["value"])
+        self.assertEqual(len(records), 141)
+        self.assertEqual(records[0], {"value": "mem://bucket/cohort/README", "size": 1, "exists": True})
+        # Each prefix is listed, with 3 pages of 3
+        self.assertEqual(len(inventory.calls), 1 + 20 * 3)
+        self.assertEqual(inventory.errors, [])
+
+        sorted_records = list(MemoryInventory("mem://bucket/cohort", objects, page_size=3).sorted_records())
+        self.assertEqual(sorted_records, records)
+
+        with self.assertRaisesRegex(Exception, "Invalid mem URI"):
+            MemoryInventory("gs://bucket", objects)
+
+    def test_inventory_for_uri(self):
+        from mgi.inventory import inventory_for_uri, is_inventory_uri, LocalInventory
+        self.assertTrue(is_inventory_uri("gs://bucket/cohort"))
+        self.assertTrue(is_inventory_uri("s3://bucket"))
+        self.assertTrue(is_inventory_uri(self.temp_d.name))
+        self.assertFalse(is_inventory_uri("ftp://host/blah"))
+        self.assertFalse(is_inventory_uri(os.path.join(self.temp_d.name, "paths.tsv")))
+        self.assertTrue(isinstance(inventory_for_uri(self.temp_d.name), LocalInventory))
+        with self.assertRaisesRegex(Exception, "No inventory for ftp:// URIs"):
+            inventory_for_uri("ftp://host/blah")
+
+    @unittest.skipUnless(os.environ.get("AWS_ENDPOINT_URL") and os.environ.get("MGI_TEST_S3_BUCKET"), "No S3 emulator given in AWS_ENDPOINT_URL and MGI_TEST_S3_BUCKET")
+    def test_s3_inventory(self):
+        import boto3
+        from mgi.inventory import S3Inventory
+        bucket = os.environ["MGI_TEST_S3_BUCKET"]
+        client = boto3.client("s3", endpoint_url=os.environ["AWS_ENDPOINT_URL"])
+        for i in range(5):
+            client.put_object(Bucket=bucket, Key=f"mgi-test/S{i}/S{i}.bam", Body=b"bam")
+        records = list(S3Inventory(f"s3://{bucket}/mgi-test", page_size=2))
+        self.assertEqual(sorted(r["value"] for r in records), [f"s3://{bucket}/mgi-test/S{i}/S{i}.bam" for i in range(5)])
+        self.assertEqual(records[0]["checksum"], hashlib.md5(b"bam").hexdigest())
+
+    @unittest.skipUnless(os.environ.get("STORAGE_EMULATOR_HOST") and os.environ.get("MGI_TEST_GCS_BUCKET"), "No GCS emulator given in STORAGE_EMULATOR_HOST and MGI_TEST_GCS_BUCKET")
+    def test_gcs_inventory(self):
+        from google.cloud import storage
+        from mgi.inventory import GcsInventory
+        bucket = os.environ["MGI_TEST_GCS_BUCKET"]
+        client = storage.Client()
+        for i in range(5):
+            client.bucket(bucket).blob(f"mgi-test/S{i}/S{i}.bam").upload_from_string(b"bam")
+        records = list(GcsInventory(f"gs://{bucket}/mgi-test", page_size=2))
+        self.assertEqual(sorted(r["value"] for r in records), [f"gs://{bucket}/mgi-test/S{i}/S{i}.bam" for i in range(5)])
+        self.assertEqual(records[0]["checksum"], hashlib.md5(b"bam").hexdigest())
+#-- InventoryTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -19,7 +19,7 @@ class ModelsTest(TestBaseWithDb):
 
     def test2_entity_features(self):
         from mgi.models import EntityFeature
-        features = EntityFeature.query.filter_by(group="qc").all()
+        features = EntityFeature.query.filter_by(group="qc").order_by(EntityFeature.entity_id).all()
         self.assertTrue(features)
         self.assertEqual(len(features), 2)
         self.assertTrue(features[0].group)
@@ -39,6 +39,25 @@ class ModelsTest(TestBaseWithDb):
         self.assertEqual(fps[0].exists, True)
         self.assertEqual(fps[0].kind, "merged bam")
 
+    def test3_sample_path_value_hash(self):
+        from mgi.models import db, EntityPath, value_hash
+        self.assertEqual(value_hash("/mnt/data/samples/HG002.merged.bam"), "c9aed413e985e45c24317fd8babb3ebfebf9e011")
+        ep = EntityPath.query.filter_by(value_hash=value_hash("/mnt/data/samples/HG002.merged.bam")).one()
+        self.assertEqual(ep.id, 1)
+
+        long_value = "/mnt/data/" + "x" * 2000 + ".bam"
+        ep.value = long_value
+        self.assertEqual(ep.value_hash, value_hash(long_value))
+        db.session.add(EntityPath(entity_id=1, value="/mnt/data/samples/HG002.cram", kind="cram"))
+        try:
+            # Flushed, not committed, so the DB is left as it was
+            db.session.flush()
+            self.assertEqual(EntityPath.query.filter_by(value_hash=value_hash(long_value)).one().value, long_value)
+            self.assertEqual(EntityPath.query.filter_by(value_hash=value_hash("/mnt/data/samples/HG002.cram")).count(), 1)
+        finally:
+            db.session.rollback()
+        self.assertEqual(EntityPath.query.filter_by(value_hash=value_hash("/mnt/data/samples/HG002.cram")).count(), 0)
+
     def test4_eset(self):
         from mgi.models import EntitySet
         eset = EntitySet.query.get((1))
@@ -0,0 +1,99 @@
+import os, unittest
+from click.testing import CliRunner
+
+from tests.test_base_classes import TestBaseWithDb
+
+class PathsCliTest(TestBaseWithDb):
+    def add_paths(self):
+        from mgi.models import db, EntityPath
+        for value, size, exists in (
+                ("/mnt/data/samples/HG002/HG002.cram", 100, True),
+                ("/mnt/data/samples/HG002/HG002.cram.crai", 10, False),
+                ("/mnt/data/samples/HG003/qc/HG003.txt", None, None),
+                ("/mnt/data/samples0/HG004.bam", 1000, True),
+                ("/mnt/data/samples-old/HG005.bam", 1, True),
+                ):
+            db.session.add(EntityPath(entity_id=1, value=value, size=size, exists=exists, kind=os.path.splitext(value)[1][1:]))
+        db.session.commit()
+
+    def test_under_directory(self):
+        from mgi.models import EntityPath, path_directory
+        from mgi.paths.cli import normalize_directory, rollup_directory
+        self.assertEqual(path_directory("/mnt/data//samples/HG002.bam"), "/mnt/data/samples")
+        self.assertEqual(path_directory("/mnt/data/samples/"), "/mnt/data")
+        self.assertEqual(path_directory("gs://bucket/samples/HG002.bam"), "gs://bucket/samples")
+        self.assertEqual(normalize_directory("/mnt/data/"), "/mnt/data")
+        self.assertEqual(normalize_directory("/"), "")
+        self.assertEqual(rollup_directory("/mnt", "/mnt/data/samples", 1), "/mnt/data")
+        self.assertEqual(rollup_directory("/mnt", "/mnt/data/samples", 2), "/mnt/data/samples")
+        self.assertEqual(rollup_directory("/mnt", "/mnt", 2), "/mnt")
+        self.assertEqual(rollup_directory("", "/mnt/data", 1), "/mnt")
+        ep = EntityPath.query.get(1)
+        self.assertEqual(ep.directory, "/mnt/data/samples")
+
+    def test_paths_cli(self):
+        from mgi.cli import cli
+        runner = CliRunner()
+        for args in (["paths", "-h"], ["paths", "find", "--help"], ["paths", "du", "--help"]):
+            result = runner.invoke(cli, args)
+            self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cli, ["paths", "du"])
+        self.assertEqual(result.exit_code, 2)
+
+    def test_find_cmd(self):
+        from mgi.paths.cli import find_cmd as cmd
+        self.add_paths()
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["--under", "/mnt/data/samples/"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        expected_output = """entity	kind	size	exists	value
+H_G002	merged bam	1024	1	/mnt/data/samples/HG002.merged.bam
+H_G002	cram	100	1	/mnt/data/samples/HG002/HG002.cram
+H_G002	crai	10	0	/mnt/data/samples/HG002/HG002.cram.crai
+H_G002	txt		0	/mnt/data/samples/HG003/qc/HG003.txt
+"""
+        self.assertEqual(result.output, expected_output)
+
+        result = runner.invoke(cmd, ["--under", "/mnt/data/samples", "--missing"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual([l.split("\t")[-1] for l in result.output.splitlines()[1:]], ["/mnt/data/samples/HG002/HG002.cram.crai", "/mnt/data/samples/HG003/qc/HG003.txt"])
+
+        result = runner.invoke(cmd, ["--kind", "fasta"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output.splitlines()[1:], ["GRCh38\tfasta\t2048\t1\t/mnt/data/references/GRCh38.fasta"])
+
+    def test_du_cmd(self):
+        from mgi.paths.cli import du_cmd as cmd
+        self.add_paths()
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["/mnt/data/samples"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        expected_output = """110	2	/mnt/data/samples/HG002
+0	1	/mnt/data/samples/HG003
+1134	4	/mnt/data/samples
+"""
+        self.assertEqual(result.output, expected_output)
+
+        result = runner.invoke(cmd, ["/", "--depth", "3"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        expected_output = """2048	1	/mnt/data/references
+1134	4	/mnt/data/samples
+1	1	/mnt/data/samples-old
+1000	1	/mnt/data/samples0
+4183	7	/
+"""
+        self.assertEqual(result.output, expected_output)
+#-- PathsCliTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+import os, unittest
+from click.testing import CliRunner
+
+from tests.test_base_classes import TestBaseWithDb
+
+class PathsReconcileTest(TestBaseWithDb):
+    def test_diff_sorted(self):
+        from mgi.paths.reconcile import diff_sorted
+        db_records = [
+                {"value": "/a/1", "size": 1, "checksum": None, "exists": True},
+                {"value": "/a/2", "size": 2, "checksum": "x", "exists": True},
+                {"value": "/a/3", "size": 3, "checksum": None, "exists": False},
+                {"value": "/a/4", "size": 4, "checksum": None, "exists": False},
+                {"value": "/a/5", "size": None, "checksum": None, "exists": True},
+                ]
+        storage_records = [
+                {"value": "/a/0", "size": 0},
+                {"value": "/a/2", "size": 2, "checksum": "y"},
+                {"value": "/a/3", "size": 3},
+                {"value": "/a/5", "size": 5},
+                {"value": "/a/6", "size": 6},
+                ]
+        got = [(status, (d or s)["value"], changes) for status, d, s, changes in diff_sorted(db_records, storage_records)]
+        self.assertEqual(got, [
+            ("added", "/a/0", []),
+            ("removed", "/a/1", []),
+            ("changed", "/a/2", ["checksum"]),
+            ("changed", "/a/3", ["exists"]),
+            ("same", "/a/4", []),
+            ("same", "/a/5", []),
+            ("added", "/a/6", []),
+            ])
+
+        with self.assertRaisesRegex(Exception, "The storage paths are not sorted, found /a/1 after /a/2"):
+            list(diff_sorted([], [{"value": "/a/2"}, {"value": "/a/1"}]))
+
+    def test_reconcile_cmd(self):
+        from mgi.entity.path import update_entities_paths
+        from mgi.models import db, EntityPath, value_hash
+        from mgi.paths.cli import reconcile_cmd as cmd
+        root = os.path.join(self.temp_d.name, self._testMethodName)
+        os.makedirs(os.path.join(root, "HG002"))
+        os.makedirs(os.path.join(root, "HG003"))
+        for fn in ("HG002/HG002.bam", "HG002/HG002.cram", "HG003/HG003.bam"):
+            with open(os.path.join(root, fn), "w") as f:
+                f.write(fn)
+        update_entities_paths([
+            {"value": os.path.join(root, "HG002/HG002.bam"), "size": "15", "exists": "1"},
+            {"value": os.path.join(root, "HG002/HG002.cram"), "size": "1", "exists": "1"},
+            {"value": os.path.join(root, "HG002/HG002.crai"), "size": "1", "exists": "1"},
+            ], {}, entity_kind="sample")
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+
+        result = runner.invoke(cmd, [root], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        expected_output = f"""removed	{root}/HG002/HG002.crai	
+changed	{root}/HG002/HG002.cram	size
+added	{root}/HG003/HG003.bam	
+Found 1 added, 1 removed and 1 changed paths.
+"""
+        self.assertEqual(result.output, expected_output)
+
+        result = runner.invoke(cmd, [root, "--apply", "group=reconciled"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertRegex(result.output, "Applied 1 added, 1 removed and 1 changed paths.\n$")
+        get = lambda fn: EntityPath.query.filter_by(value_hash=value_hash(os.path.join(root, fn))).one()
+        db.session.expire_all()
+        self.assertEqual(get("HG002/HG002.crai").exists, False)
+        self.assertEqual(get("HG002/HG002.cram").size, 16)
+        self.assertEqual(get("HG003/HG003.bam").group, "reconciled")
+        self.assertEqual(get("HG003/HG003.bam").entity.name, "HG003")
+
+        result = runner.invoke(cmd, [root], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, "Found 0 added, 0 removed and 0 changed paths.\n")
+
+        # Relative roots are compared as absolute paths
+        cwd = os.getcwd()
+        os.chdir(os.path.dirname(root))
+        try:
+            result = runner.invoke(cmd, [os.path.basename(root)], catch_exceptions=False)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, "Found 0 added, 0 removed and 0 changed paths.\n")
+
+    def test_reconcile_paths_in_batches(self):
+        # Commits of each batch while the DB paths are read, with the default WAL journal
+        from mgi.entity.path import update_entities_paths
+        from mgi.inventory import inventory_for_uri
+        from mgi.models import db, EntityPath
+        from mgi.paths.reconcile import reconcile_paths, ReconcileApplier
+        root = os.path.join(self.temp_d.name, self._testMethodName)
+        os.makedirs(root)
+        # More paths than are fetched at once, so the read is still open at the first commit
+        update_entities_paths([{"value": os.path.join(root, f"HG{i:04d}.bam"), "exists": "1"} for i in range(1500)], {}, entity_kind="sample")
+        got = list(reconcile_paths(root, inventory_for_uri(root), applier=ReconcileApplier(entity_kind="sample", batch_size=500)))
+        self.assertEqual([status for status, value, changes in got], ["removed"] * 1500)
+        db.session.expire_all()
+        self.assertEqual(EntityPath.query.filter(EntityPath.exists == False).count(), 1500)
+
+        # The rollback journal does not allow it
+        self.remove_sessions()
+        os.environ["SQLITE_JOURNAL_MODE"] = "DELETE"
+        try:
+            with self.assertRaisesRegex(Exception, "needs the WAL journal mode"):
+                list(reconcile_paths(root, inventory_for_uri(root), applier=ReconcileApplier(entity_kind="sample")))
+            self.assertEqual(len(list(reconcile_paths(root, inventory_for_uri(root)))), 0)
+        finally:
+            os.environ.pop("SQLITE_JOURNAL_MODE")
+            self.remove_sessions()
+#-- PathsReconcileTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,193 @@
+import json, os, tempfile, unittest
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from tests.test_base_classes import TestBaseWithDb
+
+def write_stats(root, name, aligned):
+    # Stats as written by the pipeline, with the keys load_stats uses
+    stats = {"sequenced_read_pairs": 1000, "total_unique": 800, "no_chimera_found": 50, "2_alignments_a1_a2b_a1b2_b1a2": 200, "pct_3_or_more_alignments": 5, "pct_2_alignments": aligned}
+    for r in ["less_than_500bp", "500bp_to_5kb", "5kb_to_20kb"]:
+        stats[f"pct_sequenced_short_range_{r}"] = 10
+        stats[f"pct_unique_short_range_{r}"] = 12.5
+    for n in ["total_unique", "total_duplicates", "hic_contacts", "inter_chromosomal", "intra_chromosomal", "long_range_greater_than_20kb"]:
+        stats[f"pct_sequenced_{n}"] = 40
+        stats[f"pct_unique_{n}"] = 45
+    dn = os.path.join(root, name)
+    os.makedirs(dn)
+    with open(os.path.join(dn, "stats_1.json"), "w") as f:
+        json.dump(stats, f)
+    return dn
+#-- write_stats
+
+class PipelinesHicTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+        self.cache_fn = os.path.join(self.temp_d.name, "cache", "hic-stats.db")
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def test_load_stats_many(self):
+        from mgi.pipelines import hic
+        fns = [os.path.join(write_stats(self.temp_d.name, n, a), "stats_1.json") for n, a in [["s1", 95], ["s2", 80]]]
+        expected = [hic.load_stats(fn) for fn in fns]
+        self.assertEqual(hic.load_stats_many(fns, threads=2, cache_fn=self.cache_fn), expected)
+        self.assertTrue(os.path.exists(self.cache_fn))
+        # Cached stats are not loaded again
+        with patch("mgi.pipelines.hic.load_stats", side_effect=Exception("loaded")):
+            self.assertEqual(hic.load_stats_many(fns, threads=2, cache_fn=self.cache_fn), expected)
+        # Changed stats are
+        write_stats(self.temp_d.name, "s3", 60.5)
+        os.replace(os.path.join(self.temp_d.name, "s3", "stats_1.json"), fns[1])
+        stats = hic.load_stats_many(fns, threads=2, cache_fn=self.cache_fn)
+        self.assertEqual(stats[1]["aligned"]["seqd"][1], 60.5)
+        self.assertEqual(hic.load_stats_many(fns, cache_fn=False), stats)
+
+    def test_load_stats_many_old_cache(self):
+        import sqlite3
+        from mgi.pipelines import hic
+        # Stats cached before versions are loaded again
+        fn = os.path.join(write_stats(self.temp_d.name, "s1", 95), "stats_1.json")
+        os.makedirs(os.path.dirname(self.cache_fn))
+        st = os.stat(fn)
+        con = sqlite3.connect(self.cache_fn)
+        con.execute("CREATE TABLE stats (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, stats TEXT)")
+        con.execute("INSERT INTO stats VALUES (?, ?, ?, ?)", [os.path.abspath(fn), st.st_size, st.st_mtime_ns, "{}"])
+        con.commit()
+        con.close()
+        self.assertEqual(hic.load_stats_many([fn], cache_fn=self.cache_fn), [hic.load_stats(fn)])
+
+    def test_benchmarks_cmd(self):
+        from mgi.pipelines.cli import pl_cli
+        dn = write_stats(self.temp_d.name, "s1", 95)
+        runner = CliRunner()
+        with patch.dict(os.environ, {"MGI_CACHE_DN": os.path.dirname(self.cache_fn)}):
+            result = runner.invoke(pl_cli, ["hic", "benchmarks", f"s1:{dn}", "-r", "tsv"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertEqual(result.output.splitlines()[1], "aligned\t>90% (<75%)\tpass\t95\t95000")
+        self.assertTrue(os.path.exists(self.cache_fn))
+
+    def test_create_benchmarks_histograms(self):
+        from mgi.pipelines import hic
+        samples = [{"name": "s1", "label": l, "stats": self.stats(a)} for l, a in [["b38", 95.5], ["chm13", 80]]]
+        samples.append({"name": "s2", "label": "s2", "stats": self.stats(10, unique=20)})
+        groups = {"s1": samples[:2], "s2": samples[2:]}
+        dn = os.path.join(self.temp_d.name, "plots")
+        fns = hic.create_benchmarks_comparative_histograms(samples, groups, dn)
+        self.assertEqual(fns, [os.path.join(dn, "s1.ch.png"), os.path.join(dn, "s2.ch.png")])
+        fns = hic.create_benchmarks_detail_histograms(samples, dn)
+        self.assertEqual([os.path.basename(fn) for fn in fns], ["s1.b38.detail.png", "s1.chm13.detail.png", "s2.detail.png"])
+        for fmt in ["pdf", "sprite"]:
+            fns = hic.create_benchmarks_comparative_histograms(samples, groups, dn, fmt=fmt)
+            self.assertEqual(fns, [os.path.join(dn, "benchmarks.ch." + ("pdf" if fmt == "pdf" else "png"))])
+        with open(os.path.join(dn, "benchmarks.ch.pdf"), "rb") as f:
+            self.assertEqual(f.read().count(b"/Type /Page "), 2)
+        for fn in os.listdir(dn):
+            self.assertGreater(os.path.getsize(os.path.join(dn, fn)), 1000)
+
+    def stats(self, aligned, unique=None):
+        from mgi.pipelines.hic import get_benchmarks
+        stats = {n: {"seqd": [1000, 50], "uniq": [500, None]} for n in get_benchmarks().keys()}
+        stats["aligned"] = {"seqd": [900, aligned], "uniq": [800, unique]}
+        return stats
+
+    def test_evaluate_benchmarks(self):
+        import numpy as np
+        from mgi.pipelines.hic import evaluate_benchmarks, get_benchmarks_matrix
+        samples = [{"label": "a", "stats": self.stats(95.5)}, {"label": "b", "stats": self.stats(75, unique=90)}, {"label": "c", "stats": self.stats(10)}]
+        pcts = get_benchmarks_matrix(samples)
+        self.assertEqual(pcts.shape, (3, 10, 2))
+        self.assertTrue(np.isnan(pcts[0, 0, 1]))
+        statuses = evaluate_benchmarks(pcts)
+        self.assertEqual(list(statuses[:, 0, 0]), ["pass", "marg", "fail"])
+        self.assertEqual(list(statuses[:, 0, 1]), [None, "marg", None])
+
+    def test_get_benchmarks_stats(self):
+        from mgi.pipelines.hic import get_benchmarks_stats
+        samples = [{"label": "a", "stats": self.stats(95.5)}, {"label": "b", "stats": self.stats(75, unique=90)}]
+        headers, rows = get_benchmarks_stats(samples)
+        self.assertEqual(headers, ["STAT", "THRESHOLD", "A", "PCT", "VALUE", "B", "PCT", "VALUE"])
+        self.assertEqual(rows[0], ["aligned", ">90% (<75%)", "pass", "95.5", "900", "marg", "75", "900"])
+        # Missing unique percents are skipped
+        self.assertEqual(rows[1], ["aligned uniq", ">90% (<75%)", "marg", "90", "800"])
+        self.assertEqual(rows[2], ["unique", ">=40%", "pass", "50", "1000", "pass", "50", "1000"])
+        self.assertEqual(len(rows), 11)
+
+    def test_get_benchmarks_summary(self):
+        from mgi.pipelines.hic import get_benchmarks_summary
+        from mgi.pipelines.qc import summary_to_rows
+        samples = [{"label": f"s{i}", "stats": self.stats(a)} for i, a in enumerate([91, 92, 93, 94, 95, 10])]
+        summary = get_benchmarks_summary(samples)
+        self.assertEqual([r["stat"] for r in summary[:3]], ["aligned", "unique", "chimeric"])
+        aligned = summary[0]
+        self.assertEqual([aligned[k] for k in ["count", "min", "p50", "max", "mad"]], [6, 10, 92.5, 95, 1.5])
+        self.assertAlmostEqual(aligned["mean"], 79.1667, places=3)
+        self.assertEqual(aligned["statuses"], {"fail": 1, "marg": 0, "pass": 5})
+        self.assertEqual(aligned["outliers"], ["s5"])
+        self.assertEqual(summary[1]["outliers"], [])
+        headers, rows = summary_to_rows(summary)
+        self.assertEqual(len(headers), len(rows[0]))
+        self.assertEqual(rows[0], ["aligned", ">90% (<75%)", 6, "79.17", "10.00", "30.25", "91.25", "92.50", "93.75", "94.75", "95.00", "1.50", "fail=1,marg=0,pass=5", 1])
+#-- PipelinesHicTest
+
+class PipelinesHicDbTest(TestBaseWithDb):
+    def test_ingest_and_benchmarks_from_db(self):
+        from mgi.models import Entity, EntityFeature
+        from mgi.pipelines.cli import pl_cli
+        dns = [write_stats(self.temp_d.name, n, a) for n, a in [["s1.b38", 95], ["s1.chm13", 80], ["s2", 60.5]]]
+        samples = [f"s1:b38:{dns[0]}", f"s1:chm13:{dns[1]}", f"s2:{dns[2]}"]
+        runner = CliRunner()
+        env = {"MGI_CACHE_DN": os.path.join(self.temp_d.name, "cache")}
+        result = runner.invoke(pl_cli, ["hic", "ingest", *samples, "--batch-size", "2"], catch_exceptions=False, env=env)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertRegex(result.output, r"^Ingested 3 samples with \d+ features in [\d\.]+s\n$")
+        entity = Entity.query.filter(Entity.name == "chm13", Entity.kind == "sample").one()
+        features = {f.name: f.value for f in EntityFeature.query.filter(EntityFeature.entity_id == entity.id, EntityFeature.group == "hic_qc")}
+        self.assertEqual(features["sample"], '"s1"')
+        self.assertEqual(features["aligned.seqd.pct"], "80")
+        self.assertEqual(features["aligned.seqd.status"], '"marg"')
+        self.assertNotIn("aligned.uniq.pct", features)
+
+        # Ingesting again replaces
+        result = runner.invoke(pl_cli, ["hic", "ingest", *samples], catch_exceptions=False, env=env)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(EntityFeature.query.filter(EntityFeature.entity_id == entity.id, EntityFeature.group == "hic_qc").count(), len(features))
+
+        # Same table from the DB as from the files
+        result = runner.invoke(pl_cli, ["hic", "benchmarks", *samples, "-r", "tsv"], catch_exceptions=False, env=env)
+        self.assertEqual(result.exit_code, 0)
+        from_files = result.output
+        result = runner.invoke(pl_cli, ["hic", "benchmarks", "--from-db", "-r", "tsv"], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertEqual(result.output, from_files)
+
+        result = runner.invoke(pl_cli, ["hic", "benchmarks", "--from-db", "--status", "fail", "-r", "tsv"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output.splitlines()[0].split("\t")[2:], ["S2", "PCT", "VALUE"])
+        result = runner.invoke(pl_cli, ["hic", "benchmarks", "--from-db", "-r", "summary,json"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        lines = result.output.splitlines()
+        self.assertEqual(lines[0].split("\t")[:3], ["STAT", "THRESHOLD", "COUNT"])
+        self.assertEqual(lines[1].split("\t")[-2:], ["fail=1,marg=1,pass=1", "0"])
+        summary = json.loads("\n".join(lines[lines.index("{"):]))
+        self.assertEqual(summary["samples"], 3)
+        self.assertEqual(summary["benchmarks"][0]["statuses"], {"fail": 1, "marg": 1, "pass": 1})
+        result = runner.invoke(pl_cli, ["hic", "benchmarks", "--from-db", "blah", "-r", "tsv"])
+        self.assertEqual(result.exit_code, 1)
+#-- PipelinesHicDbTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,100 @@
+import json, os, tempfile, unittest
+from click.testing import CliRunner
+
+from tests.test_pipelines_hic import write_stats
+
+class PipelinesQcTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def write_spec(self, spec, name="spec.yaml"):
+        fn = os.path.join(self.temp_d.name, name)
+        with open(fn, "w") as f:
+            f.write(spec)
+        return fn
+
+    def test_load_thresholds(self):
+        import operator
+        from mgi.pipelines.qc import load_thresholds
+        fn = self.write_spec("mapped:\n  ops: [[ge, 80], [gt, 95]]\n  status: [fail, marg, pass]\n  desc: '>95%'\n")
+        self.assertEqual(load_thresholds(fn), {"mapped": {"ops": [[operator.ge, 80], [operator.gt, 95]], "status": ["fail", "marg", "pass"], "desc": ">95%"}})
+        fn = self.write_spec("mapped:\n  ops: [[gte, 80]]\n  status: [fail, pass]\n  desc: ''\n")
+        with self.assertRaisesRegex(Exception, "Unknown operator gte"):
+            load_thresholds(fn)
+        fn = self.write_spec("mapped:\n  ops: [[ge, 80]]\n  status: [pass]\n  desc: ''\n")
+        with self.assertRaisesRegex(Exception, "needs one more status than ops"):
+            load_thresholds(fn)
+
+    def test_registry(self):
+        from mgi.pipelines import qc
+        self.assertIn("hic", qc.pipeline_names())
+        hic = qc.get_pipeline("hic")
+        self.assertIs(qc.get_pipeline("hic"), hic)
+        self.assertEqual(list(hic.benchmarks.keys())[:2], ["aligned", "unique"])
+        with self.assertRaisesRegex(Exception, "No QC for pipeline blah, known are: "):
+            qc.get_pipeline("blah")
+
+    def test_plugin(self):
+        from mgi.pipelines import qc
+        spec_fn = self.write_spec("mapped:\n  ops: [[ge, 80], [gt, 95]]\n  status: [fail, marg, pass]\n  desc: '>95%'\n")
+        class CountsQc(qc.QcPipeline):
+            name = "counts"
+            def stats_fns(self, dn):
+                return [os.path.join(dn, "total"), os.path.join(dn, "mapped")]
+            def load_stats(self, fns):
+                total, mapped = [int(open(fn).read()) for fn in fns]
+                return {"mapped": {"value": [mapped, round(mapped * 100 / total, 2)]}}
+        pipeline = CountsQc(thresholds_fn=spec_fn)
+        args = []
+        for name, mapped in [["s1", 99], ["s2", 90], ["s3", 10]]:
+            dn = os.path.join(self.temp_d.name, name)
+            os.makedirs(dn)
+            for fn, v in [["total", 100], ["mapped", mapped]]:
+                with open(os.path.join(dn, fn), "w") as f:
+                    f.write(str(v))
+            args.append(f"{name}:{dn}")
+        cache_fn = os.path.join(self.temp_d.name, "cache.db")
+        samples = qc.resolve_samples(pipeline, args, threads=2, cache_fn=cache_fn)
+        self.assertEqual([s["stats"]["mapped"]["value"] for s in samples], [[99, 99.0], [90, 90.0], [10, 10.0]])
+        fns_list = [s["stats_fns"] for s in samples]
+        self.assertEqual(qc.load_stats_many(pipeline.load_stats, fns_list, cache_fn=cache_fn, cache_version=pipeline.cache_version), [s["stats"] for s in samples])
+        # Cached stats are used with the same version only, changed with the thresholds or the stats version
+        def failed_load(fns):
+            raise Exception("loaded")
+        with self.assertRaisesRegex(Exception, "loaded"):
+            qc.load_stats_many(failed_load, fns_list, cache_fn=cache_fn, cache_version=CountsQc(thresholds_fn=self.write_spec("mapped:\n  ops: [[ge, 50]]\n  status: [fail, pass]\n  desc: '>50%'\n", name="other.yaml")).cache_version)
+        CountsQc.stats_version = 2
+        with self.assertRaisesRegex(Exception, "loaded"):
+            qc.load_stats_many(failed_load, fns_list, cache_fn=cache_fn, cache_version=CountsQc(thresholds_fn=spec_fn).cache_version)
+        self.assertEqual(qc.load_stats_many(failed_load, fns_list, cache_fn=cache_fn, cache_version=pipeline.cache_version), [s["stats"] for s in samples])
+        headers, rows = qc.get_stats_table(pipeline, samples)
+        self.assertEqual(headers, ["STAT", "THRESHOLD", "S1", "PCT", "VALUE", "S2", "PCT", "VALUE", "S3", "PCT", "VALUE"])
+        self.assertEqual(rows, [["mapped", ">95%", "pass", "99.0", "99", "marg", "90.0", "90", "fail", "10.0", "10"]])
+        summary = qc.get_summary(pipeline, samples)
+        self.assertEqual(summary[0]["statuses"], {"fail": 1, "marg": 1, "pass": 1})
+
+    def test_report_cmd(self):
+        from mgi.pipelines.cli import pl_cli
+        samples = [f"{n}:{write_stats(self.temp_d.name, n, a)}" for n, a in [["s1", 95], ["s2", 60.5]]]
+        runner = CliRunner()
+        env = {"MGI_CACHE_DN": os.path.join(self.temp_d.name, "cache")}
+        result = runner.invoke(pl_cli, ["qc", "report", "hic", *samples, "-r", "tsv,summary"], catch_exceptions=False, env=env)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        expected = runner.invoke(pl_cli, ["hic", "benchmarks", *samples, "-r", "tsv,summary"], catch_exceptions=False, env=env)
+        self.assertEqual(result.output, expected.output)
+        result = runner.invoke(pl_cli, ["qc", "report", "blah", *samples])
+        self.assertEqual(result.exit_code, 1)
+        result = runner.invoke(pl_cli, ["qc", "pipelines"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertRegex(result.output, r"\nhic +aligned +alignment +>90% \(<75%\) +seqd,uniq ")
+#-- PipelinesQcTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
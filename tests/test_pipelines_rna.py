@@ -0,0 +1,149 @@
+import json, os, sys, tempfile, unittest
+from click.testing import CliRunner
+from unittest.mock import MagicMock, patch
+
+def write_qc(root, name, unique="85.00%", splices=1000, paired=True, bamroot=None):
+    # QC JSONs as written by align.py, nested in a run directory
+    dn = os.path.join(root, name)
+    if bamroot is None:
+        bamroot = name
+    os.makedirs(os.path.join(dn, "execution"), exist_ok=True)
+    flagstat = {"total": 10000, "total_qc_failed": 0, "mapped": 9500, "mapped_qc_failed": 0, "mapped_pct": 95.0}
+    if paired:
+        flagstat.update({"paired": 10000, "paired_qc_failed": 0, "paired_properly": 9000, "paired_properly_qc_failed": 0, "paired_properly_pct": 90.0})
+    star = {
+            "Number of input reads": "10,000",
+            "Average input read length": 202,
+            "Uniquely mapped reads number": 8500,
+            "Uniquely mapped reads %": unique,
+            "Mismatch rate per base, %": "0.30%",
+            "Number of splices: Total": splices,
+            "Number of splices: Annotated (sjdb)": 950,
+            "Number of splices: Non-canonical": 20,
+            "Number of reads mapped to multiple loci": 500,
+            "% of reads mapped to multiple loci": "5.00%",
+            "Number of reads mapped to too many loci": 10,
+            "% of reads mapped to too many loci": "0.10%",
+            "Number of reads unmapped: too short": 900,
+            "% of reads unmapped: too short": "9.00%",
+            }
+    for fn, metric, content in [[f"{bamroot}_genome_flagstat.json", "samtools_genome_flagstat", flagstat], [f"{bamroot}_Log.final.json", "star_log_qc", star]]:
+        with open(os.path.join(dn, "execution", fn), "w") as f:
+            json.dump({metric: content}, f)
+    return dn
+#-- write_qc
+
+class PipelinesRnaTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_d = tempfile.TemporaryDirectory()
+        self.env = {"MGI_CACHE_DN": os.path.join(self.temp_d.name, "cache")}
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+
+    def test_load_stats(self):
+        from mgi.pipelines import rna
+        self.assertEqual([rna.to_number(v) for v in ["1,024", "95.40%", "N/A", 3, None]], [1024, 95.4, None, 3, None])
+        dn = write_qc(self.temp_d.name, "s1", paired=False)
+        libraries = rna.find_qc_files(dn)
+        self.assertEqual(list(libraries.keys()), [os.path.join("execution", "s1")])
+        fns = libraries[os.path.join("execution", "s1")]
+        self.assertEqual([os.path.basename(fn) for fn in fns], ["s1_genome_flagstat.json", "s1_Log.final.json"])
+        stats = rna.load_stats(*fns)
+        self.assertEqual(stats["input_reads"]["value"], [10000, None])
+        self.assertEqual(stats["uniquely_mapped"]["value"], [8500, 85.0])
+        self.assertEqual(stats["annotated_splices"]["value"], [950, 95.0])
+        self.assertEqual(stats["non_canonical_splices"]["value"], [20, 2.0])
+        self.assertEqual(stats["mismatch_rate"]["value"], [None, 0.3])
+        self.assertEqual(stats["properly_paired"]["value"], [None, None])
+        with self.assertRaisesRegex(Exception, "No \\*_genome_flagstat.json or \\*_Log.final.json found in "):
+            rna.find_qc_files(self.temp_d.name + "/blah")
+
+    def test_many_libraries(self):
+        # Workflow root with shards, and a manifest working directory
+        from mgi.pipelines import qc, rna
+        root = os.path.join(self.temp_d.name, "wf")
+        write_qc(root, "shard-0", bamroot="rep1")
+        write_qc(root, "shard-1", bamroot="rep2", unique="50.00%")
+        write_qc(self.temp_d.name, "manifest", bamroot="rep1")
+        write_qc(self.temp_d.name, "manifest", bamroot="rep2")
+        samples = qc.resolve_samples(qc.get_pipeline("rna"), [f"wf:{root}", os.path.join(self.temp_d.name, "manifest")], threads=2, cache_fn=False)
+        self.assertEqual([(s["name"], s["label"]) for s in samples], [
+            ("wf.shard-0/execution/rep1", "wf.shard-0/execution/rep1"),
+            ("wf.shard-1/execution/rep2", "wf.shard-1/execution/rep2"),
+            ("manifest.execution/rep1", "manifest.execution/rep1"),
+            ("manifest.execution/rep2", "manifest.execution/rep2"),
+            ])
+        self.assertEqual([s["stats"]["uniquely_mapped"]["value"][1] for s in samples], [85.0, 50.0, 85.0, 85.0])
+        with self.assertRaisesRegex(Exception, "Found 2 libraries in "):
+            qc.get_pipeline("rna").stats_fns(root)
+
+        # A file without its pair
+        os.remove(os.path.join(root, "shard-1", "execution", "rep2_Log.final.json"))
+        with self.assertRaisesRegex(Exception, "No shard-1/execution/rep2_Log.final.json found for "):
+            rna.find_qc_files(root)
+
+    def test_get_cohort_table(self):
+        from mgi.pipelines import qc, rna
+        dns = [write_qc(self.temp_d.name, "s1"), write_qc(self.temp_d.name, "s2", unique="50.00%")]
+        samples = qc.resolve_samples(qc.get_pipeline("rna"), dns, threads=2, cache_fn=False)
+        headers, rows = rna.get_cohort_table(samples)
+        self.assertEqual(headers[:7], ["sample", "label", "input_reads", "read_length", "mapped_count", "mapped_pct", "mapped_status"])
+        self.assertEqual(headers[-1], "flags")
+        self.assertEqual(rows[0][:7], ["s1", "s1", 10000, 202, 9500, 95.0, "pass"])
+        self.assertEqual(rows[0][-1], "non_canonical_splices=atypical")
+        self.assertEqual(rows[1][-1], "uniquely_mapped=fail,non_canonical_splices=atypical")
+
+    def test_qc_cmd(self):
+        from mgi.pipelines.cli import pl_cli
+        dns = [write_qc(self.temp_d.name, "s1"), write_qc(self.temp_d.name, "s2", unique="70.00%")]
+        runner = CliRunner()
+        result = runner.invoke(pl_cli, ["rna", "qc", dns[1], f"lib1:{dns[0]}", "-t", "2"], catch_exceptions=False, env=self.env)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        lines = result.output.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1].split("\t")[:3], ["s2", "s2", "10000"])
+        self.assertEqual(lines[1].split("\t")[-1], "uniquely_mapped=marg,non_canonical_splices=atypical")
+        self.assertEqual(lines[2].split("\t")[:3], ["lib1", "lib1", "10000"])
+
+        output_fn = os.path.join(self.temp_d.name, "cohort.parquet")
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pq = None
+        if pq is not None:
+            result = runner.invoke(pl_cli, ["rna", "qc", *dns, "-o", output_fn], catch_exceptions=False, env=self.env)
+            self.assertEqual(result.exit_code, 0)
+            table = pq.read_table(output_fn)
+            self.assertEqual(table.num_rows, 2)
+            self.assertEqual(table.column("uniquely_mapped_pct").to_pylist(), [85.0, 70.0])
+            self.assertEqual(table.column("properly_paired_status").to_pylist(), ["pass", "pass"])
+        with patch.dict(sys.modules, {"pyarrow": None}):
+            result = runner.invoke(pl_cli, ["rna", "qc", *dns, "-o", output_fn], env=self.env)
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("Parquet output needs the pyarrow package", result.output)
+
+        result = runner.invoke(pl_cli, ["rna", "qc", self.temp_d.name + "/blah"], env=self.env)
+        self.assertEqual(result.exit_code, 1)
+        result = runner.invoke(pl_cli, ["rna", "qc"], env=self.env)
+        self.assertEqual(result.exit_code, 1)
+
+    def test_samples_from_workflow(self):
+        from mgi.pipelines import rna
+        dn = write_qc(self.temp_d.name, "s1")
+        fns = [os.path.join(dn, "execution", fn) for fn in ["s1_genome_flagstat.json", "s1_Log.final.json"]]
+        calls = [{"shardIndex": i, "executionStatus": status, "outputs": {"flagstat_json": fns[0], "log_json": fns[1]}} for i, status in enumerate(["Done", "Failed"])]
+        metadata = {"workflowName": "rna", "calls": {"rna.align": calls}}
+        wf = MagicMock()
+        wf.name = "rna-s1"
+        with patch("cw.model_helpers.get_wf", return_value=wf), patch("cw.wf_metadata.metadata_for_wf", return_value=metadata):
+            samples = rna.samples_from_workflow("rna-s1")
+        self.assertEqual(samples, [{"name": "rna-s1.0", "label": "rna-s1.0", "dn": os.path.join(dn, "execution"), "stats_fns": fns}])
+#-- PipelinesRnaTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,152 @@
+import os, struct, sys, tempfile, unittest, zlib
+
+SCRIPTS_DN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "wdl", "rna-seq", "scripts")
+
+def read_bedgraph(fn):
+    # Intervals by chromosome, sorted by start
+    intervals = {}
+    with open(fn, "r") as f:
+        for line in f:
+            chrom, start, end, value = line.split()
+            intervals.setdefault(chrom, []).append((int(start), int(end), float(value)))
+    return {chrom: sorted(rows) for chrom, rows in intervals.items()}
+#-- read_bedgraph
+
+def expected_summaries(intervals, sizes, reduction):
+    # Zoom summaries by (chrom, bin start), like the loop of UCSC bedGraphToBigWig: a bin starts at an interval past the end of the last bin, or at its end when an interval spans it, and sums are single precision
+    import numpy as np
+    summaries = {}
+    for chrom, rows in intervals.items():
+        s = None
+        for start, end, value in rows:
+            value = np.float32(value)
+            if s is None or s[0] <= start:
+                s = summaries[(chrom, start)] = [min(start + reduction, sizes[chrom]), 0, value, value, np.float32(0), np.float32(0)]
+            while True:
+                covered = min(end, s[0]) - start
+                s[1] += covered
+                s[2], s[3] = min(s[2], value), max(s[3], value)
+                s[4] += value * np.float32(covered)
+                s[5] += value * value * np.float32(covered)
+                if end <= s[0]:
+                    break
+                start = s[0]
+                s = summaries[(chrom, start)] = [min(start + reduction, sizes[chrom]), 0, value, value, np.float32(0), np.float32(0)]
+    return summaries
+#-- expected_summaries
+
+def expected_reduced(summaries, reduction):
+    # Summaries of the next zoom level, like UCSC bbiSummarySimpleReduce
+    reduced = {}
+    last = None
+    for (chrom, start), s in sorted(summaries.items()):
+        if last is None or last[0] != chrom or s[0] > last[1] + reduction:
+            last = (chrom, start)
+            reduced[last] = list(s)
+            continue
+        r = reduced[last]
+        r[0] = s[0]
+        r[1] += s[1]
+        r[2], r[3] = min(r[2], s[2]), max(r[3], s[3])
+        r[4] += s[4]
+        r[5] += s[5]
+    return reduced
+#-- expected_reduced
+
+def read_zoom_levels(fn, chrom_names):
+    # Zoom summaries of each level of a bigWig, by reduction then (chrom, bin start)
+    import bigwig
+    import numpy as np
+    levels = {}
+    with open(fn, "rb") as f:
+        header = struct.unpack(bigwig.HEADER_FORMAT, f.read(struct.calcsize(bigwig.HEADER_FORMAT)))
+        zoom_headers = [struct.unpack(bigwig.ZOOM_HEADER_FORMAT, f.read(struct.calcsize(bigwig.ZOOM_HEADER_FORMAT))) for i in range(header[2])]
+        for reduction, _, data_offset, index_offset in zoom_headers:
+            f.seek(data_offset)
+            count = struct.unpack("<I", f.read(4))[0]
+            data = f.read(index_offset - data_offset - 4)
+            records = []
+            while data:
+                d = zlib.decompressobj()
+                records.append(d.decompress(data))
+                data = d.unused_data
+            records = np.frombuffer(b"".join(records), dtype=bigwig.SUMMARY_ITEM)
+            assert len(records) == count
+            levels[reduction] = {(chrom_names[r["chrom_id"]], int(r["start"])): [int(r["end"]), int(r["valid"]), float(r["min"]), float(r["max"]), float(r["sum"]), float(r["sum_squares"])] for r in records}
+    return levels
+#-- read_zoom_levels
+
+class RnaSeqBigwigTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            import pyBigWig
+        except ImportError:
+            self.skipTest("pyBigWig is not installed")
+        sys.path.insert(0, SCRIPTS_DN)
+        self.data_dn = os.path.join(os.path.dirname(__file__), "data", "rna-seq")
+        self.bedgraph_fn = os.path.join(self.data_dn, "signal.bedGraph")
+        self.chrom_sizes_fn = os.path.join(self.data_dn, "chrom.sizes")
+        self.temp_d = tempfile.TemporaryDirectory()
+        self.bigwig_fn = os.path.join(self.temp_d.name, "signal.bw")
+        import bigwig
+        bigwig.bedgraph_to_bigwig(self.bedgraph_fn, self.chrom_sizes_fn, self.bigwig_fn)
+
+    def tearDown(self):
+        self.temp_d.cleanup()
+        sys.path.remove(SCRIPTS_DN)
+
+    def test_intervals(self):
+        import numpy as np
+        import pyBigWig
+        intervals = read_bedgraph(self.bedgraph_fn)
+        bw = pyBigWig.open(self.bigwig_fn)
+        try:
+            self.assertEqual(bw.chroms(), {"chr1": 120000, "chr2": 60000, "chr10": 80000})
+            for chrom, rows in intervals.items():
+                expected = [(start, end, float(np.float32(value))) for start, end, value in rows]
+                self.assertEqual(list(bw.intervals(chrom)), expected)
+        finally:
+            bw.close()
+
+        # The total summary, read from the file as pyBigWig gives it as integers
+        import bigwig
+        with open(self.bigwig_fn, "rb") as f:
+            header = struct.unpack(bigwig.HEADER_FORMAT, f.read(struct.calcsize(bigwig.HEADER_FORMAT)))
+            f.seek(header[9])
+            bases, min_value, max_value, sum_data, sum_squares = struct.unpack(bigwig.TOTAL_SUMMARY_FORMAT, f.read(struct.calcsize(bigwig.TOTAL_SUMMARY_FORMAT)))
+        values = [(end - start, float(np.float32(value))) for rows in intervals.values() for start, end, value in rows]
+        self.assertEqual(bases, sum(covered for covered, value in values))
+        self.assertEqual((min_value, max_value), (min(value for covered, value in values), max(value for covered, value in values)))
+        self.assertAlmostEqual(sum_data, sum(covered * value for covered, value in values), places=3)
+        self.assertAlmostEqual(sum_squares, sum(covered * value * value for covered, value in values), places=1)
+
+    def test_zoom_levels(self):
+        import pyBigWig
+        intervals = read_bedgraph(self.bedgraph_fn)
+        sizes = {"chr1": 120000, "chr2": 60000, "chr10": 80000}
+        # Chromosome ids are in the bedSort order
+        levels = read_zoom_levels(self.bigwig_fn, ["chr1", "chr10", "chr2"])
+        self.assertGreater(len(levels), 1)
+        reductions = sorted(levels.keys())
+        self.assertEqual(reductions, [reductions[0] * 4 ** i for i in range(len(levels))])
+        expected = expected_summaries(intervals, sizes, reductions[0])
+        for reduction in reductions:
+            if reduction != reductions[0]:
+                expected = expected_reduced(expected, reduction)
+            self.assertEqual(levels[reduction], {k: [int(v) for v in s[:2]] + [float(v) for v in s[2:]] for k, s in expected.items()})
+        # Levels stop at the first one without fewer summaries
+        if len(levels) < 10:
+            self.assertGreaterEqual(len(expected_reduced(expected, reductions[-1] * 4)), len(expected))
+
+        # Stats of whole chromosomes read from the summaries match the exact stats
+        bw = pyBigWig.open(self.bigwig_fn)
+        try:
+            for chrom in sizes:
+                for stat in ("mean", "min", "max", "coverage"):
+                    self.assertAlmostEqual(bw.stats(chrom, type=stat)[0], bw.stats(chrom, type=stat, exact=True)[0], places=4)
+        finally:
+            bw.close()
+#-- RnaSeqBigwigTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
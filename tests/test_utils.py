@@ -66,9 +66,15 @@ class UtilsCliTest(unittest.TestCase):
         self.assertEqual(result.exit_code, 0)
 
     def test_create_db(self):
+        from alembic.migration import MigrationContext
+        from mgi.database import create_engine
         from mgi.utils import create_db
         create_db(self.db_url)
         self.assertTrue(os.path.exists(self.db_fn))
+        engine = create_engine(self.db_url)
+        with engine.connect() as con:
+            self.assertEqual(MigrationContext.configure(con).get_current_revision(), self.head_revision())
+        engine.dispose()
 
     def test_db_create_cmd(self):
         from mgi.utils import db_create_cmd as cmd
@@ -92,6 +98,48 @@ class UtilsCliTest(unittest.TestCase):
         self.assertEqual(result.output, expected_output)
         self.assertTrue(os.path.exists(self.db_fn))
 
+    def test_upgrade_db(self):
+        from alembic.autogenerate import compare_metadata
+        from alembic.migration import MigrationContext
+        from mgi.database import create_engine
+        from mgi.models import db
+        from mgi.utils import upgrade_db
+        upgrade_db(self.db_url)
+        engine = create_engine(self.db_url)
+        with engine.connect() as con:
+            self.assertEqual(compare_metadata(MigrationContext.configure(con), db.metadata), [])
+        engine.dispose()
+
+        # Created before migrations, with the initial schema
+        old_db_url = "sqlite:///" + os.path.join(self.temp_d.name, "old.db")
+        upgrade_db(old_db_url, "0001")
+        engine = create_engine(old_db_url)
+        with engine.begin() as con:
+            con.exec_driver_sql("DROP TABLE alembic_version")
+        upgrade_db(old_db_url)
+        with engine.connect() as con:
+            self.assertEqual(MigrationContext.configure(con).get_current_revision(), self.head_revision())
+        engine.dispose()
+
+    def head_revision(self):
+        from alembic.script import ScriptDirectory
+        from mgi.utils import alembic_config
+        return ScriptDirectory.from_config(alembic_config(self.db_url)).get_current_head()
+
+    def test_db_upgrade_cmd(self):
+        from mgi.utils import db_upgrade_cmd as cmd
+        runner = CliRunner()
+
+        result = runner.invoke(cmd, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cmd, [self.db_url], catch_exceptions=False)
+        try:
+            self.assertEqual(result.exit_code, 0)
+        except:
+            print(result.output)
+            raise
+        self.assertEqual(result.output, f"Upgraded DB at {self.db_url} to head\n")
+
     def test_db_set_cmd(self):
         from mgi.utils import db_set_cmd as cmd
         runner = CliRunner()
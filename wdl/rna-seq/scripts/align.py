@@ -8,6 +8,9 @@ __version__ = "0.1.0"
 __license__ = "MIT"
 
 import argparse
+import errno
+import gzip
+import hashlib
 import json
 import logging
 import os
@@ -18,7 +21,10 @@ import shlex
 import shutil
 import subprocess
 import tarfile
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 
 from qc_utils import QCMetric
 from qc_utils.parsers import parse_flagstats, parse_starlog
@@ -35,14 +41,31 @@ consolehandler.setFormatter(formatter)
 logger.addHandler(consolehandler)
 logger.addHandler(filehandler)
 
-
-def make_aligner(endedness, fastqs, ncpus, ramGB, indexdir):
+FASTQ_MERGE_MODES = ["list", "fifo", "copy"]
+COPY_CHUNK_SIZE = 1 << 24
+INDEX_FINGERPRINT_SIZE = 1 << 20
+INDEX_MARKER = ".index_complete"
+# STAR --genomeLoad by genome load mode
+GENOME_LOAD_MODES = {"none": "NoSharedMemory", "shared": "LoadAndKeep"}
+
+
+def make_aligner(
+    endedness,
+    fastqs,
+    ncpus,
+    ramGB,
+    indexdir,
+    genome_load="NoSharedMemory",
+    prefix="./",
+):
     if endedness == "single":
         logger.info("Creating a single-ended aligner.")
-        return SingleEndedStarAligner(fastqs, ncpus, ramGB, indexdir)
+        return SingleEndedStarAligner(
+            fastqs, ncpus, ramGB, indexdir, genome_load, prefix
+        )
     elif endedness == "paired":
         logger.info("Creating a paired-end aligner.")
-        return PairedEndStarAligner(fastqs, ncpus, ramGB, indexdir)
+        return PairedEndStarAligner(fastqs, ncpus, ramGB, indexdir, genome_load, prefix)
 
 
 def make_modified_TarInfo(archive, target_dir=""):
@@ -89,6 +112,32 @@ def get_tmp_file_name(extension=".fastq.gz"):
             return tmp_name
 
 
+def append_file(input_path, out_fp):
+    """Append a file to an open unbuffered binary file.
+    Copies in the kernel with os.copy_file_range when the filesystems
+    support it, and falls back to a buffered copy from where it stopped.
+    """
+    with open(input_path, "rb") as in_fp:
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(
+                    in_fp.fileno(), out_fp.fileno(), COPY_CHUNK_SIZE
+                ):
+                    pass
+                return
+            except OSError as e:
+                unsupported = (
+                    errno.EXDEV,
+                    errno.ENOSYS,
+                    errno.EINVAL,
+                    errno.EOPNOTSUPP,
+                )
+                if e.errno not in unsupported:
+                    raise
+                logger.info("copy_file_range unsupported, copying %r" % input_path)
+        shutil.copyfileobj(in_fp, out_fp, COPY_CHUNK_SIZE)
+
+
 def concatenate_files(input_files):
     """Merge list of files into one.
     Args: list of paths.
@@ -96,24 +145,219 @@ def concatenate_files(input_files):
     Side effect: creates the concatenated file in the path that is returned.
     """
     result_filename = get_tmp_file_name()
-    with open(result_filename, "wb") as out_fp:
+    with open(result_filename, "wb", buffering=0) as out_fp:
         logger.info("merging files into %r" % result_filename)
         for fastq in input_files:
-            with open(fastq, "rb") as add_on:
-                logger.info("merging %r next" % fastq)
-                shutil.copyfileobj(add_on, out_fp)
-                logger.info("merging %r success" % fastq)
+            logger.info("merging %r next" % fastq)
+            append_file(fastq, out_fp)
+            logger.info("merging %r success" % fastq)
     logger.info("merge complete, result is in %r" % result_filename)
     return result_filename
 
 
-def get_flagstats(input_path, output_path):
-    command = "samtools flagstat {infile}".format(infile=input_path)
+class FifoWriter(threading.Thread):
+    """
+    Streams files into a named pipe, for readers that need a single
+    input. Gzipped files can be streamed as is, because concatenated
+    gzip members decompress as one stream. Errors are kept in error,
+    to check after the reader is done.
+    """
+
+    def __init__(self, input_files):
+        super().__init__(daemon=True)
+        self.input_files = input_files
+        self.path = get_tmp_file_name(extension=".fastq.gz.fifo")
+        self.error = None
+        os.mkfifo(self.path)
+
+    def run(self):
+        try:
+            with open(self.path, "wb") as out_fp:
+                for fastq in self.input_files:
+                    logger.info("streaming %r into %r" % (fastq, self.path))
+                    with open(fastq, "rb") as add_on:
+                        shutil.copyfileobj(add_on, out_fp, COPY_CHUNK_SIZE)
+        except Exception as e:
+            self.error = e
+
+    def close(self):
+        for i in range(100):
+            if not self.is_alive():
+                break
+            # The reader never opened the pipe, or stopped reading, so
+            # open and close it to unblock the writer with a broken pipe
+            fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            self.join(timeout=0.1)
+            os.close(fd)
+            self.join(timeout=0.1)
+        os.remove(self.path)
+        if self.error is not None and not isinstance(self.error, BrokenPipeError):
+            raise self.error
+
+
+def star_read_files(fastqs, mode, fifos):
+    """Value for STAR --readFilesIn of a read's fastq chunks.
+    list: comma separated, STAR reads the chunks in order with
+    --readFilesCommand, without merging. Paths with commas are streamed
+    through a fifo instead.
+    fifo: streamed through a named pipe, started FifoWriters are added
+    to fifos.
+    copy: concatenated into a new file.
+    """
+    if len(fastqs) == 1:
+        return fastqs[0]
+    if mode == "list" and not any("," in f for f in fastqs):
+        return ",".join(fastqs)
+    if mode in ("list", "fifo") and hasattr(os, "mkfifo"):
+        writer = FifoWriter(fastqs)
+        writer.start()
+        fifos.append(writer)
+        return writer.path
+    return concatenate_files(fastqs)
+
+
+def is_within_directory(directory, target):
+    abs_directory = os.path.abspath(directory)
+    abs_target = os.path.abspath(target)
+    return os.path.commonpath([abs_directory, abs_target]) == abs_directory
+
+
+def open_decompressed(path):
+    """Open an archive as a decompressed stream.
+    gzip is decompressed with pigz when available, zstd with zstd, and
+    anything else is read as is. Returns the stream and the process
+    decompressing into it, or None.
+    """
+    with open(path, "rb") as fp:
+        magic = fp.read(4)
+    if magic[:2] == b"\x1f\x8b":
+        command = ["pigz", "-dc", path] if shutil.which("pigz") else None
+    elif magic == b"\x28\xb5\x2f\xfd":
+        command = ["zstd", "-dc", path]
+    else:
+        return open(path, "rb"), None
+    if command is None:
+        logger.info("pigz not found, decompressing %s with python", path)
+        return gzip.open(path, "rb"), None
+    logger.info("decompressing with %s", " ".join(command))
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE
+    )
+    return process.stdout, process
+
+
+def extract_index(path, target_dir):
+    """Extract an index archive in one streaming pass.
+    Each member is checked for path traversal before it is extracted,
+    so the archive is read only once.
+    """
+    stream, process = open_decompressed(path)
+    try:
+        with tarfile.open(fileobj=stream, mode="r|") as archive:
+            for member in archive:
+                member_path = os.path.join(target_dir, member.name)
+                if not is_within_directory(target_dir, member_path):
+                    raise Exception("Attempted Path Traversal in Tar File")
+                if member.issym():
+                    # Symlinks are relative to the member, hardlinks to the
+                    # archive root
+                    link_path = os.path.join(
+                        os.path.dirname(member_path), member.linkname
+                    )
+                elif member.islnk():
+                    link_path = os.path.join(target_dir, member.linkname)
+                else:
+                    link_path = None
+                if link_path is not None and not is_within_directory(
+                    target_dir, link_path
+                ):
+                    raise Exception("Attempted Path Traversal in Tar File")
+                archive.extract(member, target_dir)
+    except BaseException:
+        # The decompressor exits non-zero once its pipe is closed, so the
+        # extraction error is raised, not a decompression one
+        stream.close()
+        if process is not None:
+            process.wait()
+        raise
+    stream.close()
+    if process is not None and process.wait() != 0:
+        raise Exception("Failed to decompress %s" % path)
+
+
+def index_fingerprint(path):
+    """Fingerprint of an index archive, from its size and its first and
+    last MB, so that a 30 GB archive is not read to find it in the cache.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as fp:
+        digest.update(fp.read(INDEX_FINGERPRINT_SIZE))
+        fp.seek(max(size - INDEX_FINGERPRINT_SIZE, 0))
+        digest.update(fp.read(INDEX_FINGERPRINT_SIZE))
+    return digest.hexdigest()
+
+
+def stage_index(index, indexdir, cache_dir=None):
+    """Extract the index archive and return the STAR genome directory.
+    Without a cache dir, the archive is extracted into the working
+    directory. With one, it is extracted once into a directory named by
+    its fingerprint, with a marker written when complete. Later jobs
+    with the same archive use it without extracting.
+    """
+    if cache_dir is None:
+        extract_index(index, ".")
+        return indexdir
+    fingerprint = index_fingerprint(index)
+    cached_dir = os.path.join(cache_dir, fingerprint)
+    marker = os.path.join(cached_dir, INDEX_MARKER)
+    if os.path.exists(marker):
+        logger.info("using cached index %s", cached_dir)
+        return os.path.join(cached_dir, indexdir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = "%s.%s.%d" % (cached_dir, os.uname().nodename, os.getpid())
+    logger.info("extracting index %s into %s", index, tmp_dir)
+    try:
+        extract_index(index, tmp_dir)
+        with open(os.path.join(tmp_dir, INDEX_MARKER), "w") as fp:
+            fp.write(fingerprint + "\n")
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    try:
+        os.rename(tmp_dir, cached_dir)
+    except OSError:
+        # Another job cached the same index first
+        if not os.path.exists(marker):
+            raise
+        shutil.rmtree(tmp_dir)
+    return os.path.join(cached_dir, indexdir)
+
+
+def get_flagstats(input_path, output_path, ncpus=1):
+    """Run samtools flagstat, decompressing with the extra cpus, and write
+    its output.
+    """
+    command = ["samtools", "flagstat", "-@", str(max(ncpus - 1, 0)), input_path]
     logger.info("Getting samtools flagstats for %s", input_path)
-    process = subprocess.run(shlex.split(command), stdout=subprocess.PIPE)
-    with open(output_path, "w") as f:
-        f.write(process.stdout.decode())
-    return None
+    process = subprocess.run(command, stdout=subprocess.PIPE)
+    if process.returncode != 0:
+        raise Exception(
+            "samtools flagstat failed with exit code %d" % process.returncode
+        )
+    with open(output_path, "wb") as f:
+        f.write(process.stdout)
+
+
+@contextmanager
+def timed(timings, step):
+    """Time a step into timings, as seconds by step name."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[step] = round(time.monotonic() - start, 3)
+        logger.info("%s took %.1fs", step, timings[step])
 
 
 def write_json(input_obj, output_path):
@@ -128,14 +372,18 @@ class StarAligner(ABC):
     Star aligning jobs.
     """
 
-    def __init__(self, ncpus, ramGB, indexdir):
+    def __init__(self, ncpus, ramGB, indexdir, genome_load, prefix):
         self.ncpus = ncpus
         self.ramGB = ramGB
         self.indexdir = indexdir
+        self.genome_load = genome_load
+        self.prefix = prefix
 
     def run(self):
         logger.info("running STAR command %s", " ".join(self.command))
-        subprocess.call(self.command)
+        returncode = subprocess.call(self.command)
+        if returncode != 0:
+            raise Exception("STAR failed with exit code %d" % returncode)
 
     @property
     @abstractmethod
@@ -153,7 +401,8 @@ class SingleEndedStarAligner(StarAligner):
     --readFilesIn {infastq} \
     --readFilesCommand zcat \
     --runThreadN {ncpus} \
-    --genomeLoad NoSharedMemory \
+    --genomeLoad {genome_load} \
+    --outFileNamePrefix {prefix} \
     --outFilterMultimapNmax 20 \
     --alignSJoverhangMin 8 \
     --alignSJDBoverhangMin 1 \
@@ -172,8 +421,8 @@ class SingleEndedStarAligner(StarAligner):
     --sjdbScore 1 \
     --limitBAMsortRAM {ramGB}000000000"""
 
-    def __init__(self, fastqs, ncpus, ramGB, indexdir):
-        super().__init__(ncpus, ramGB, indexdir)
+    def __init__(self, fastqs, ncpus, ramGB, indexdir, genome_load, prefix):
+        super().__init__(ncpus, ramGB, indexdir, genome_load, prefix)
         self.input_fastq = fastqs[0]
         self.command = shlex.split(
             self.format_command_string(type(self).command_string)
@@ -181,10 +430,12 @@ class SingleEndedStarAligner(StarAligner):
 
     def format_command_string(self, input_string):
         cmd = input_string.format(
-            infastq=self.input_fastq,
+            infastq=shlex.quote(self.input_fastq),
             ncpus=self.ncpus,
             ramGB=self.ramGB,
             indexdir=self.indexdir,
+            genome_load=self.genome_load,
+            prefix=shlex.quote(self.prefix),
         )
         return cmd
 
@@ -195,7 +446,8 @@ class PairedEndStarAligner(StarAligner):
     --readFilesIn {read1_fq_gz} {read2_fq_gz} \
     --readFilesCommand zcat \
     --runThreadN {ncpus} \
-    --genomeLoad NoSharedMemory \
+    --genomeLoad {genome_load} \
+    --outFileNamePrefix {prefix} \
     --outFilterMultimapNmax 20 \
     --alignSJoverhangMin 8 \
     --alignSJDBoverhangMin 1 \
@@ -215,8 +467,8 @@ class PairedEndStarAligner(StarAligner):
     --peOverlapNbasesMin 5 \
     --limitBAMsortRAM {ramGB}000000000"""
 
-    def __init__(self, fastqs, ncpus, ramGB, indexdir):
-        super().__init__(ncpus, ramGB, indexdir)
+    def __init__(self, fastqs, ncpus, ramGB, indexdir, genome_load, prefix):
+        super().__init__(ncpus, ramGB, indexdir, genome_load, prefix)
         self.fastq_read1 = fastqs[0]
         self.fastq_read2 = fastqs[1]
         self.command = shlex.split(
@@ -225,70 +477,124 @@ class PairedEndStarAligner(StarAligner):
 
     def format_command_string(self, input_string):
         cmd = input_string.format(
-            read1_fq_gz=self.fastq_read1,
-            read2_fq_gz=self.fastq_read2,
+            read1_fq_gz=shlex.quote(self.fastq_read1),
+            read2_fq_gz=shlex.quote(self.fastq_read2),
             ncpus=self.ncpus,
             ramGB=self.ramGB,
             indexdir=self.indexdir,
+            genome_load=self.genome_load,
+            prefix=shlex.quote(self.prefix),
         )
         return cmd
 
 
-def main(args):
-    merged_R2 = None
-    if len(args.fastqs_R1) > 1:
-        merged_R1 = concatenate_files(args.fastqs_R1)
-    else:
-        merged_R1 = args.fastqs_R1[0]
-    if args.endedness == "paired" and len(args.fastqs_R2) > 1:
-        merged_R2 = concatenate_files(args.fastqs_R2)
-    elif args.endedness == "paired" and len(args.fastqs_R2) == 1:
-        merged_R2 = args.fastqs_R2[0]
-    fastqs = [merged_R1]
-
-    if merged_R2 and args.endedness == "paired":
-        fastqs.append(merged_R2)
-    with tarfile.open(args.index, "r:gz") as archive:
-        def is_within_directory(directory, target):
-            
-            abs_directory = os.path.abspath(directory)
-            abs_target = os.path.abspath(target)
-        
-            prefix = os.path.commonprefix([abs_directory, abs_target])
-            
-            return prefix == abs_directory
-        
-        def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-        
-            for member in tar.getmembers():
-                member_path = os.path.join(path, member.name)
-                if not is_within_directory(path, member_path):
-                    raise Exception("Attempted Path Traversal in Tar File")
-        
-            tar.extractall(path, members, numeric_owner=numeric_owner) 
-            
-        
-        safe_extract(archive)
+def remove_shared_genome(genome_dir):
+    """Unload a genome kept in shared memory by LoadAndKeep."""
+    command = ["STAR", "--genomeDir", genome_dir, "--genomeLoad", "Remove"]
+    logger.info("removing shared genome with %s", " ".join(command))
+    returncode = subprocess.call(command)
+    if returncode != 0:
+        logger.warning("failed to remove shared genome, exit code %d", returncode)
+
+
+def load_manifest(path):
+    """Samples to align from a JSON manifest, a list of objects with
+    bamroot, fastqs_R1, and for paired libraries fastqs_R2, like:
+    [{"bamroot": "rep1", "fastqs_R1": ["a_R1.fq.gz"], "fastqs_R2": ["a_R2.fq.gz"]}]
+    """
+    with open(path) as fp:
+        samples = json.load(fp)
+    for sample in samples:
+        if "bamroot" not in sample or not sample.get("fastqs_R1"):
+            raise Exception("Manifest samples need bamroot and fastqs_R1: %r" % sample)
+        sample.setdefault("fastqs_R2", [])
+    if len(set(s["bamroot"] for s in samples)) != len(samples):
+        raise Exception("Manifest bamroots must be unique")
+    return samples
+
+
+def align_sample(sample, args, genome_dir, genome_load, timings):
+    """Align a sample, then write its bam, flagstat, QC and step timings
+    JSONs named by its bamroot in the working directory. STAR outputs are
+    prefixed by the bamroot too, so samples do not overwrite each other.
+    """
+    logger.info("aligning %s", sample["bamroot"])
+    start = time.monotonic()
+    timings = dict(timings)
+    fifos = []
+    fastqs = [star_read_files(sample["fastqs_R1"], args.fastq_merge, fifos)]
+    if args.endedness == "paired":
+        fastqs.append(star_read_files(sample["fastqs_R2"], args.fastq_merge, fifos))
+    bamroot = sample["bamroot"]
+    cwd = os.getcwd()
     aligner = make_aligner(
-        args.endedness, fastqs, args.ncpus, args.ramGB, args.indexdir
+        args.endedness,
+        fastqs,
+        args.ncpus,
+        args.ramGB,
+        genome_dir,
+        genome_load,
+        os.path.join(cwd, bamroot + "_"),
     )
-    aligner.run()
-    cwd = os.getcwd()
-    genome_bam_path = os.path.join(cwd, args.bamroot + "_genome.bam")
-    genome_flagstat_path = os.path.join(cwd, args.bamroot + "_genome_flagstat.txt")
-    star_log_path = os.path.join(cwd, args.bamroot + "_Log.final.out")
-    os.rename(os.path.join(cwd, "Aligned.sortedByCoord.out.bam"), genome_bam_path)
-    os.rename(os.path.join(cwd, "Log.final.out"), star_log_path)
-    get_flagstats(genome_bam_path, genome_flagstat_path)
-    genome_flagstat_content = parse_flagstats(genome_flagstat_path)
-    star_log_content = parse_starlog(star_log_path)
-    genome_flagstat_qc = QCMetric("samtools_genome_flagstat", genome_flagstat_content)
-    star_log_qc = QCMetric("star_log_qc", star_log_content)
-    write_json(
-        genome_flagstat_qc.to_ordered_dict(),
-        re.sub(r"\.txt$", ".json", genome_flagstat_path),
+    try:
+        with timed(timings, "align"):
+            aligner.run()
+    finally:
+        for writer in fifos:
+            writer.close()
+    genome_bam_path = os.path.join(cwd, bamroot + "_genome.bam")
+    genome_flagstat_path = os.path.join(cwd, bamroot + "_genome_flagstat.txt")
+    star_log_path = os.path.join(cwd, bamroot + "_Log.final.out")
+    os.rename(
+        os.path.join(cwd, bamroot + "_Aligned.sortedByCoord.out.bam"), genome_bam_path
     )
-    write_json(star_log_qc.to_ordered_dict(), re.sub(r"\.out$", ".json", star_log_path))
+    with timed(timings, "flagstat"):
+        get_flagstats(genome_bam_path, genome_flagstat_path, args.ncpus)
+    with timed(timings, "qc"):
+        genome_flagstat_content = parse_flagstats(genome_flagstat_path)
+        star_log_content = parse_starlog(star_log_path)
+        genome_flagstat_qc = QCMetric(
+            "samtools_genome_flagstat", genome_flagstat_content
+        )
+        star_log_qc = QCMetric("star_log_qc", star_log_content)
+        write_json(
+            genome_flagstat_qc.to_ordered_dict(),
+            re.sub(r"\.txt$", ".json", genome_flagstat_path),
+        )
+        write_json(
+            star_log_qc.to_ordered_dict(), re.sub(r"\.out$", ".json", star_log_path)
+        )
+    timings["sample_total"] = round(time.monotonic() - start, 3)
+    write_json(timings, os.path.join(cwd, bamroot + "_timings.json"))
+
+
+def main(args):
+    if args.manifest:
+        samples = load_manifest(args.manifest)
+    else:
+        samples = [
+            {
+                "bamroot": args.bamroot,
+                "fastqs_R1": args.fastqs_R1,
+                "fastqs_R2": args.fastqs_R2 or [],
+            }
+        ]
+    if args.endedness == "paired":
+        for sample in samples:
+            if not sample["fastqs_R2"]:
+                raise Exception(
+                    "Paired-end sample %s has no fastqs_R2" % sample["bamroot"]
+                )
+    timings = {}
+    with timed(timings, "stage_index"):
+        genome_dir = stage_index(args.index, args.indexdir, args.index_cache_dir)
+    genome_load = GENOME_LOAD_MODES[args.genome_load]
+    try:
+        for sample in samples:
+            align_sample(sample, args, genome_dir, genome_load, timings)
+    finally:
+        if args.genome_load == "shared":
+            remove_shared_genome(genome_dir)
 
 
 if __name__ == "__main__":
@@ -305,6 +611,14 @@ if __name__ == "__main__":
     parser.add_argument(
         "--indexdir", type=str, help="Directory to extract index to.", default="out"
     )
+    parser.add_argument(
+        "--index_cache_dir",
+        type=str,
+        help="""
+             Shared directory to cache extracted indexes in. Indexes
+             already extracted there are used without extracting.
+             """,
+    )
     parser.add_argument(
         "--endedness",
         type=str,
@@ -327,6 +641,40 @@ if __name__ == "__main__":
     parser.add_argument(
         "--ramGB", type=int, help="Amount of RAM available in GB.", default=8
     )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="""
+             JSON manifest of samples to align one after another, instead
+             of --fastqs_R1, --fastqs_R2 and --bamroot. Use with
+             --genome_load shared to load the genome once for all.
+             """,
+    )
+    parser.add_argument(
+        "--genome_load",
+        "--genome-load",
+        type=str,
+        choices=list(GENOME_LOAD_MODES.keys()),
+        help="""
+             none loads the genome for each sample. shared loads it once
+             into shared memory with LoadAndKeep, for all samples, and
+             removes it at the end.
+             """,
+        default="none",
+    )
+    parser.add_argument(
+        "--fastq_merge",
+        type=str,
+        choices=FASTQ_MERGE_MODES,
+        help="""
+             How to give STAR many fastqs of a read. list passes them
+             comma separated, fifo streams them through a named pipe, and
+             copy concatenates them into a new file.
+             """,
+        default="list",
+    )
 
     args = parser.parse_args()
+    if not args.manifest and not args.fastqs_R1:
+        parser.error("--fastqs_R1 or --manifest is required")
     main(args)
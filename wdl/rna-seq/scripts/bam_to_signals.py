@@ -12,6 +12,7 @@ import logging
 import shlex
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -30,10 +31,23 @@ STAR_COMMAND = """STAR --runMode inputAlignmentsFromBAM \
                 --outWigType bedGraph \
                 --outWigStrand {strandedness} \
                 --outWigReferencesPrefix chr"""
+# bedGraphs by output suffix, for each strandedness
+BEDGRAPHS = {
+    "stranded": [
+        ["Signal.UniqueMultiple.str1.out.bg", "_minusAll.bw"],
+        ["Signal.Unique.str1.out.bg", "_minusUniq.bw"],
+        ["Signal.UniqueMultiple.str2.out.bg", "_plusAll.bw"],
+        ["Signal.Unique.str2.out.bg", "_plusUniq.bw"],
+    ],
+    "unstranded": [
+        ["Signal.UniqueMultiple.str1.out.bg", "_all.bw"],
+        ["Signal.Unique.str1.out.bg", "_uniq.bw"],
+    ],
+}
 
 
 def main(args):
-    print(args)
+    logger.info("Running with %s", args)
     star_return_code = call_star(args.bamfile, args.strandedness)
 
     try:
@@ -42,34 +56,24 @@ def main(args):
         logger.exception("Building bedGraph had a problem, most likely out of memory.")
         sys.exit(1)
 
-    if args.strandedness == "stranded":
-        call_bg_to_bw(
-            "Signal.UniqueMultiple.str1.out.bg",
-            args.chrom_sizes,
-            args.bamroot + "_minusAll.bw",
-        )
-        call_bg_to_bw(
-            "Signal.Unique.str1.out.bg",
-            args.chrom_sizes,
-            args.bamroot + "_minusUniq.bw",
-        )
-        call_bg_to_bw(
-            "Signal.UniqueMultiple.str2.out.bg",
-            args.chrom_sizes,
-            args.bamroot + "_plusAll.bw",
-        )
-        call_bg_to_bw(
-            "Signal.Unique.str2.out.bg", args.chrom_sizes, args.bamroot + "_plusUniq.bw"
-        )
+    conversions = [
+        [input_bg, args.chrom_sizes, args.bamroot + suffix]
+        for input_bg, suffix in BEDGRAPHS[args.strandedness]
+    ]
+    # The python writer parses in process, so it needs processes to run at once
+    if args.bigwig_writer == "python":
+        executor_class, convert = ProcessPoolExecutor, write_bigwig
     else:
-        call_bg_to_bw(
-            "Signal.UniqueMultiple.str1.out.bg",
-            args.chrom_sizes,
-            args.bamroot + "_all.bw",
-        )
-        call_bg_to_bw(
-            "Signal.Unique.str1.out.bg", args.chrom_sizes, args.bamroot + "_uniq.bw"
-        )
+        executor_class, convert = ThreadPoolExecutor, call_bg_to_bw
+    with executor_class(max_workers=max(args.ncpus, 1)) as executor:
+        futures = [executor.submit(convert, *c) for c in conversions]
+    failed = False
+    for conversion, future in zip(conversions, futures):
+        if future.exception() is not None:
+            logger.error("Building %s failed: %s", conversion[2], future.exception())
+            failed = True
+    if failed:
+        sys.exit(1)
 
 
 def call_star(input_bam, strandedness):
@@ -81,19 +85,62 @@ def call_star(input_bam, strandedness):
     return return_code
 
 
+def is_sorted_bedgraph(input_bg):
+    """Whether a bedGraph is in the order bedGraphToBigWig needs: each
+    chromosome in one block, with sorted starts. The blocks can be in any
+    order, like the BAM header order STAR writes, so it needs no bedSort.
+    """
+    seen_chroms = set()
+    last_chrom, last_start = None, -1
+    with open(input_bg, "rb") as f:
+        for line in f:
+            try:
+                chrom, start, _ = line.split(b"\t", 2)
+                start = int(start)
+            except ValueError:
+                # Not bedGraph data, like a track line
+                return False
+            if chrom != last_chrom:
+                if chrom in seen_chroms:
+                    return False
+                seen_chroms.add(chrom)
+                last_chrom = chrom
+            elif start < last_start:
+                return False
+            last_start = start
+    return True
+
+
 def call_bg_to_bw(input_bg, chrom_sizes, out_fn):
-    # sort bedgraph
-    bedgraph_cmd = "bedSort {input_bg} {output_bg}".format(
-        input_bg=input_bg, output_bg=input_bg
-    )
-    logger.info("Sorting bedgraph: %s", bedgraph_cmd)
-    subprocess.call(shlex.split(bedgraph_cmd))
+    # sort bedgraph, if needed
+    if is_sorted_bedgraph(input_bg):
+        logger.info("Bedgraph is sorted: %s", input_bg)
+    else:
+        bedgraph_cmd = "bedSort {input_bg} {output_bg}".format(
+            input_bg=input_bg, output_bg=input_bg
+        )
+        logger.info("Sorting bedgraph: %s", bedgraph_cmd)
+        return_code = subprocess.call(shlex.split(bedgraph_cmd))
+        if return_code != 0:
+            raise Exception("bedSort exited with %d" % return_code)
     # make bigwig
     command = "bedGraphToBigWig {input_bg} {chrom_sizes} {out_fn}".format(
         input_bg=input_bg, chrom_sizes=chrom_sizes, out_fn=out_fn
     )
     logger.info("Building bigWig: %s", command)
-    subprocess.call(shlex.split(command))
+    return_code = subprocess.call(shlex.split(command))
+    if return_code != 0:
+        raise Exception("bedGraphToBigWig exited with %d" % return_code)
+
+
+def write_bigwig(input_bg, chrom_sizes, out_fn):
+    """Build a bigWig with the in process writer, which sorts each
+    chromosome itself, so there is no bedSort and the bedGraph is left as is.
+    """
+    import bigwig
+
+    logger.info("Building bigWig in process: %s -> %s", input_bg, out_fn)
+    bigwig.bedgraph_to_bigwig(input_bg, chrom_sizes, out_fn)
 
 
 if __name__ == "__main__":
@@ -112,5 +159,19 @@ if __name__ == "__main__":
              """,
         default="out_bam",
     )
+    parser.add_argument(
+        "--ncpus", type=int, help="Number of bigWigs to build at once.", default=1
+    )
+    parser.add_argument(
+        "--bigwig_writer",
+        type=str,
+        choices=["ucsc", "python"],
+        help="""
+             Build bigWigs with the UCSC bedSort and bedGraphToBigWig, or with
+             the NumPy writer in bigwig.py, not yet compared with bigWigs of
+             bedGraphToBigWig
+             """,
+        default="ucsc",
+    )
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,627 @@
+#!/usr/bin/env python3
+"""
+Write bigWigs from bedGraphs in process, with NumPy, in the file format
+written by UCSC bedGraphToBigWig. Chromosomes are in the bedSort order,
+and zoom summaries follow the UCSC loops: a bin starts at the first
+interval past the end of the last bin, or at the end of the last bin
+when an interval spans it, and sums are added in order in single
+precision. Coarser levels merge the summaries of the last level.
+"""
+
+__license__ = "MIT"
+
+import logging
+import struct
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BIGWIG_MAGIC = 0x888FFC26
+BPT_MAGIC = 0x78CA8C91
+CIR_TREE_MAGIC = 0x2468ACE0
+BIGWIG_VERSION = 4
+BLOCK_SIZE = 256
+ITEMS_PER_SLOT = 1024
+MAX_ZOOM_LEVELS = 10
+ZOOM_INCREMENT = 4
+MIN_ZOOM = 10
+# Reduction after which UCSC stops trying coarser initial reductions
+MAX_RES_SCALE = 1000000000
+# Bytes of bedGraph text to parse at once
+PARSE_CHUNK_SIZE = 1 << 24
+
+HEADER_FORMAT = "<IHHQQQHHQQIQ"
+ZOOM_HEADER_FORMAT = "<IIQQ"
+TOTAL_SUMMARY_FORMAT = "<Qdddd"
+SECTION_HEADER_FORMAT = "<IIIIIBBH"
+BEDGRAPH_SECTION_TYPE = 1
+SECTION_ITEM = np.dtype([("start", "<u4"), ("end", "<u4"), ("value", "<f4")])
+SUMMARY_ITEM = np.dtype(
+    [
+        ("chrom_id", "<u4"),
+        ("start", "<u4"),
+        ("end", "<u4"),
+        ("valid", "<u4"),
+        ("min", "<f4"),
+        ("max", "<f4"),
+        ("sum", "<f4"),
+        ("sum_squares", "<f4"),
+    ]
+)
+
+
+def read_chrom_sizes(chrom_sizes):
+    """Chromosome names and sizes, in the order of the chrom sizes file."""
+    sizes = []
+    with open(chrom_sizes, "rb") as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                sizes.append((fields[0], int(fields[1])))
+    return sizes
+
+
+def line_chrom(line):
+    try:
+        return line[: line.index(b"\t")]
+    except ValueError:
+        raise Exception("Not a tab separated bedGraph line: %r" % line[:100])
+
+
+def add_run(runs, chrom, offset, length):
+    # Extend the last run of the chromosome when contiguous
+    chrom_runs = runs.setdefault(chrom, [])
+    if chrom_runs and chrom_runs[-1][0] + chrom_runs[-1][1] == offset:
+        chrom_runs[-1][1] += length
+    else:
+        chrom_runs.append([offset, length])
+
+
+def add_chunk_runs(runs, chunk, offset):
+    # Whole chunks of one chromosome are found by counting, without a loop
+    first_chrom = chunk[: chunk.find(b"\t")]
+    line_count = chunk.count(b"\n") + (not chunk.endswith(b"\n"))
+    if 1 + chunk.count(b"\n" + first_chrom + b"\t") == line_count:
+        add_run(runs, first_chrom, offset, len(chunk))
+        return
+    position = 0
+    for line in chunk.splitlines(True):
+        if line.strip():
+            add_run(runs, line_chrom(line), offset + position, len(line))
+        position += len(line)
+
+
+def index_bedgraph(input_bg):
+    """Byte ranges of each chromosome in a bedGraph, as [offset, length]
+    lists by chromosome name, found in one pass without parsing values.
+    """
+    runs = {}
+    offset = 0
+    rest = b""
+    with open(input_bg, "rb") as f:
+        while True:
+            data = f.read(PARSE_CHUNK_SIZE)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b"\n") + 1
+            rest = data[end:]
+            if end:
+                add_chunk_runs(runs, data[:end], offset)
+                offset += end
+    if rest.strip():
+        add_chunk_runs(runs, rest, offset)
+    return runs
+
+
+def parse_bedgraph_lines(data):
+    fields = data.split()
+    if len(fields) % 4:
+        raise Exception("Expected 4 columns in bedGraph lines")
+    return (
+        np.array(fields[1::4]).astype(np.int64),
+        np.array(fields[2::4]).astype(np.int64),
+        np.array(fields[3::4]).astype(np.float64).astype(np.float32),
+    )
+
+
+def read_chrom_intervals(f, chrom, chrom_size, ranges):
+    """Starts, ends and values of a chromosome from its byte ranges,
+    sorted by start, and checked to be within the chromosome and not
+    overlapping.
+    """
+    parts = []
+    for offset, length in ranges:
+        end = offset + length
+        f.seek(offset)
+        while f.tell() < end:
+            data = f.read(min(PARSE_CHUNK_SIZE, end - f.tell()))
+            if not data.endswith(b"\n") and f.tell() < end:
+                data += f.readline()
+            parts.append(parse_bedgraph_lines(data))
+    starts, ends, values = [np.concatenate(p) for p in zip(*parts)]
+    if np.any(starts[1:] < starts[:-1]):
+        order = np.argsort(starts, kind="mergesort")
+        starts, ends, values = starts[order], ends[order], values[order]
+    name = chrom.decode()
+    if np.any(starts >= ends) or starts[0] < 0:
+        raise Exception("Empty or negative bedGraph interval on %s" % name)
+    if ends[-1] > chrom_size or ends.max() > chrom_size:
+        raise Exception("bedGraph interval past the end of %s" % name)
+    if np.any(starts[1:] < ends[:-1]):
+        raise Exception("Overlapping bedGraph intervals on %s" % name)
+    return starts, ends, values
+
+
+def bin_anchors(starts, ends, reduction):
+    """Indexes of the intervals starting a run of contiguous zoom bins, as
+    UCSC bedGraphToBigWig places bins: a bin starts at the first interval
+    at or past the end of the last bin, and at the end of the last bin
+    when an interval spans it.
+    """
+    anchors = []
+    bin_end = -1
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        if start >= bin_end:
+            anchors.append(i)
+            bin_end = start + reduction
+        if end > bin_end:
+            bin_end += reduction * ((end - bin_end - 1) // reduction + 1)
+    return np.array(anchors, dtype=np.int64)
+
+
+def count_bins(starts, ends, anchors, reduction):
+    # Bins of each run, from its first interval to the last before the next run
+    lasts = np.append(anchors[1:], len(starts)) - 1
+    return int(((ends[lasts] - 1 - starts[anchors]) // reduction + 1).sum())
+
+
+def sequential_sums(x, firsts):
+    """Sums of the segments of x starting at firsts, added in order in the
+    precision of x, like the C loops of UCSC, while NumPy reduceat adds
+    pairwise. Loops once per item of the longest segment.
+    """
+    if not len(firsts):
+        return x[:0].copy()
+    lengths = np.diff(np.append(firsts, len(x)))
+    order = np.argsort(-lengths, kind="stable")
+    firsts, lengths = firsts[order], lengths[order]
+    sums = x[firsts]
+    for i in range(1, int(lengths[0])):
+        count = int(np.searchsorted(-lengths, -i))
+        sums[:count] += x[firsts[:count] + i]
+    result = np.empty_like(sums)
+    result[order] = sums
+    return result
+
+
+def summarize(chrom_id, chrom_size, starts, ends, values, reduction, anchors):
+    """Zoom summaries of intervals, in runs of bins of the reduction from
+    the bin_anchors(). Intervals are split across the bins they cover.
+    """
+    run = np.zeros(len(starts), dtype=np.int64)
+    run[anchors] = 1
+    origins = starts[anchors][np.cumsum(run) - 1]
+    first = (starts - origins) // reduction
+    counts = ((ends - 1 - origins) // reduction) - first + 1
+    index = np.repeat(np.arange(len(starts)), counts)
+    bin_lows = origins[index] + reduction * (
+        first[index]
+        + (np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts))
+    )
+    covered = np.minimum(ends[index], bin_lows + reduction) - np.maximum(
+        starts[index], bin_lows
+    )
+    piece_values = values[index]
+    piece_covered = covered.astype(np.float32)
+    bin_firsts = np.concatenate([[0], np.flatnonzero(np.diff(bin_lows)) + 1])
+    bin_lows = bin_lows[bin_firsts]
+    return {
+        "chrom_id": np.full(len(bin_lows), chrom_id, dtype=np.int64),
+        "start": bin_lows,
+        "end": np.minimum(bin_lows + reduction, chrom_size),
+        "valid": np.add.reduceat(covered, bin_firsts),
+        "min": np.minimum.reduceat(piece_values, bin_firsts),
+        "max": np.maximum.reduceat(piece_values, bin_firsts),
+        "sum": sequential_sums(piece_values * piece_covered, bin_firsts),
+        "sum_squares": sequential_sums(
+            piece_values * piece_values * piece_covered, bin_firsts
+        ),
+    }
+
+
+def reduce_summaries(records, reduction):
+    """Summaries of a coarser zoom level, merged from the summaries of the
+    last level as UCSC bbiSummarySimpleReduce does: a summary is merged
+    into the last merged one of its chromosome when it ends within the
+    reduction from its start.
+    """
+    firsts = []
+    chrom_id = start = None
+    for i, (c, s, e) in enumerate(
+        zip(
+            records["chrom_id"].tolist(),
+            records["start"].tolist(),
+            records["end"].tolist(),
+        )
+    ):
+        if c != chrom_id or e > start + reduction:
+            firsts.append(i)
+            chrom_id, start = c, s
+    firsts = np.array(firsts, dtype=np.int64)
+    lasts = np.append(firsts[1:], len(records)) - 1
+    merged = np.empty(len(firsts), dtype=SUMMARY_ITEM)
+    merged["chrom_id"] = records["chrom_id"][firsts]
+    merged["start"] = records["start"][firsts]
+    merged["end"] = records["end"][lasts]
+    merged["valid"] = np.add.reduceat(records["valid"], firsts)
+    merged["min"] = np.minimum.reduceat(records["min"], firsts)
+    merged["max"] = np.maximum.reduceat(records["max"], firsts)
+    merged["sum"] = sequential_sums(records["sum"], firsts)
+    merged["sum_squares"] = sequential_sums(records["sum_squares"], firsts)
+    return merged
+
+
+def summary_records(summaries):
+    records = np.empty(len(summaries["start"]), dtype=SUMMARY_ITEM)
+    for name in SUMMARY_ITEM.names:
+        records[name] = summaries[name]
+    return records
+
+
+def write_chrom_tree(f, chroms):
+    """Write the B+ tree of chromosome names to ids and sizes, as UCSC
+    bptFileBulkIndexToOpenFile does.
+    """
+    items = sorted(chroms)
+    item_count = len(items)
+    block_size = max(min(BLOCK_SIZE, item_count), 1)
+    key_size = max([len(name) for name, _, _ in items] + [1])
+    val_size = 8
+    f.write(
+        struct.pack("<IIIIQQ", BPT_MAGIC, block_size, key_size, val_size, item_count, 0)
+    )
+    levels = 1
+    count = item_count
+    while count > block_size:
+        count = (count + block_size - 1) // block_size
+        levels += 1
+    index_block_size = 4 + block_size * (key_size + 8)
+    leaf_block_size = 4 + block_size * (key_size + val_size)
+    index_offset = f.tell()
+    for level in range(levels - 1, 0, -1):
+        slot_size = block_size ** level
+        node_size = slot_size * block_size
+        node_count = (item_count + node_size - 1) // node_size
+        next_child = index_offset + node_count * index_block_size
+        child_block_size = leaf_block_size if level == 1 else index_block_size
+        for i in range(0, item_count, node_size):
+            count = min(block_size, (item_count - i + slot_size - 1) // slot_size)
+            f.write(struct.pack("<BBH", 0, 0, count))
+            for j in range(count):
+                f.write(items[i + j * slot_size][0].ljust(key_size, b"\0"))
+                f.write(struct.pack("<Q", next_child))
+                next_child += child_block_size
+            f.write(b"\0" * ((block_size - count) * (key_size + 8)))
+        index_offset = f.tell()
+    for i in range(0, max(item_count, 1), block_size):
+        node = items[i : i + block_size]
+        f.write(struct.pack("<BBH", 1, 0, len(node)))
+        for name, chrom_id, size in node:
+            f.write(name.ljust(key_size, b"\0") + struct.pack("<II", chrom_id, size))
+        f.write(b"\0" * ((block_size - len(node)) * (key_size + val_size)))
+
+
+def bounds_of(bounds):
+    return (
+        min(b[:2] for b in bounds) + max(b[2:4] for b in bounds)
+        if bounds
+        else (0, 0, 0, 0)
+    )
+
+
+def write_cir_tree(f, slots, item_count, items_per_slot, end_file_offset):
+    """Write the R tree index of slots, (start chrom id, start, end chrom
+    id, end, offset, size) tuples in file order, as UCSC
+    cirTreeFileBulkIndexToOpenFile does, with nodes padded to the block
+    size.
+    """
+    block_size = BLOCK_SIZE
+    nodes = [slots[i : i + block_size] for i in range(0, len(slots), block_size)]
+    levels = [[(bounds_of(node), node) for node in nodes or [[]]]]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        levels.append(
+            [
+                (bounds_of([b for b, _ in group]), group)
+                for group in (
+                    below[i : i + block_size] for i in range(0, len(below), block_size)
+                )
+            ]
+        )
+    levels.reverse()
+    root_bounds = levels[0][0][0]
+    f.write(
+        struct.pack(
+            "<IIQIIIIQII",
+            CIR_TREE_MAGIC,
+            block_size,
+            item_count,
+            *root_bounds,
+            end_file_offset,
+            items_per_slot,
+            0,
+        )
+    )
+    index_node_size = 4 + block_size * 24
+    leaf_node_size = 4 + block_size * 32
+    level_offsets = [f.tell()]
+    for level in levels[:-1]:
+        level_offsets.append(level_offsets[-1] + len(level) * index_node_size)
+    for depth, level in enumerate(levels[:-1]):
+        child_size = leaf_node_size if depth == len(levels) - 2 else index_node_size
+        child_offset = level_offsets[depth + 1]
+        for _, children in level:
+            f.write(struct.pack("<BBH", 0, 0, len(children)))
+            for child_bounds, _ in children:
+                f.write(struct.pack("<IIIIQ", *child_bounds, child_offset))
+                child_offset += child_size
+            f.write(b"\0" * ((block_size - len(children)) * 24))
+    for _, children in levels[-1]:
+        f.write(struct.pack("<BBH", 1, 0, len(children)))
+        for slot in children:
+            f.write(struct.pack("<IIIIQQ", *slot))
+        f.write(b"\0" * ((block_size - len(children)) * 32))
+
+
+class ZoomLevel:
+    """
+    Zoom summaries of a level, added by chromosome and kept as compressed
+    blocks of ITEMS_PER_SLOT summaries until written.
+    """
+
+    def __init__(self, reduction):
+        self.reduction = reduction
+        self.count = 0
+        self.pending = np.empty(0, dtype=SUMMARY_ITEM)
+        self.blocks = []
+
+    def add(self, records):
+        self.count += len(records)
+        self.pending = np.concatenate([self.pending, records])
+        while len(self.pending) >= ITEMS_PER_SLOT:
+            self.add_block(self.pending[:ITEMS_PER_SLOT])
+            self.pending = self.pending[ITEMS_PER_SLOT:]
+
+    def add_block(self, block):
+        bounds = (
+            block["chrom_id"][0],
+            block["start"][0],
+            block["chrom_id"][-1],
+            block["end"][-1],
+        )
+        self.blocks.append(
+            (tuple(int(b) for b in bounds), zlib.compress(block.tobytes()))
+        )
+
+    def write(self, f):
+        """Write the summaries and their index. Returns the zoom header."""
+        if len(self.pending):
+            self.add_block(self.pending)
+            self.pending = self.pending[:0]
+        data_offset = f.tell()
+        f.write(struct.pack("<I", self.count))
+        slots = []
+        for bounds, compressed in self.blocks:
+            slots.append(bounds + (f.tell(), len(compressed)))
+            f.write(compressed)
+        self.blocks = []
+        index_offset = f.tell()
+        write_cir_tree(f, slots, self.count, ITEMS_PER_SLOT, index_offset)
+        return (self.reduction, 0, data_offset, index_offset)
+
+
+def zoom_scales(average_size):
+    """Reductions to try for the first zoom level, as UCSC
+    bbiCalcResScalesAndSizes.
+    """
+    scales = []
+    reduction = max(average_size, MIN_ZOOM)
+    while len(scales) < MAX_ZOOM_LEVELS:
+        scales.append(reduction)
+        if reduction > MAX_RES_SCALE:
+            break
+        reduction *= ZOOM_INCREMENT
+    return scales
+
+
+def read_section_items(f, slots):
+    """Starts, ends and values of data sections, read back from the
+    bigWig being written.
+    """
+    header_size = struct.calcsize(SECTION_HEADER_FORMAT)
+    parts = []
+    for slot in slots:
+        f.seek(slot[4])
+        raw = zlib.decompress(f.read(slot[5]))
+        parts.append(np.frombuffer(raw, dtype=SECTION_ITEM, offset=header_size))
+    items = np.concatenate(parts)
+    return (
+        items["start"].astype(np.int64),
+        items["end"].astype(np.int64),
+        items["value"],
+    )
+
+
+def write_sections(f, chrom_id, starts, ends, values):
+    """Write intervals of a chromosome in compressed sections of
+    ITEMS_PER_SLOT items. Returns the section slots, and the largest
+    uncompressed section size.
+    """
+    items = np.empty(len(starts), dtype=SECTION_ITEM)
+    items["start"], items["end"], items["value"] = starts, ends, values
+    slots = []
+    max_size = 0
+    for i in range(0, len(items), ITEMS_PER_SLOT):
+        section = items[i : i + ITEMS_PER_SLOT]
+        start, end = int(section["start"][0]), int(section["end"][-1])
+        header = struct.pack(
+            SECTION_HEADER_FORMAT,
+            chrom_id,
+            start,
+            end,
+            0,
+            0,
+            BEDGRAPH_SECTION_TYPE,
+            0,
+            len(section),
+        )
+        raw = header + section.tobytes()
+        max_size = max(max_size, len(raw))
+        compressed = zlib.compress(raw)
+        slots.append((chrom_id, start, chrom_id, end, f.tell(), len(compressed)))
+        f.write(compressed)
+    return slots, max_size
+
+
+def write_zoom_levels(f, chrom_sizes, chrom_slots, data_size, average_size):
+    """Write the zoom levels, as UCSC bedGraphToBigWig picks them. The
+    first level has the first reduction of zoom_scales() that halves the
+    data size, estimating compressed summaries at half their size, and
+    none fitting leaves no zoom levels. Each next level zooms out by
+    ZOOM_INCREMENT while it has fewer summaries. Returns the zoom headers.
+    """
+    for reduction in zoom_scales(average_size):
+        anchors = []
+        count = 0
+        for slots in chrom_slots:
+            starts, ends, _ = read_section_items(f, slots)
+            anchors.append(bin_anchors(starts, ends, reduction))
+            count += count_bins(starts, ends, anchors[-1], reduction)
+        if count * SUMMARY_ITEM.itemsize // 2 <= data_size // 2:
+            break
+    else:
+        f.seek(0, 2)
+        return []
+    levels = [
+        ZoomLevel(reduction * ZOOM_INCREMENT**i) for i in range(MAX_ZOOM_LEVELS)
+    ]
+    for chrom_id, slots in enumerate(chrom_slots):
+        starts, ends, values = read_section_items(f, slots)
+        records = summary_records(
+            summarize(
+                chrom_id,
+                chrom_sizes[chrom_id],
+                starts,
+                ends,
+                values,
+                reduction,
+                anchors[chrom_id],
+            )
+        )
+        levels[0].add(records)
+        for level in levels[1:]:
+            records = reduce_summaries(records, level.reduction)
+            level.add(records)
+    count = len(levels)
+    for i in range(1, len(levels)):
+        if levels[i].count >= levels[i - 1].count:
+            count = i
+            break
+    f.seek(0, 2)
+    return [level.write(f) for level in levels[:count]]
+
+
+def bedgraph_to_bigwig(input_bg, chrom_sizes, out_fn):
+    """Write a bigWig from a bedGraph, like UCSC bedGraphToBigWig, without
+    sorting the bedGraph first. Chromosomes are read one at a time from
+    their byte ranges, in the bedSort order of their names, and sorted by
+    start in memory when needed. Zoom summaries are computed from the
+    sections read back.
+    """
+    sizes = read_chrom_sizes(chrom_sizes)
+    runs = index_bedgraph(input_bg)
+    known = set(name for name, _ in sizes)
+    for chrom in runs:
+        if chrom not in known:
+            raise Exception(
+                "%s is not found in chromosome sizes file" % chrom.decode()
+            )
+    chroms = sorted((name, size) for name, size in sizes if name in runs)
+    with open(out_fn, "w+b") as f, open(input_bg, "rb") as bg:
+        f.write(b"\0" * struct.calcsize(HEADER_FORMAT))
+        f.write(b"\0" * (MAX_ZOOM_LEVELS * struct.calcsize(ZOOM_HEADER_FORMAT)))
+        total_summary_offset = f.tell()
+        f.write(b"\0" * struct.calcsize(TOTAL_SUMMARY_FORMAT))
+        chrom_tree_offset = f.tell()
+        write_chrom_tree(
+            f, [(name, i, size) for i, (name, size) in enumerate(chroms)]
+        )
+
+        data_offset = f.tell()
+        f.write(b"\0" * 8)
+        chrom_slots = []
+        item_count = bases = 0
+        min_value, max_value = np.inf, -np.inf
+        sum_data = sum_squares = 0.0
+        uncompress_buf_size = ITEMS_PER_SLOT * SUMMARY_ITEM.itemsize
+        for chrom_id, (name, size) in enumerate(chroms):
+            starts, ends, values = read_chrom_intervals(bg, name, size, runs[name])
+            covered = ends - starts
+            weighted = values.astype(np.float64) * covered
+            item_count += len(starts)
+            bases += int(covered.sum())
+            min_value = min(min_value, float(values.min()))
+            max_value = max(max_value, float(values.max()))
+            sum_data += float(weighted.sum())
+            sum_squares += float((weighted * values).sum())
+            slots, max_size = write_sections(f, chrom_id, starts, ends, values)
+            chrom_slots.append(slots)
+            uncompress_buf_size = max(uncompress_buf_size, max_size)
+        all_slots = [slot for slots in chrom_slots for slot in slots]
+        index_offset = f.tell()
+        write_cir_tree(f, all_slots, len(all_slots), 1, index_offset)
+
+        zoom_headers = []
+        if item_count:
+            zoom_headers = write_zoom_levels(
+                f,
+                [size for _, size in chroms],
+                chrom_slots,
+                index_offset - data_offset,
+                bases // item_count,
+            )
+        else:
+            min_value = max_value = 0.0
+        f.write(struct.pack("<I", BIGWIG_MAGIC))
+
+        f.seek(0)
+        f.write(
+            struct.pack(
+                HEADER_FORMAT,
+                BIGWIG_MAGIC,
+                BIGWIG_VERSION,
+                len(zoom_headers),
+                chrom_tree_offset,
+                data_offset,
+                index_offset,
+                0,
+                0,
+                0,
+                total_summary_offset,
+                uncompress_buf_size,
+                0,
+            )
+        )
+        for zoom_header in zoom_headers:
+            f.write(struct.pack(ZOOM_HEADER_FORMAT, *zoom_header))
+        f.seek(data_offset)
+        f.write(struct.pack("<Q", len(all_slots)))
+        f.seek(total_summary_offset)
+        f.write(
+            struct.pack(
+                TOTAL_SUMMARY_FORMAT, bases, min_value, max_value, sum_data, sum_squares
+            )
+        )